@@ -1,4 +1,9 @@
-from .transformer import TransformerAnalyzer
+from .emotional_aggregate import EmotionalAggregate
+from .transformer import TransformerAnalyzer, get_transformer_analyzer
+from .model_registry import ModelRegistry, get_model_registry
+from .aggregator import EmotionAggregator, get_emotion_aggregator
 from .valence_arousal_analyzer import ValenceArousalAnalyzer
 from .emotion_image import graficar_paisaje_emocional
+from .emotion_image import generar_paisaje_emocional, calcular_emociones_combinadas, clave_distribucion
+from .emotion_image import imagen_a_data_url, subir_imagen_a_imgbb
 from .emotional_diversity_analyzer import analyze_emotional_diversity
\ No newline at end of file
@@ -1,31 +1,141 @@
+import re
+import threading
+from functools import lru_cache
+from typing import Tuple
+
+import numpy as np
+
+from app.analyzers.base import BaseAnalyzer
+from app.analyzers.model_registry import get_model_registry
+from app.config import Config
+from app.utils.metrics import CASCADE_LYRICS
+
+
+# VADER no distingue enojo de tristeza. La masa negativa se reparte de modo que no mueva el arousal
+# estimado desde la letra (ValenceArousalAnalyzer: + anger * 40 - sadness * 30): 3/7 anger y 4/7 sadness.
+# Repartirla en partes iguales subía el arousal de las canciones tristes
+NEGATIVE_ANGER_SHARE = 3 / 7
+
+# Sin saltos de línea (letras de otras fuentes) se parte en oraciones
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+")
+
+
 class EmotionAggregator:
-    def __init__(self, base_analyzer, transformer_analyzer):
+    """
+    Inferencia en cascada: VADER primero, el transformer solo para las letras ambiguas.
+
+    VADER (léxico, casi gratis) puntúa cada línea de la letra ("Lyrics_lines", ponderadas por sus
+    repeticiones en "Lyrics_line_counts"). El compound de la letra completa se satura enseguida en
+    ±1 con textos largos, así que la señal es la media de las líneas: si su magnitud es de al menos
+    `ambiguity_threshold` y la dispersión entre líneas es menor que esa magnitud (las líneas coinciden),
+    se usa el resultado de VADER; si no, la letra se escala al TransformerAnalyzer, que las procesa
+    en lotes. Subir el umbral escala más letras (más precisión, más costo); bajarlo ahorra llamadas al modelo.
+
+    Los resultados tienen la misma forma que los de TransformerAnalyzer, con la distribución
+    sobre las cuatro emociones (anger, joy, optimism, sadness).
+    """
+
+    def __init__(self, base_analyzer, transformer_analyzer, ambiguity_threshold: float = None):
         self.base = base_analyzer
         self.transformer = transformer_analyzer
+        self.ambiguity_threshold = (
+            Config.CASCADE_AMBIGUITY_THRESHOLD if ambiguity_threshold is None else ambiguity_threshold
+        )
+        self.labels = ["anger", "joy", "optimism", "sadness"]
+        self._lock = threading.Lock()
+        self.analyzed = 0
+        self.escalated = 0
+
+    @property
+    def escalation_rate(self) -> float:
+        """
+        Fracción de letras que se escalaron al transformer desde que se creó la instancia.
+        """
+        with self._lock:
+            return self.escalated / self.analyzed if self.analyzed else 0.0
 
-    def analyze(self, lyric: str) -> dict:
-        base_result = self.base.analyze(lyric)
-        transformer_result = self.transformer.analyze(lyric)
+    def line_scores(self, song: dict) -> Tuple[float, float]:
+        """
+        Media y desvío estándar del compound de VADER por línea, ponderados por las repeticiones de cada línea.
+        """
+        lines = song.get("Lyrics_lines") or _SENTENCE_SPLIT.split(song.get("Lyrics") or "")
+        counts = song.get("Lyrics_line_counts") or []
+        if len(counts) != len(lines):
+            counts = [1] * len(lines)
+        if not lines:
+            return 0.0, 0.0
 
-        if transformer_result["confidence"] < 0.5:
-            final_emotion = base_result["sentiment"]
-            confidence = (
-                base_result["confidence"] + transformer_result["confidence"]
-            ) / 2
-        else:
-            final_emotion = transformer_result["sentiment"]
-            confidence = transformer_result["confidence"]
+        compounds = np.array([self.base.analyze(line)["raw"]["compound"] for line in lines])
+        weights = np.asarray(counts, dtype=float)
+        mean = float(np.average(compounds, weights=weights))
+        spread = float(np.sqrt(np.average((compounds - mean) ** 2, weights=weights)))
+        return mean, spread
 
+    def _vader_result(self, song: dict, compound: float) -> dict:
+        """
+        Lleva el compound medio de VADER a la distribución de cuatro emociones.
+
+        La masa positiva (compound + 1) / 2 se reparte en partes iguales entre joy y optimism y la
+        negativa entre anger y sadness según NEGATIVE_ANGER_SHARE, de modo que la valencia lírica
+        resultante (ver ValenceArousalAnalyzer.calculate_lyrics_valence) es 50 * (1 + compound).
+        """
+        positive = (compound + 1) / 2
+        distribution = {
+            "anger": (1 - positive) * NEGATIVE_ANGER_SHARE,
+            "joy": positive / 2,
+            "optimism": positive / 2,
+            "sadness": (1 - positive) * (1 - NEGATIVE_ANGER_SHARE),
+        }
         return {
-            "emotion": final_emotion,
-            "confidence": round(confidence, 3),
-            "details": {"base": base_result, "transformer": transformer_result},
+            "method": "vader",
+            "title": song.get("Title"),
+            "artist": song.get("Artist"),
+            "emotion": "joy" if positive >= 0.5 else "sadness",
+            "confidence": abs(compound),
+            "distribution": distribution,
         }
-    
+
+    def analyze_batch(self, songs: list[dict], batch_size: int = 16) -> list[dict]:
+        """
+        Analiza varias letras (dicts con Title, Artist y Lyrics) y devuelve los resultados en el mismo orden.
+        """
+        results = [None] * len(songs)
+        ambiguous = []
+
+        for i, song in enumerate(songs):
+            mean, spread = self.line_scores(song)
+            if abs(mean) >= self.ambiguity_threshold and spread < abs(mean):
+                results[i] = self._vader_result(song, mean)
+            else:
+                ambiguous.append(i)
+
+        if ambiguous:
+            escalated = self.transformer.analyze_batch([songs[i] for i in ambiguous], batch_size)
+            for i, result in zip(ambiguous, escalated):
+                results[i] = result
+
+        CASCADE_LYRICS.inc(len(songs) - len(ambiguous), tier="vader")
+        CASCADE_LYRICS.inc(len(ambiguous), tier="transformer")
+        with self._lock:
+            self.analyzed += len(songs)
+            self.escalated += len(ambiguous)
+
+        return results
+
+    def analyze(self, song: dict) -> dict:
+        return self.analyze_batch([song])[0]
+
+
+@lru_cache(maxsize=1)
+def get_emotion_aggregator() -> EmotionAggregator:
+    """
+    Instancia compartida de la cascada, que escala las letras ambiguas al modelo de su idioma.
+    """
+    return EmotionAggregator(BaseAnalyzer(), get_model_registry())
+
 if __name__ == "__main__":
-    from services import BaseAnalyzer, TransformerAnalyzer
-    model = EmotionAggregator(BaseAnalyzer(), TransformerAnalyzer())
+    model = get_emotion_aggregator()
     lyric = "I'm so tired of being here Suppressed by all my childish fears And if you have to leave I wish that you would just leave 'Cause your presence still lingers here And it won't leave me alone These wounds won't seem to heal This pain is just too real There's just too much that time cannot erase When you cried I'd wipe away all of your tears When you'd scream I'd fight away all of your fears I held your hand through all of these years But you still have All of me You used to captivate me By your resonating light Now I'm bound by the life you left behind Your face it haunts My once pleasant dreams Your voice it chased away All the sanity in me These wounds won't seem to heal This pain is just too real There's just too much that time cannot erase When you cried I'd wipe away all of your tears When you'd scream I'd fight away all of your fears I held your hand through all of these years But you still have All of me I've tried so hard to tell myself that you're gone But though you're still with me I've been alone all along When you cried I'd wipe away all of your tears When you'd scream I'd fight away all of your fears I held your hand through all of these years But you still have All of me, me, me"
-    result = model.analyze(lyric)
+    result = model.analyze({"Title": "My Immortal", "Artist": "Evanescence", "Lyrics": lyric})
     print(result)
 
@@ -0,0 +1,27 @@
+from io import BytesIO
+
+from matplotlib.figure import Figure
+
+# Formatos de salida soportados y su tipo de contenido
+CHART_MEDIA_TYPES = {
+    "png": "image/png",
+    "svg": "image/svg+xml",
+}
+
+
+def render_figure(fig: Figure, fmt: str = "png", dpi: int = 100) -> bytes:
+    """
+    Renderiza una figura en memoria y la libera.
+
+    La figura se crea sin pyplot, por lo que el render usa el canvas Agg/SVG sin necesitar
+    una pantalla y no queda ninguna figura abierta después de llamar a esta función.
+    """
+    if fmt not in CHART_MEDIA_TYPES:
+        raise ValueError(f"Formato no soportado: {fmt}")
+
+    buffer = BytesIO()
+    try:
+        fig.savefig(buffer, format=fmt, dpi=dpi, bbox_inches="tight")
+    finally:
+        fig.clear()
+    return buffer.getvalue()
@@ -1,10 +1,12 @@
 import os
+import json
+import hashlib
 import requests
 import base64
 from dotenv import load_dotenv
-from PIL import Image
-from io import BytesIO
 from huggingface_hub import InferenceClient
+from app.config import Config
+from app.utils import Deadline, get_breaker, stage
 
 # Cargar token Hugging Face
 load_dotenv()
@@ -13,10 +15,26 @@ IMGBB_TOKEN = os.getenv("IMGBB_API_KEY")
 
 HEADERS = {"Authorization": f"Bearer {HF_TOKEN}"}
 
-client = InferenceClient(
-    provider="nebius",
-    api_key = HF_TOKEN,
-)
+
+def crear_cliente_vlm(timeout: float) -> InferenceClient:
+    """
+    Crea el cliente del modelo de descripción con el timeout dado.
+    Si HF_CHAT_BASE_URL está definida (por ejemplo un servidor local de prueba) se usa en lugar del proveedor.
+    """
+    if Config.HF_CHAT_BASE_URL:
+        return InferenceClient(
+            base_url=Config.HF_CHAT_BASE_URL,
+            api_key=HF_TOKEN,
+            timeout=timeout,
+        )
+    return InferenceClient(
+        provider="nebius",
+        api_key = HF_TOKEN,
+        timeout=timeout,
+    )
+
+
+client = crear_cliente_vlm(Config.STAGE_BUDGET_VLM)
 
 
 # 1 Generar prompt emocional 
@@ -58,50 +76,63 @@ def generar_prompt_emocional(distribucion):
 
 
 # 2 Generar imagen
-def generar_imagen(prompt: str) -> str:
+def generar_imagen(prompt: str, timeout: float = Config.STAGE_BUDGET_SDXL) -> bytes:
+    """
+    Genera la imagen con SDXL y devuelve sus bytes tal cual los entrega el modelo, sin pasar por disco.
+    """
 
     # Ruta del modelo
-    url = "https://router.huggingface.co/hf-inference/models/stabilityai/stable-diffusion-xl-base-1.0"
-    response = requests.post(url, headers=HEADERS, json={"inputs": prompt})
-
-    if response.status_code == 200:
-        # Crear carpeta si no existe
-        image_folder = "image"
-        os.makedirs(image_folder, exist_ok=True)
-
-        # Construir ruta completa
-        image_filename = "imagen_emocional.jpg"
-        image_path = os.path.join(image_folder, image_filename)
-
-        # Guardar imagen
-        image = Image.open(BytesIO(response.content))
-        image.save(image_path, format="JPEG")
-        print(f"✅ Imagen generada: {image_path}")
-        return image_path
-    else:
-        print(f"❌ Error {response.status_code}: {response.text}")
-        raise Exception("Error al generar imagen.")
+    url = Config.HF_SDXL_URL
+
+    def _generar():
+        response = requests.post(url, headers=HEADERS, json={"inputs": prompt}, timeout=timeout)
+        if response.status_code != 200:
+            print(f"❌ Error {response.status_code}: {response.text}")
+            response.raise_for_status()
+            raise Exception("Error al generar imagen.")
+        return response
+
+    response = get_breaker("hf_sdxl").call(_generar)
+    print(f"✅ Imagen generada ({len(response.content)} bytes)")
+    return response.content
 
     
 
-# 3 SUBIR IMAGEN A IMGBB PARA OBTENER LA URL PUBLICA 
+# 3 URL DE LA IMAGEN PARA EL MODELO DE DESCRIPCIÓN
+
+def imagen_a_data_url(image_bytes: bytes) -> str:
+    """
+    Codifica la imagen como data URL para enviarla embebida al modelo, sin subirla a ningún servicio.
+    """
+    media_type = "image/png" if image_bytes.startswith(b"\x89PNG") else "image/jpeg"
+    encoded_image = base64.b64encode(image_bytes).decode()
+    return f"data:{media_type};base64,{encoded_image}"
+
 
-def subir_imagen_a_imgbb(ruta_imagen):
-    with open(ruta_imagen, "rb") as f:
-        encoded_image = base64.b64encode(f.read())
-    url = "https://api.imgbb.com/1/upload"
+def subir_imagen_a_imgbb(image_bytes: bytes, timeout: float = Config.STAGE_BUDGET_IMGBB) -> str:
+    """
+    Sube la imagen a imgbb y devuelve su URL pública. Solo se usa con IMAGE_VLM_SOURCE=imgbb.
+    """
+    encoded_image = base64.b64encode(image_bytes)
+    url = Config.IMGBB_UPLOAD_URL
     payload = {
         "key": IMGBB_TOKEN,
         "image": encoded_image
     }
-    response = requests.post(url, data=payload)
-    response.raise_for_status()
+
+    def _subir():
+        response = requests.post(url, data=payload, timeout=timeout)
+        response.raise_for_status()
+        return response
+
+    response = get_breaker("imgbb").call(_subir)
     return response.json()["data"]["url"]
 
 # 4 ENVIAR PROMPT + IMAGEN A google/gemma-3-27b-it 
 
-def generar_descripcion_emocional(prompt: str, url_publica: str, client) -> str:
-    completion = client.chat.completions.create(
+def generar_descripcion_emocional(prompt: str, url_imagen: str, client) -> str:
+    completion = get_breaker("hf_chat").call(
+        client.chat.completions.create,
         model="google/gemma-3-27b-it",
         messages=[
             {
@@ -114,7 +145,7 @@ def generar_descripcion_emocional(prompt: str, url_publica: str, client) -> str:
                     {
                         "type": "image_url",
                         "image_url": {
-                            "url": url_publica
+                            "url": url_imagen
                         }
                     }
                 ]
@@ -149,37 +180,65 @@ def calcular_emociones_combinadas(features, lyrics_inference):
 
     return final_emotion
 
-# 5 Flujo completo
+# 6 Clave de deduplicación
+
+def clave_distribucion(distribucion) -> str:
+    """
+    Genera una clave estable a partir de la distribución emocional.
+    Dos pedidos con la misma distribución producen el mismo prompt, por lo que comparten trabajo.
+    """
+    canonical = json.dumps(
+        {k: round(float(v), 4) for k, v in sorted(distribucion.items())}
+    )
+    return hashlib.sha1(canonical.encode()).hexdigest()
+
+# 7 Generación del paisaje (pensada para correr como trabajo en segundo plano)
+
+def generar_paisaje_emocional(emotion_distribution, url_para_modelo=None, deadline=None):
+    """
+    Genera la imagen y obtiene su descripción a partir de una distribución emocional ya calculada.
+
+    `url_para_modelo` recibe los bytes de la imagen y devuelve la URL que se le pasa al modelo de
+    descripción; por defecto la imagen va embebida como data URL.
+    Cada llamada externa usa como timeout su presupuesto, acotado por lo que quede de `deadline`.
+    A diferencia de graficar_paisaje_emocional, los errores se propagan para que el trabajo quede marcado como fallido.
+    """
+    deadline = deadline or Deadline(Config.IMAGE_JOB_DEADLINE_SECONDS)
+    prompt_base, prompt_interpretacion = generar_prompt_emocional(emotion_distribution)
+
+    with stage("image_generation"):
+        image_bytes = generar_imagen(prompt_base, timeout=deadline.budget("sdxl", Config.STAGE_BUDGET_SDXL))
+    with stage("image_upload"):
+        url_imagen = (url_para_modelo or imagen_a_data_url)(image_bytes)
+
+    with stage("vlm"):
+        vlm_client = crear_cliente_vlm(deadline.budget("vlm", Config.STAGE_BUDGET_VLM))
+        descripcion = generar_descripcion_emocional(prompt_interpretacion, url_imagen, vlm_client)
+
+    return {
+        "descripcion": descripcion,
+        "image_bytes": image_bytes
+    }
+
+# 8 Flujo completo (síncrono)
 
 def graficar_paisaje_emocional(avg_audio, avg_lyrics):
     emotion_distribution = calcular_emociones_combinadas(avg_audio["average_audio_features"], avg_lyrics["average_lyrics_inference"])
     print("Distribución emocional:\n", emotion_distribution)
-    
-# Genera el promp para la imagen
-    prompt_base, prompt_interpretacion = generar_prompt_emocional(emotion_distribution)
-    print("Prompt generado para imagen:\n", prompt_base)
 
-    url_publica = None
     descripcion = None
-    
+    image_bytes = None
+
 # Genera la imágen y la describe
     try:
-        image_path = generar_imagen(prompt_base)
-        print("Imagen guardada como: ", image_path)
-
-        print("📤 Subiendo imagen a imgbb...")
-        url_publica = subir_imagen_a_imgbb(image_path)
-        print("Imagen subida:", url_publica)
-
-        print("Enviando prompt e imágen al modelo...")
-        descripcion = generar_descripcion_emocional(prompt_interpretacion, url_publica, client)
+        paisaje = generar_paisaje_emocional(emotion_distribution)
+        descripcion = paisaje["descripcion"]
+        image_bytes = paisaje["image_bytes"]
         print(descripcion)
     except Exception as e:
       print("Error:", e)
 
     return {
-        "url_publica": url_publica,
+        "image_bytes": image_bytes,
         "descripcion": descripcion
     }
-
-
@@ -0,0 +1,133 @@
+import math
+from typing import Any, Dict, Iterable
+
+# Mismo orden de cuadrantes que usan ValenceArousalAnalyzer y EmotionalDiversityAnalyzer
+QUADRANTS = [
+    "high_valence_high_arousal",
+    "low_valence_high_arousal",
+    "low_valence_low_arousal",
+    "high_valence_low_arousal",
+]
+
+
+def quadrant_for(valence: float, arousal: float) -> str:
+    if valence >= 50 and arousal >= 50:
+        return "high_valence_high_arousal"
+    elif valence < 50 and arousal >= 50:
+        return "low_valence_high_arousal"
+    elif valence < 50 and arousal < 50:
+        return "low_valence_low_arousal"
+    else:
+        return "high_valence_low_arousal"
+
+
+class _Welford:
+    """
+    Media y varianza en línea (algoritmo de Welford) con merge de Chan et al.
+    """
+
+    __slots__ = ("count", "mean", "m2")
+
+    def __init__(self, count: int = 0, mean: float = 0.0, m2: float = 0.0):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+
+    def update(self, value: float):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    def merge(self, other: "_Welford"):
+        if other.count == 0:
+            return
+        if self.count == 0:
+            self.count, self.mean, self.m2 = other.count, other.mean, other.m2
+            return
+
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+
+    def std(self) -> float:
+        # Desvío poblacional, igual que np.std
+        return math.sqrt(self.m2 / self.count) if self.count > 0 else float("nan")
+
+
+class EmotionalAggregate:
+    """
+    Estado agregado y combinable del análisis de Valencia-Arousal de un conjunto de canciones.
+
+    Guarda la cantidad de canciones, media y varianza (Welford) de valencia y arousal, y los
+    conteos por cuadrante. Se actualiza en O(1) por canción, se puede combinar con el agregado de
+    otra partición con `merge` y se serializa con `to_dict`/`from_dict`, de modo que el resumen de
+    un usuario puede mantenerse de forma incremental o calcularse en paralelo por fragmentos.
+    """
+
+    def __init__(self):
+        self._valence = _Welford()
+        self._arousal = _Welford()
+        self.quadrant_counts = {quadrant: 0 for quadrant in QUADRANTS}
+
+    @property
+    def count(self) -> int:
+        return self._valence.count
+
+    def update(self, valence: float, arousal: float) -> "EmotionalAggregate":
+        self._valence.update(float(valence))
+        self._arousal.update(float(arousal))
+        self.quadrant_counts[quadrant_for(valence, arousal)] += 1
+        return self
+
+    def update_many(self, points: Iterable) -> "EmotionalAggregate":
+        for valence, arousal in points:
+            self.update(valence, arousal)
+        return self
+
+    def merge(self, other: "EmotionalAggregate") -> "EmotionalAggregate":
+        self._valence.merge(other._valence)
+        self._arousal.merge(other._arousal)
+        for quadrant, count in other.quadrant_counts.items():
+            self.quadrant_counts[quadrant] += count
+        return self
+
+    @classmethod
+    def from_songs(cls, songs) -> "EmotionalAggregate":
+        """
+        Construye el agregado a partir de las canciones de un resultado de process_songs.
+        Como esas canciones traen valencia y arousal redondeados, el centroide puede diferir en la
+        última cifra del que calcula process_songs sobre los valores sin redondear.
+        """
+        return cls().update_many((song["valence"], song["arousal"]) for song in songs)
+
+    # Estadísticas
+    def centroid(self) -> Dict[str, float]:
+        # Sin canciones el centroide queda en NaN, como np.mean de un array vacío
+        if self.count == 0:
+            return {"valence": float("nan"), "arousal": float("nan")}
+        return {"valence": self._valence.mean, "arousal": self._arousal.mean}
+
+    def dispersion(self) -> Dict[str, float]:
+        return {"valence_std": self._valence.std(), "arousal_std": self._arousal.std()}
+
+    # Serialización
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "valence": {"mean": self._valence.mean, "m2": self._valence.m2},
+            "arousal": {"mean": self._arousal.mean, "m2": self._arousal.m2},
+            "quadrant_counts": dict(self.quadrant_counts),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "EmotionalAggregate":
+        aggregate = cls()
+        count = data["count"]
+        aggregate._valence = _Welford(count, data["valence"]["mean"], data["valence"]["m2"])
+        aggregate._arousal = _Welford(count, data["arousal"]["mean"], data["arousal"]["m2"])
+        for quadrant in QUADRANTS:
+            aggregate.quadrant_counts[quadrant] = data["quadrant_counts"].get(quadrant, 0)
+        return aggregate
@@ -1,6 +1,8 @@
 import numpy as np
 from typing import Dict, List, Any
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from app.analyzers.emotional_aggregate import EmotionalAggregate
+from app.analyzers.charts import render_figure
 
 class EmotionalDiversityAnalyzer:
     def __init__(self):
@@ -37,7 +39,18 @@ class EmotionalDiversityAnalyzer:
             category = self._categorize_song(song['valence'], song['arousal'])
             category_counts[category] += 1
 
-        total = len(songs)
+        return self._diversity_from_counts(category_counts)
+
+    def calculate_diversity_from_aggregate(self, aggregate: EmotionalAggregate) -> Dict[str, Any]:
+        """
+        Calcula la diversidad a partir de los conteos por cuadrante de un EmotionalAggregate,
+        sin recorrer las canciones.
+        """
+        category_counts = {c: aggregate.quadrant_counts.get(c, 0) for c in self.categories}
+        return self._diversity_from_counts(category_counts)
+
+    def _diversity_from_counts(self, category_counts: Dict[str, int]) -> Dict[str, Any]:
+        total = sum(category_counts.values())
         proportions = [count / total for count in category_counts.values()]
         shannon = self.calculate_shannon_diversity(proportions)
         normalized = self.normalize_shannon_index(shannon, len(self.categories))
@@ -48,8 +61,9 @@ class EmotionalDiversityAnalyzer:
             'category_counts': category_counts
         }
 
-    def visualize(self, diversity_result: Dict[str, Any], save_path: str = None):
-        fig = plt.figure(figsize=(12, 6))
+    def build_figure(self, diversity_result: Dict[str, Any]) -> Figure:
+        # Figure sin pyplot: no depende del backend gráfico ni queda abierta en un registro global
+        fig = Figure(figsize=(12, 6))
         gs = fig.add_gridspec(1, 2, wspace=0.3)
 
         # Panel 1: Gráfico de pastel
@@ -106,18 +120,27 @@ class EmotionalDiversityAnalyzer:
 
         fig.suptitle('Análisis de Diversidad Emocional Musical', fontsize=18, fontweight='bold')
 
+        return fig
+
+    def render(self, diversity_result: Dict[str, Any], fmt: str = "png", dpi: int = 100) -> bytes:
+        """
+        Renderiza el gráfico de diversidad y devuelve los bytes de la imagen (png o svg).
+        """
+        return render_figure(self.build_figure(diversity_result), fmt, dpi)
+
+    def visualize(self, diversity_result: Dict[str, Any], save_path: str = None):
+        fig = self.build_figure(diversity_result)
+
         if save_path:
-            plt.savefig(save_path, dpi=300, bbox_inches='tight')
+            fig.savefig(save_path, dpi=300, bbox_inches='tight')
             print(f"Visualización guardada en: {save_path}")
-
-        plt.show()
+        fig.clear()
 
 
 def analyze_emotional_diversity(valence_arousal_result: Dict[str, Any]) -> Dict[str, Any]:
     analyzer = EmotionalDiversityAnalyzer()
-    result = analyzer.calculate_diversity_from_valence_arousal(valence_arousal_result)
-    analyzer.visualize(result)
-    return result
+    # El gráfico ya no se dibuja acá: se pide aparte a /api/sonemica/charts/diversity
+    return analyzer.calculate_diversity_from_valence_arousal(valence_arousal_result)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,42 @@
+import re
+
+# Palabras funcionales muy frecuentes de cada idioma; alcanzan para distinguir letras completas
+STOPWORDS = {
+    "en": frozenset(
+        "the and you i to a it me my is in that of on your for be all we don't im i'm with what this".split()
+    ),
+    "es": frozenset(
+        "que de la el y en no me te lo los las se mi por un una con es tu para como pero más yo".split()
+    ),
+    "pt": frozenset(
+        "que de não eu você o a e um uma com é do da meu minha pra por mais se te".split()
+    ),
+}
+
+_WORD_RE = re.compile(r"[^\W\d_]+(?:'[^\W\d_]+)?")
+
+# Cantidad de palabras que se miran de cada letra
+SAMPLE_WORDS = 200
+
+
+def detect_language(text: str, default: str = "en", sample_words: int = SAMPLE_WORDS) -> str:
+    """
+    Idioma probable de una letra ("en", "es", "pt") según cuántas de sus primeras palabras son
+    palabras funcionales de cada idioma. Si no hay suficientes indicios devuelve `default`.
+
+    Es un conteo sobre unas pocas palabras, pensado para elegir modelo antes de la inferencia sin
+    sumarle costo: no reemplaza a un detector de idioma de propósito general.
+    """
+    if not text:
+        return default
+
+    words = _WORD_RE.findall(text.lower())[:sample_words]
+    if not words:
+        return default
+
+    scores = {language: sum(word in stopwords for word in words) for language, stopwords in STOPWORDS.items()}
+    language, hits = max(scores.items(), key=lambda item: item[1])
+    # Pedimos que al menos una de cada diez palabras sea funcional antes de confiar en el resultado
+    if hits * 10 < len(words):
+        return default
+    return language
@@ -0,0 +1,146 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from functools import lru_cache
+from typing import Callable, Dict, List
+
+from app.analyzers.language import detect_language
+from app.analyzers.transformer import TransformerAnalyzer, get_transformer_analyzer
+from app.config import Config
+from app.utils.metrics import MODEL_EVICTIONS, MODEL_LOADED_BYTES, ROUTED_LYRICS
+
+
+def parse_model_specs(value: str) -> Dict[str, str]:
+    """
+    Lee la lista de modelos en el formato "clave=modelo,clave=modelo" (por ejemplo "es=org/modelo-es").
+    """
+    specs = {}
+    for item in value.split(","):
+        key, _, model_name = item.partition("=")
+        if key.strip() and model_name.strip():
+            specs[key.strip()] = model_name.strip()
+    return specs
+
+
+class ModelRegistry:
+    """
+    Modelos de emociones adicionales, cargados por clave (idioma, género) recién cuando se usan.
+
+    El modelo por defecto (get_transformer_analyzer) está siempre disponible. Los demás se cargan
+    la primera vez que se les asigna una letra y, si la memoria de todos los cargados supera
+    `budget_bytes`, se descartan los usados hace más tiempo (LRU). Un modelo descartado se vuelve a
+    cargar si se lo necesita otra vez.
+
+    La carga (from_pretrained, segundos) ocurre fuera del lock: mientras se carga un modelo, los
+    pedidos de otras claves siguen atendiéndose, y los de la misma clave esperan esa única carga.
+
+    analyze_batch detecta el idioma de cada letra, la asigna al modelo de esa clave (o al de por
+    defecto si no hay uno para ese idioma) y llama una sola vez a cada modelo con todas sus letras.
+    """
+
+    def __init__(
+        self,
+        specs: Dict[str, str],
+        budget_bytes: int,
+        default_analyzer: Callable[[], TransformerAnalyzer] = get_transformer_analyzer,
+        loader: Callable[[str], TransformerAnalyzer] = TransformerAnalyzer,
+    ):
+        self.specs = specs
+        self.budget_bytes = budget_bytes
+        self._default_analyzer = default_analyzer
+        self._loader = loader
+        self._lock = threading.Lock()
+        self._loaded: "OrderedDict[str, TransformerAnalyzer]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        # Cargas en curso por clave: quien llega durante la carga espera el mismo Future
+        self._loading: Dict[str, Future] = {}
+
+    @property
+    def loaded_keys(self) -> List[str]:
+        with self._lock:
+            return list(self._loaded)
+
+    def get(self, key: str) -> TransformerAnalyzer:
+        """
+        Modelo de la clave dada (el de por defecto si la clave no está configurada).
+        """
+        if key not in self.specs:
+            return self._default_analyzer()
+
+        with self._lock:
+            analyzer = self._loaded.get(key)
+            if analyzer is not None:
+                self._loaded.move_to_end(key)
+                return analyzer
+
+            future = self._loading.get(key)
+            owner = future is None
+            if owner:
+                future = self._loading[key] = Future()
+
+        if not owner:
+            return future.result()
+
+        try:
+            print(f"📦 Cargando modelo '{key}': {self.specs[key]}")
+            analyzer = self._loader(self.specs[key])
+            size = analyzer.memory_bytes()
+        except BaseException as e:
+            with self._lock:
+                del self._loading[key]
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            del self._loading[key]
+            self._loaded[key] = analyzer
+            self._sizes[key] = size
+            self._evict(keep=key)
+            self._publish()
+        future.set_result(analyzer)
+        return analyzer
+
+    def _evict(self, keep: str):
+        # Quien esté usando un modelo descartado conserva su referencia hasta terminar
+        while sum(self._sizes.values()) > self.budget_bytes and len(self._loaded) > 1:
+            key = next(k for k in self._loaded if k != keep)
+            del self._loaded[key]
+            del self._sizes[key]
+            MODEL_EVICTIONS.inc(model=key)
+            print(f"♻️ Modelo '{key}' descartado por presupuesto de memoria")
+
+    def _publish(self):
+        for key in self.specs:
+            MODEL_LOADED_BYTES.set(self._sizes.get(key, 0), model=key)
+
+    def route(self, song: dict) -> str:
+        return detect_language(song.get("Lyrics") or "")
+
+    def analyze_batch(self, songs: List[dict], batch_size: int = 16) -> List[dict]:
+        """
+        Analiza varias letras con el modelo de su idioma y devuelve los resultados en el mismo orden.
+        """
+        groups: Dict[str, List[int]] = {}
+        for i, song in enumerate(songs):
+            key = self.route(song)
+            groups.setdefault(key if key in self.specs else "default", []).append(i)
+
+        results = [None] * len(songs)
+        for key, indices in groups.items():
+            ROUTED_LYRICS.inc(len(indices), model=key)
+            for i, result in zip(indices, self.get(key).analyze_batch([songs[i] for i in indices], batch_size)):
+                results[i] = result
+        return results
+
+    def analyze(self, song: dict) -> dict:
+        return self.analyze_batch([song])[0]
+
+
+@lru_cache(maxsize=1)
+def get_model_registry() -> ModelRegistry:
+    """
+    Registro compartido por proceso, con los modelos de LYRICS_MODELS y el presupuesto MODEL_RAM_BUDGET_MB.
+    """
+    return ModelRegistry(
+        parse_model_specs(Config.LYRICS_MODELS), budget_bytes=Config.MODEL_RAM_BUDGET_MB * 1024 * 1024
+    )
@@ -1,22 +1,203 @@
+from functools import lru_cache
+import numpy as np
 from transformers import AutoTokenizer, AutoModelForSequenceClassification
 import torch
 import torch.nn.functional as F
+from app.config import Config
+from app.utils.metrics import INFERENCE_BATCH_SIZE, INFERENCE_TOKENS, INFERENCE_WINDOWS
+
+MAX_LENGTH = 512
+DEFAULT_MODEL = "cardiffnlp/twitter-roberta-base-emotion"
+EMOTION_LABELS = ["anger", "joy", "optimism", "sadness"]
+
+# Etiquetas de otros modelos de emociones llevadas a las cuatro que usa el resto del análisis.
+# Las que no figuran (neutral, others) se reparten en partes iguales, así no mueven la valencia
+LABEL_MAP = {
+    "anger": "anger",
+    "disgust": "anger",
+    "fear": "sadness",
+    "sadness": "sadness",
+    "joy": "joy",
+    "love": "joy",
+    "optimism": "optimism",
+    "surprise": "optimism",
+}
 
 
 class TransformerAnalyzer:
-    def __init__(self):
-        self.model_name = "cardiffnlp/twitter-roberta-base-emotion"
-        self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
-        self.model = AutoModelForSequenceClassification.from_pretrained(self.model_name)
-        self.labels = ["anger", "joy", "optimism", "sadness"]
+    def __init__(self, model_name: str = DEFAULT_MODEL, tokenizer=None, model=None):
+        """
+        `tokenizer` y `model` permiten usar un modelo ya construido (por ejemplo, el modelo de prueba
+        de benchmarks/) en lugar de descargar `model_name`.
+        """
+        self.model_name = model_name
+        self.tokenizer = tokenizer or AutoTokenizer.from_pretrained(self.model_name)
+        self.model = model or AutoModelForSequenceClassification.from_pretrained(self.model_name)
+        self.labels = EMOTION_LABELS
+
+        self._projection = None
+        if model_name != DEFAULT_MODEL:
+            config = self.model.config
+            projection = torch.full((config.num_labels, len(self.labels)), 1 / len(self.labels))
+            for i in range(config.num_labels):
+                label = LABEL_MAP.get(config.id2label[i].lower())
+                if label is not None:
+                    projection[i] = 0
+                    projection[i, self.labels.index(label)] = 1
+            self._projection = projection
+
+    def memory_bytes(self) -> int:
+        """
+        Memoria que ocupan los pesos del modelo.
+        """
+        tensors = list(self.model.parameters()) + list(self.model.buffers())
+        return sum(t.numel() * t.element_size() for t in tensors)
+
+    def _probabilities(self, logits: torch.Tensor) -> torch.Tensor:
+        probs = F.softmax(logits, dim=-1)
+        return probs if self._projection is None else probs @ self._projection
 
     def analyze(self, song: dict[str: str]) -> dict:
+        if Config.LYRICS_WINDOWED:
+            return self.analyze_batch([song])[0]
+
         inputs = self.tokenizer(
-            song.get("Lyrics"), return_tensors="pt", truncation=True, max_length=512
+            song.get("Lyrics"), return_tensors="pt", truncation=True, max_length=MAX_LENGTH
         )
+        INFERENCE_BATCH_SIZE.observe(1)
+        INFERENCE_TOKENS.inc(int(inputs["input_ids"].shape[-1]))
         with torch.no_grad():
             logits = self.model(**inputs).logits
-        probs = F.softmax(logits, dim=-1)[0]
+        probs = self._probabilities(logits)[0]
+        return self._result(song, probs)
+
+    def analyze_batch(self, songs: list[dict], batch_size: int = 16) -> list[dict]:
+        """
+        Analiza varias letras en lotes y devuelve los resultados en el mismo orden que `songs`.
+
+        Las letras se ordenan por longitud antes de armar los lotes para que el padding de cada lote sea mínimo.
+        Con LYRICS_WINDOWED cada letra se analiza completa, en ventanas (ver _analyze_windowed).
+        """
+        if Config.LYRICS_WINDOWED:
+            return self._analyze_windowed(songs, batch_size)
+
+        order = sorted(range(len(songs)), key=lambda i: len(songs[i].get("Lyrics") or ""))
+        results = [None] * len(songs)
+
+        for start in range(0, len(order), batch_size):
+            batch = order[start : start + batch_size]
+            inputs = self.tokenizer(
+                [songs[i].get("Lyrics") for i in batch],
+                return_tensors="pt",
+                truncation=True,
+                max_length=MAX_LENGTH,
+                padding=True,
+            )
+            INFERENCE_BATCH_SIZE.observe(len(batch))
+            INFERENCE_TOKENS.inc(int(inputs["attention_mask"].sum()))
+            with torch.no_grad():
+                logits = self.model(**inputs).logits
+            probs = self._probabilities(logits)
+            for row, i in enumerate(batch):
+                results[i] = self._result(songs[i], probs[row])
+
+        return results
+
+    def _analyze_windowed(
+        self, songs: list[dict], batch_size: int, overlap: int = None, max_windows: int = None
+    ) -> list[dict]:
+        """
+        Analiza cada letra completa partiéndola en ventanas de MAX_LENGTH tokens que se solapan en
+        `overlap` tokens.
+
+        Las ventanas de todas las letras se ordenan por longitud y se procesan juntas en lotes con
+        padding, así que una letra larga no suma pasadas propias del modelo. La distribución de cada
+        letra es el promedio de las de sus ventanas ponderado por sus tokens; con letras compactadas
+        cada token pesa las veces que aparecía su línea en la letra original ("Lyrics_line_counts"),
+        así un estribillo repetido conserva su peso aunque se analice una sola vez.
+        Si una letra tiene más de `max_windows` ventanas se toman `max_windows` repartidas a lo largo de ella.
+        """
+        overlap = Config.LYRICS_WINDOW_OVERLAP if overlap is None else overlap
+        max_windows = Config.LYRICS_MAX_WINDOWS if max_windows is None else max_windows
+
+        encoded = self.tokenizer(
+            [song.get("Lyrics") or "" for song in songs],
+            truncation=True,
+            max_length=MAX_LENGTH,
+            stride=overlap,
+            return_overflowing_tokens=True,
+            return_offsets_mapping=True,
+        )
+
+        windows_by_song = [[] for _ in songs]
+        for window, song_index in enumerate(encoded["overflow_to_sample_mapping"]):
+            windows_by_song[song_index].append(window)
+
+        window_weights = {}
+        for song, windows in zip(songs, windows_by_song):
+            window_weights.update(self._window_weights(song, windows, encoded))
+
+        selected = []
+        for windows in windows_by_song:
+            if len(windows) > max_windows:
+                picks = np.linspace(0, len(windows) - 1, max_windows).round().astype(int)
+                windows = [windows[k] for k in picks]
+            INFERENCE_WINDOWS.observe(len(windows))
+            selected.extend(windows)
+        selected.sort(key=lambda window: len(encoded["input_ids"][window]))
+
+        probs_by_window = {}
+        for start in range(0, len(selected), batch_size):
+            batch = selected[start : start + batch_size]
+            inputs = self.tokenizer.pad(
+                {
+                    "input_ids": [encoded["input_ids"][w] for w in batch],
+                    "attention_mask": [encoded["attention_mask"][w] for w in batch],
+                },
+                return_tensors="pt",
+            )
+            INFERENCE_BATCH_SIZE.observe(len(batch))
+            INFERENCE_TOKENS.inc(int(inputs["attention_mask"].sum()))
+            with torch.no_grad():
+                logits = self.model(**inputs).logits
+            probs = self._probabilities(logits)
+            for row, window in enumerate(batch):
+                probs_by_window[window] = probs[row]
+
+        results = []
+        for song, windows in zip(songs, windows_by_song):
+            windows = [w for w in windows if w in probs_by_window]
+            weights = torch.tensor([window_weights[w] for w in windows]).unsqueeze(-1)
+            stacked = torch.stack([probs_by_window[w] for w in windows])
+            results.append(self._result(song, (stacked * weights).sum(dim=0) / weights.sum()))
+        return results
+
+    @staticmethod
+    def _window_weights(song: dict, windows: list, encoded) -> dict:
+        """
+        Peso de cada ventana de la letra: la suma, por token, de las repeticiones de su línea en la
+        letra original (1 para los tokens especiales y para letras sin conteos).
+        """
+        lines = song.get("Lyrics_lines") or []
+        counts = song.get("Lyrics_line_counts") or []
+        if not counts or len(counts) != len(lines) or " ".join(lines) != song.get("Lyrics"):
+            return {w: float(sum(encoded["attention_mask"][w])) for w in windows}
+
+        # Posición de inicio de cada línea dentro de la letra (unidas con un espacio)
+        starts = np.cumsum([0] + [len(line) + 1 for line in lines[:-1]])
+
+        weights = {}
+        for w in windows:
+            weight = 0.0
+            for start, end in encoded["offset_mapping"][w]:
+                if end <= start:
+                    weight += 1
+                    continue
+                weight += counts[int(np.searchsorted(starts, start, side="right")) - 1]
+            weights[w] = weight
+        return weights
+
+    def _result(self, song: dict, probs: torch.Tensor) -> dict:
         top_idx = torch.argmax(probs).item()
         return {
             "method": "transformer",
@@ -27,6 +208,27 @@ class TransformerAnalyzer:
             "distribution": {label: float(p) for label, p in zip(self.labels, probs)},
         }
 
+
+@lru_cache(maxsize=1)
+def get_transformer_analyzer() -> TransformerAnalyzer:
+    """
+    Instancia compartida del modelo: se carga una sola vez por proceso y la usan todos los pedidos.
+    """
+    return TransformerAnalyzer()
+
+
+@lru_cache(maxsize=1)
+def get_lyrics_tokenizer():
+    """
+    Tokenizer del modelo por defecto, sin sus pesos, para medir las letras antes de analizarlas
+    (ver DataFetcher.prepare_lyrics). None si no se puede cargar (por ejemplo, sin red ni caché local).
+    """
+    try:
+        return AutoTokenizer.from_pretrained(DEFAULT_MODEL)
+    except OSError as e:
+        print(f"⚠️ No se pudo cargar el tokenizer de {DEFAULT_MODEL}, no se medirán los tokens de las letras: {e}")
+        return None
+
 """
 Prueba unitaria de modelo de inferencia emocional
 """
@@ -1,11 +1,44 @@
 import polars as pl
 import numpy as np
 from typing import List, Dict, Any, Optional
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
 from scipy.spatial import ConvexHull
 import json
 import re
 from difflib import SequenceMatcher
+from app.analyzers.emotional_aggregate import EmotionalAggregate
+from app.analyzers.charts import render_figure
+from app.config import Config
+
+
+def _round2(values: np.ndarray) -> np.ndarray:
+    """
+    Redondea a 2 decimales igual que round() de Python, pero sobre un array completo.
+
+    El producto por 100 en float64 puede caer justo en un empate (x.5) que el valor real no es
+    (1.115 es 1.11499... y su producto da 111.5). Esos casos, los únicos en que rint puede diferir
+    de round, se detectan en float64 y se resuelven con round(); el resto se redondea vectorizado.
+    """
+    values = values.astype(np.float64)
+    scaled = values * 100
+    rounded = np.rint(scaled)
+    result = rounded / 100.0
+    for i in np.flatnonzero(np.abs(scaled - rounded) == 0.5):
+        result[i] = round(float(values[i]), 2)
+    return result
+
+
+def _extreme_indices(values: np.ndarray, k: int) -> List[int]:
+    """
+    Índices de los `k` valores más bajos y los `k` más altos, sin ordenar el array completo.
+    """
+    n = len(values)
+    if n <= 2 * k:
+        return list(range(n))
+
+    lowest = np.argpartition(values, k - 1)[:k]
+    highest = np.argpartition(values, n - k)[n - k:]
+    return lowest.tolist() + highest.tolist()
 
 
 class ValenceArousalAnalyzer:
@@ -111,7 +144,7 @@ class ValenceArousalAnalyzer:
         elif valence < 50 and arousal < 50:
             category = "low_valence_low_arousal"
             label = "Tristeza/Melancolía"
-            category = "Estado desactivado y negativo"
+            description = "Estado desactivado y negativo"
         else:
             category = "high_valence_low_arousal"
             label = "Calma/Paz"
@@ -122,34 +155,39 @@ class ValenceArousalAnalyzer:
     def _calculate_quadrant_distribution(
         self, valences: np.ndarray, arousals: np.ndarray
     ) -> Dict[str, Any]:
-        total = len(valences)
-
         q1 = np.sum((valences >= 50) & (arousals >= 50))
         q2 = np.sum((valences < 50) & (arousals >= 50))
         q3 = np.sum((valences < 50) & (arousals < 50))
         q4 = np.sum((valences >= 50) & (arousals < 50))
 
-        return {
-            "high_valence_high_arousal": {
-                "count": int(q1),
-                "percentage": round((q1 / total) * 100, 2),
-                "label": "Alegría/Excitación",
-            },
-            "low_valence_high_arousal": {
-                "count": int(q2),
-                "percentage": round((q2 / total) * 100, 2),
-                "label": "Tensión/Ansiedad",
-            },
-            "low_valence_low_arousal": {
-                "count": int(q3),
-                "percentage": round((q3 / total) * 100, 2),
-                "label": "Tristeza/Melancolía",
-            },
-            "high_valence_low_arousal": {
-                "count": int(q4),
-                "percentage": round((q4 / total) * 100, 2),
-                "label": "Calma/Paz",
+        return self._format_quadrant_distribution(
+            {
+                "high_valence_high_arousal": q1,
+                "low_valence_high_arousal": q2,
+                "low_valence_low_arousal": q3,
+                "high_valence_low_arousal": q4,
             },
+            len(valences),
+        )
+
+    def _format_quadrant_distribution(
+        self, counts: Dict[str, int], total: int
+    ) -> Dict[str, Any]:
+        labels = {
+            "high_valence_high_arousal": "Alegría/Excitación",
+            "low_valence_high_arousal": "Tensión/Ansiedad",
+            "low_valence_low_arousal": "Tristeza/Melancolía",
+            "high_valence_low_arousal": "Calma/Paz",
+        }
+
+        # Sin canciones los porcentajes quedan en NaN, igual que el centroide y la dispersión
+        return {
+            quadrant: {
+                "count": int(counts.get(quadrant, 0)),
+                "percentage": round((counts.get(quadrant, 0) / total) * 100, 2) if total else float("nan"),
+                "label": label,
+            }
+            for quadrant, label in labels.items()
         }
 
     # Métodos principales
@@ -329,6 +367,19 @@ class ValenceArousalAnalyzer:
         valences_array = np.array(valences)
         arousals_array = np.array(arousals)
 
+        return self._summarize(processed_songs, valences_array, arousals_array, stats)
+
+    def _summarize(
+        self,
+        processed_songs: List[Dict[str, Any]],
+        valences_array: np.ndarray,
+        arousals_array: np.ndarray,
+        stats: Dict[str, int],
+        quadrant_distribution: Dict[str, Any] = None,
+    ) -> Dict[str, Any]:
+        """
+        Arma el resultado final (centroide, dispersión y cuadrantes) a partir de las canciones procesadas.
+        """
         centroid_valence = float(np.mean(valences_array))
         centroid_arousal = float(np.mean(arousals_array))
 
@@ -336,7 +387,8 @@ class ValenceArousalAnalyzer:
         arousal_std = float(np.std(arousals_array))
 
         emotional_state = self._classify_emotional_state(centroid_valence, centroid_arousal)
-        quadrant_distribution = self._calculate_quadrant_distribution(valences_array, arousals_array)
+        if quadrant_distribution is None:
+            quadrant_distribution = self._calculate_quadrant_distribution(valences_array, arousals_array)
 
         result = {
             'songs': processed_songs,
@@ -357,27 +409,275 @@ class ValenceArousalAnalyzer:
         }
         
         return result
+
+    def summarize_aggregate(self, aggregate: EmotionalAggregate) -> Dict[str, Any]:
+        """
+        Arma el mismo bloque "summary" que process_songs a partir de un EmotionalAggregate,
+        sin necesitar la lista de canciones (por ejemplo, un agregado mantenido en forma incremental).
+        """
+        centroid = aggregate.centroid()
+        dispersion = aggregate.dispersion()
+
+        return {
+            'total_songs': aggregate.count,
+            'centroid': {
+                'valence': round(centroid['valence'], 2),
+                'arousal': round(centroid['arousal'], 2),
+                'emotional_state': self._classify_emotional_state(
+                    centroid['valence'], centroid['arousal']
+                )
+            },
+            'dispersion': {
+                'valence_std': round(dispersion['valence_std'], 2),
+                'arousal_std': round(dispersion['arousal_std'], 2)
+            },
+            'quadrant_distribution': self._format_quadrant_distribution(
+                aggregate.quadrant_counts, aggregate.count
+            )
+        }
+
+    # Camino columnar
+    def build_tracks_table(
+        self,
+        songs_data: List[Dict[str, Any]],
+        sentiment_data: List[Dict[str, Any]] = None,
+    ) -> pl.DataFrame:
+        """
+        Une las audio features y los análisis de letras en una sola tabla, con una fila por canción.
+
+        Reproduce el emparejamiento de process_songs (clave normalizada título|artista, y si una clave
+        se repite gana la última aparición) pero con un join en lugar de diccionarios.
+        """
+        sentiment_data = sentiment_data or []
+
+        audio_df = pl.DataFrame(
+            {
+                "title": [song.get("Title") for song in songs_data],
+                "artist": [song.get("Artist") for song in songs_data],
+                "music_valence": [song.get("Valence") for song in songs_data],
+                "energy": [song.get("Energy") for song in songs_data],
+                "loudness": [song.get("Loudness") for song in songs_data],
+            },
+            schema_overrides={"title": pl.Utf8, "artist": pl.Utf8},
+        )
+        sentiment_df = pl.DataFrame(
+            {
+                "sentiment_title": [s.get("title") for s in sentiment_data],
+                "sentiment_artist": [s.get("artist") for s in sentiment_data],
+                "anger": [s["distribution"].get("anger") for s in sentiment_data],
+                "joy": [s["distribution"].get("joy") for s in sentiment_data],
+                "optimism": [s["distribution"].get("optimism") for s in sentiment_data],
+                "sadness": [s["distribution"].get("sadness") for s in sentiment_data],
+                "sentiment_scores": sentiment_data,
+            },
+            schema_overrides={
+                "sentiment_title": pl.Utf8,
+                "sentiment_artist": pl.Utf8,
+                "anger": pl.Float64,
+                "joy": pl.Float64,
+                "optimism": pl.Float64,
+                "sadness": pl.Float64,
+            },
+        )
+
+        audio_df = self._with_song_key(audio_df, "title", "artist").with_columns(
+            has_audio=pl.lit(True)
+        )
+        sentiment_df = self._with_song_key(
+            sentiment_df, "sentiment_title", "sentiment_artist"
+        ).with_columns(has_lyrics=pl.lit(True))
+
+        tracks = audio_df.join(sentiment_df, on="song_key", how="full", coalesce=True)
+
+        # Igual que en process_songs: se prefiere el título/artista de las audio features
+        return tracks.with_columns(
+            title=pl.coalesce("title", "sentiment_title"),
+            artist=pl.coalesce("artist", "sentiment_artist"),
+            has_audio=pl.col("has_audio").fill_null(False),
+            has_lyrics=pl.col("has_lyrics").fill_null(False),
+        ).drop("sentiment_title", "sentiment_artist")
+
+    def _with_song_key(self, df: pl.DataFrame, title_col: str, artist_col: str) -> pl.DataFrame:
+        """
+        Agrega la clave normalizada de canción (equivalente a _create_song_key) y descarta duplicados.
+        """
+
+        def normalize(col: str) -> pl.Expr:
+            return pl.col(col).str.to_lowercase().str.replace_all(r"[^a-z0-9]", "")
+
+        return (
+            df.filter(
+                pl.col(title_col).is_not_null()
+                & (pl.col(title_col) != "")
+                & pl.col(artist_col).is_not_null()
+                & (pl.col(artist_col) != "")
+            )
+            .with_columns(
+                song_key=pl.concat_str([normalize(title_col), normalize(artist_col)], separator="|")
+            )
+            .unique(subset="song_key", keep="last", maintain_order=True)
+        )
+
+    def process_songs_columnar(
+        self, tracks, input_counts: Dict[str, int] = None
+    ) -> Dict[str, Any]:
+        """
+        Versión columnar de process_songs pensada para historiales de miles de canciones.
+
+        Recibe una tabla de polars o de Arrow con una fila por canción y las columnas:
+        - title, artist
+        - music_valence, energy, loudness (nulas si no hay audio features)
+        - anger, joy, optimism, sadness (nulas si no hay análisis de la letra)
+        - opcionalmente has_audio, has_lyrics y sentiment_scores (ver build_tracks_table)
+
+        Valencia, arousal, fuente de datos y cuadrante se calculan como expresiones sobre columnas
+        completas, sin recorrer las canciones en Python. El resultado tiene la misma forma y los
+        mismos valores que process_songs, con las canciones en el orden de la tabla.
+
+        `input_counts` permite informar en las estadísticas la cantidad de filas de entrada
+        ("songs_with_audio_features", "songs_with_sentiments") antes de descartar duplicados, como
+        hace process_songs. Si no se indica, se cuentan las canciones de la tabla.
+        """
+        input_counts = input_counts or {}
+        if not isinstance(tracks, pl.DataFrame):
+            tracks = pl.from_arrow(tracks)
+
+        if "has_audio" not in tracks.columns:
+            tracks = tracks.with_columns(has_audio=pl.col("music_valence").is_not_null())
+        if "has_lyrics" not in tracks.columns:
+            tracks = tracks.with_columns(has_lyrics=pl.col("joy").is_not_null())
+        if "sentiment_scores" not in tracks.columns:
+            tracks = tracks.with_columns(sentiment_scores=pl.lit(None))
+
+        has_audio = pl.col("has_audio")
+        has_lyrics = pl.col("has_lyrics")
+        has_music_valence = has_audio & pl.col("music_valence").is_not_null()
+
+        # Mismas fórmulas que calculate_lyrics_valence y calculate_arousal
+        positive_contribution = (pl.col("joy") + pl.col("optimism")) * 100
+        negative_contribution = (pl.col("sadness") + pl.col("anger")) * 100
+        lyrics_valence = (50 + (positive_contribution - negative_contribution) / 2).clip(0, 100)
+
+        normalized_loudness = ((pl.col("loudness") + 60) / 60 * 100).clip(0, 100)
+        audio_arousal = (pl.col("energy") * 0.8 + normalized_loudness * 0.2).clip(0, 100)
+        lyrics_arousal = (
+            50
+            + pl.col("anger") * 40
+            + pl.col("joy") * 20
+            + pl.col("optimism") * 15
+            - pl.col("sadness") * 30
+        ).clip(0, 100)
+
+        processed = (
+            tracks.filter(has_music_valence | has_lyrics)
+            .with_columns(
+                lyrics_valence=pl.when(has_lyrics).then(lyrics_valence),
+                music_valence=pl.when(has_music_valence).then(pl.col("music_valence")),
+            )
+            .with_columns(
+                valence=pl.when(has_music_valence & has_lyrics)
+                .then(
+                    pl.col("music_valence") * self.weight_music_valence
+                    + pl.col("lyrics_valence") * self.weight_lyrics_valence
+                )
+                .when(has_music_valence)
+                .then(pl.col("music_valence"))
+                .otherwise(pl.col("lyrics_valence")),
+                arousal=pl.when(has_audio).then(audio_arousal).otherwise(lyrics_arousal),
+                data_source=pl.when(has_music_valence & has_lyrics)
+                .then(pl.lit("both"))
+                .when(has_music_valence)
+                .then(pl.lit("audio_only"))
+                .otherwise(pl.lit("lyrics_only")),
+            )
+            .with_columns(
+                quadrant=pl.when(pl.col("valence") >= 50)
+                .then(
+                    pl.when(pl.col("arousal") >= 50)
+                    .then(pl.lit("high_valence_high_arousal"))
+                    .otherwise(pl.lit("high_valence_low_arousal"))
+                )
+                .otherwise(
+                    pl.when(pl.col("arousal") >= 50)
+                    .then(pl.lit("low_valence_high_arousal"))
+                    .otherwise(pl.lit("low_valence_low_arousal"))
+                )
+            )
+        )
+
+        valences_array = processed["valence"].cast(pl.Float64).to_numpy()
+        arousals_array = processed["arousal"].cast(pl.Float64).to_numpy()
+
+        songs_df = processed.select(
+            "title",
+            "artist",
+            pl.Series("valence", _round2(valences_array)),
+            pl.Series("arousal", _round2(arousals_array)),
+            pl.Series(
+                "music_valence",
+                _round2(processed["music_valence"].cast(pl.Float64).to_numpy()),
+            ).fill_nan(None),
+            pl.Series(
+                "lyrics_valence",
+                _round2(processed["lyrics_valence"].cast(pl.Float64).to_numpy()),
+            ).fill_nan(None),
+            "energy",
+            "loudness",
+            "data_source",
+            "sentiment_scores",
+        )
+
+        data_source_counts = processed["data_source"].value_counts()
+        counts = dict(zip(data_source_counts["data_source"], data_source_counts["count"]))
+        quadrant_counts = processed["quadrant"].value_counts()
+        quadrant_distribution = self._format_quadrant_distribution(
+            dict(zip(quadrant_counts["quadrant"], quadrant_counts["count"])), processed.height
+        )
+        n_rows = tracks.height
+        n_processed = processed.height
+
+        stats = {
+            "total_input_songs": 50,
+            "songs_with_audio_features": input_counts.get(
+                "songs_with_audio_features", int(tracks["has_audio"].sum())
+            ),
+            "songs_with_sentiments": input_counts.get(
+                "songs_with_sentiments", int(tracks["has_lyrics"].sum())
+            ),
+            "songs_with_both": int(counts.get("both", 0)),
+            "songs_with_only_audio": int(counts.get("audio_only", 0)),
+            "songs_with_only_sentiments": int(counts.get("lyrics_only", 0)),
+            "songs_processed": n_processed,
+            "songs_skipped": n_rows - n_processed,
+        }
+
+        return self._summarize(
+            songs_df.to_dicts(), valences_array, arousals_array, stats, quadrant_distribution
+        )
     
-    def visualize(self, analysis_result: Dict[str, Any], save_path: str = None):
+    def build_figure(
+        self, analysis_result: Dict[str, Any], density_threshold: Optional[int] = None
+    ) -> Optional[Figure]:
         """
         Crea una visualización del análisis de Valencia-Arousal.
         
         Ahora incluye código de color para mostrar qué canciones tienen
         ambos tipos de datos vs solo uno.
+
+        Con más de `density_threshold` canciones (por defecto Config.CHART_DENSITY_THRESHOLD) se
+        dibuja un mapa de densidad en lugar de un punto por canción.
         """
         if 'error' in analysis_result:
             print(f"Error: {analysis_result['error']}")
-            return
+            return None
         
         songs = analysis_result['songs']
         centroid = analysis_result['summary']['centroid']
         stats = analysis_result.get('stats', {})
         
-        valences = [s['valence'] for s in songs]
-        arousals = [s['arousal'] for s in songs]
-        
-        # Extraemos el tipo de fuente de datos para colorear los puntos
-        data_sources = [s['data_source'] for s in songs]
+        n_songs = len(songs)
+        valences = np.fromiter((s['valence'] for s in songs), dtype=np.float64, count=n_songs)
+        arousals = np.fromiter((s['arousal'] for s in songs), dtype=np.float64, count=n_songs)
         
         # Mapeamos fuentes de datos a colores
         color_map = {
@@ -385,9 +685,15 @@ class ValenceArousalAnalyzer:
             'audio_only': 'orange',
             'lyrics_only': 'green'
         }
-        colors = [color_map[source] for source in data_sources]
+
+        if density_threshold is None:
+            density_threshold = Config.CHART_DENSITY_THRESHOLD
+        density_mode = n_songs > density_threshold
         
-        fig, ax = plt.subplots(figsize=(14, 11))
+        # Usamos Figure directamente (sin pyplot): no queda registrada en ningún estado global,
+        # así que puede renderizarse desde cualquier hilo sin backend gráfico.
+        fig = Figure(figsize=(14, 11))
+        ax = fig.subplots()
         
         # Dibujamos las líneas del cuadrante
         ax.axhline(y=50, color='gray', linestyle='--', linewidth=0.8, alpha=0.5)
@@ -399,9 +705,20 @@ class ValenceArousalAnalyzer:
         ax.fill_between([0, 50], 0, 50, alpha=0.1, color='blue')
         ax.fill_between([50, 100], 0, 50, alpha=0.1, color='yellow')
         
-        # Graficamos cada canción con su color según la fuente de datos
-        for i, (v, a, c) in enumerate(zip(valences, arousals, colors)):
-            ax.scatter(v, a, c=c, s=100, alpha=0.6, edgecolors='black', linewidth=1)
+        if density_mode:
+            # Con historiales grandes los puntos se tapan entre sí: mostramos la densidad en celdas
+            # hexagonales, cuyo costo de dibujo depende de la grilla y no de la cantidad de canciones
+            density = ax.hexbin(valences, arousals, gridsize=50, extent=(0, 100, 0, 100),
+                               mincnt=1, bins='log', cmap='viridis', alpha=0.8, zorder=2)
+            fig.colorbar(density, ax=ax, label='Canciones por celda')
+        else:
+            # Un único scatter por fuente de datos en lugar de uno por canción
+            data_sources = np.array([s['data_source'] for s in songs])
+            for source, color in color_map.items():
+                mask = data_sources == source
+                if mask.any():
+                    ax.scatter(valences[mask], arousals[mask], c=color, s=100, alpha=0.6,
+                              edgecolors='black', linewidth=1)
         
         # Graficamos el centroide
         ax.scatter(centroid['valence'], centroid['arousal'],
@@ -409,20 +726,14 @@ class ValenceArousalAnalyzer:
                   linewidth=2, label='Centroide Emocional', zorder=5)
         
         # Etiquetamos algunas canciones extremas
-        valence_sorted_idx = np.argsort(valences)
-        arousal_sorted_idx = np.argsort(arousals)
-        
-        indices_to_label = set(
-            list(valence_sorted_idx[:2]) + list(valence_sorted_idx[-2:]) +
-            list(arousal_sorted_idx[:2]) + list(arousal_sorted_idx[-2:])
-        )
+        indices_to_label = set(_extreme_indices(valences, 2)) | set(_extreme_indices(arousals, 2))
         
-        for idx in indices_to_label:
+        for idx in sorted(indices_to_label):
             song = songs[idx]
             ax.annotate(f"{song['title']}\n{song['artist']}", 
                        (valences[idx], arousals[idx]),
                        xytext=(5, 5), textcoords='offset points',
-                       fontsize=8,
+                       fontsize=8, zorder=6,
                        bbox=dict(boxstyle='round,pad=0.3', 
                                 facecolor='white', edgecolor='gray', alpha=0.7))
         
@@ -450,22 +761,42 @@ class ValenceArousalAnalyzer:
         
         # Leyenda actualizada con los colores de fuente de datos
         from matplotlib.patches import Patch
-        legend_elements = [
+        legend_elements = [] if density_mode else [
             Patch(facecolor='darkblue', label='Audio + Letras'),
             Patch(facecolor='orange', label='Solo Audio Features'),
             Patch(facecolor='green', label='Solo Análisis Letras'),
+        ]
+        legend_elements.append(
             ax.scatter([], [], c='red', s=300, marker='*', 
                       edgecolors='darkred', linewidth=2, label='Centroide')
-        ]
+        )
         ax.legend(handles=legend_elements, loc='upper right', fontsize=9)
         
-        plt.tight_layout()
-        
+        fig.tight_layout()
+
+        return fig
+
+    def render(self, analysis_result: Dict[str, Any], fmt: str = "png", dpi: int = 100) -> Optional[bytes]:
+        """
+        Renderiza el mapa de Valencia-Arousal y devuelve los bytes de la imagen (png o svg).
+        """
+        fig = self.build_figure(analysis_result)
+        if fig is None:
+            return None
+        return render_figure(fig, fmt, dpi)
+
+    def visualize(self, analysis_result: Dict[str, Any], save_path: str = None):
+        """
+        Crea una visualización del análisis de Valencia-Arousal y la guarda en `save_path`.
+        """
+        fig = self.build_figure(analysis_result)
+        if fig is None:
+            return
+
         if save_path:
-            plt.savefig(save_path, dpi=300, bbox_inches='tight')
+            fig.savefig(save_path, dpi=300, bbox_inches='tight')
             print(f"Visualización guardada en: {save_path}")
-        
-        #plt.show()
+        fig.clear()
 
 
 if __name__ == "__main__": 
@@ -1,9 +1,12 @@
 from fastapi import FastAPI
-from app.utils import setup_cors
+from fastapi.responses import PlainTextResponse
+from app.config import Config
+from app.utils import setup_cors, metrics_registry
 from app.routes import spotify_router, main_router
 
 
 def create_app():
+    Config.validate()
     app = FastAPI()
 
     """ Middleware Setup """
@@ -17,6 +20,14 @@ def create_app():
     def healthcheck():
         return {"status": "ok"}
 
+    """ Metrics Route (formato de texto de Prometheus) """
+
+    @app.get("/metrics", response_class=PlainTextResponse)
+    def metrics():
+        return PlainTextResponse(
+            metrics_registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+        )
+
     app.include_router(router=spotify_router, prefix="/api/auth/spotify")
     app.include_router(router=main_router, prefix="/api/sonemica")
 
@@ -8,3 +8,151 @@ class Config:
     SPOTIFY_CLIENT_ID = os.getenv("SPOTIFY_CLIENT_ID")
     SPOTIFY_CLIENT_SECRET = os.getenv("SPOTIFY_CLIENT_SECRET")
     SPOTIFY_REDIRECT_URI = os.getenv("SPOTIFY_REDIRECT_URI")
+    # Configurables para apuntar a servidores locales de prueba (ver loadtest/)
+    SPOTIFY_API_BASE = os.getenv("SPOTIFY_API_BASE", "https://api.spotify.com/v1").rstrip("/")
+    SPOTIFY_ACCOUNTS_BASE = os.getenv("SPOTIFY_ACCOUNTS_BASE", "https://accounts.spotify.com").rstrip("/")
+
+    # Servicios externos usados para generar el paisaje emocional.
+    # Las URLs son configurables para poder apuntarlas a servidores locales de prueba.
+    HF_SDXL_URL = os.getenv(
+        "HF_SDXL_URL",
+        "https://router.huggingface.co/hf-inference/models/stabilityai/stable-diffusion-xl-base-1.0",
+    )
+    HF_CHAT_BASE_URL = os.getenv("HF_CHAT_BASE_URL")
+    IMGBB_UPLOAD_URL = os.getenv("IMGBB_UPLOAD_URL", "https://api.imgbb.com/1/upload")
+
+    # Plazos (en segundos). El pedido a /analyzer tiene un plazo total que se reparte entre etapas;
+    # la generación de la imagen corre en segundo plano con su propio plazo.
+    REQUEST_DEADLINE_SECONDS = float(os.getenv("REQUEST_DEADLINE_SECONDS", "20"))
+    IMAGE_JOB_DEADLINE_SECONDS = float(os.getenv("IMAGE_JOB_DEADLINE_SECONDS", "120"))
+    STAGE_BUDGET_SPOTIFY = float(os.getenv("STAGE_BUDGET_SPOTIFY", "5"))
+    STAGE_BUDGET_SDXL = float(os.getenv("STAGE_BUDGET_SDXL", "60"))
+    STAGE_BUDGET_IMGBB = float(os.getenv("STAGE_BUDGET_IMGBB", "15"))
+    STAGE_BUDGET_VLM = float(os.getenv("STAGE_BUDGET_VLM", "45"))
+
+    # Circuit breakers por servicio externo
+    CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+    CIRCUIT_RESET_SECONDS = float(os.getenv("CIRCUIT_RESET_SECONDS", "30"))
+
+    # Cola de trabajos en segundo plano para la generación de imágenes
+    IMAGE_JOB_WORKERS = int(os.getenv("IMAGE_JOB_WORKERS", "2"))
+    IMAGE_JOB_MAX_FINISHED = int(os.getenv("IMAGE_JOB_MAX_FINISHED", "500"))
+    # Estado de los trabajos, compartido por todos los workers de serve.py
+    IMAGE_JOB_DB_PATH = os.getenv("IMAGE_JOB_DB_PATH", "cache/jobs.sqlite3")
+
+    # Caché de imágenes por distribución emocional cuantizada
+    IMAGE_CACHE_DIR = os.getenv("IMAGE_CACHE_DIR", "cache/images")
+    IMAGE_CACHE_MAX_MB = int(os.getenv("IMAGE_CACHE_MAX_MB", "200"))
+    IMAGE_CACHE_STEP = float(os.getenv("IMAGE_CACHE_STEP", "0.05"))
+
+    # Almacén local de imágenes direccionado por contenido
+    BLOB_STORE_DIR = os.getenv("BLOB_STORE_DIR", "cache/blobs")
+    PUBLIC_BASE_URL = os.getenv("PUBLIC_BASE_URL", "").rstrip("/")
+    # Cómo recibe la imagen el modelo de descripción: "inline" (data URL), "url" (URL local pública) o "imgbb"
+    IMAGE_VLM_SOURCE = os.getenv("IMAGE_VLM_SOURCE", "inline")
+
+    # Caché de respuestas completas por huella del historial de reproducciones
+    RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "1000"))
+    RESULT_CACHE_TTL_SECONDS = float(os.getenv("RESULT_CACHE_TTL_SECONDS", "3600"))
+    RESULT_CACHE_DB_PATH = os.getenv("RESULT_CACHE_DB_PATH", "cache/results.sqlite3")
+
+    # Renderizado de gráficos fuera del pedido de análisis
+    CHART_RENDER_WORKERS = int(os.getenv("CHART_RENDER_WORKERS", "2"))
+    CHART_CACHE_MAX_MB = int(os.getenv("CHART_CACHE_MAX_MB", "64"))
+    CHART_DPI = int(os.getenv("CHART_DPI", "100"))
+    CHART_RENDER_TIMEOUT = float(os.getenv("CHART_RENDER_TIMEOUT", "30"))
+    # Compresión de respuestas JSON grandes
+    COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+    GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+    BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "5"))
+
+    # Perfilado de pedidos a demanda (header X-Sonemica-Profile con el token, o una fracción al azar)
+    PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+    PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+    PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.001"))
+    PROFILE_DIR = os.getenv("PROFILE_DIR", "cache/profiles")
+    PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "50"))
+    # Sin pyinstrument el perfilado queda desactivado salvo que se acepte cProfile, que instrumenta cada
+    # llamada (bastante más lento que el muestreo) y solo sirve para diagnosticar en desarrollo
+    PROFILE_ALLOW_CPROFILE = os.getenv("PROFILE_ALLOW_CPROFILE", "false").lower() == "true"
+
+    # Control de admisión de /analyzer
+    ANALYZER_MAX_CONCURRENT = int(os.getenv("ANALYZER_MAX_CONCURRENT", "4"))
+    ANALYZER_MAX_QUEUE = int(os.getenv("ANALYZER_MAX_QUEUE", "16"))
+    ANALYZER_QUEUE_TIMEOUT = float(os.getenv("ANALYZER_QUEUE_TIMEOUT", "5"))
+    # Con esta cantidad de imágenes pendientes no se encolan más (el análisis se devuelve sin imagen)
+    IMAGE_JOB_BACKLOG_MAX = int(os.getenv("IMAGE_JOB_BACKLOG_MAX", "20"))
+
+    # Lanzador de producción (serve.py). 0 = según la cantidad de núcleos
+    SERVER_HOST = os.getenv("SERVER_HOST", "0.0.0.0")
+    SERVER_PORT = int(os.getenv("SERVER_PORT", "8000"))
+    SERVER_WORKERS = int(os.getenv("SERVER_WORKERS", "0"))
+    # Hilos de cómputo (torch, BLAS, polars) repartidos entre todos los workers
+    SERVER_THREADS = int(os.getenv("SERVER_THREADS", "0"))
+    # Fotos de las métricas de cada worker, que /metrics combina (ver app/utils/metrics.py)
+    METRICS_DIR = os.getenv("METRICS_DIR", "cache/metrics")
+    METRICS_FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", "5"))
+
+    # Inferencia de letras por lotes y análisis de grupos
+    INFERENCE_BATCH_SIZE = int(os.getenv("INFERENCE_BATCH_SIZE", "16"))
+    # Modelos de emociones adicionales por idioma, "clave=modelo" separados por comas
+    # (por ejemplo "es=<modelo de emociones en español>"). Las letras en idiomas sin modelo usan el de por defecto
+    LYRICS_MODELS = os.getenv("LYRICS_MODELS", "")
+    # Memoria máxima para los modelos adicionales cargados a la vez; se descartan los menos usados
+    MODEL_RAM_BUDGET_MB = int(os.getenv("MODEL_RAM_BUDGET_MB", "1024"))
+    # Compactar letras (sin marcadores de sección ni líneas repetidas) antes de tokenizarlas.
+    # Solo se aplica con LYRICS_WINDOWED: las repeticiones se recuperan al ponderar las ventanas
+    LYRICS_COMPACTION = os.getenv("LYRICS_COMPACTION", "true").lower() == "true"
+    # Letras largas: ventanas de 512 tokens solapadas (LYRICS_WINDOW_OVERLAP tokens), hasta
+    # LYRICS_MAX_WINDOWS por letra. Con LYRICS_WINDOWED desactivado solo se analizan los primeros 512 tokens
+    LYRICS_WINDOWED = os.getenv("LYRICS_WINDOWED", "true").lower() == "true"
+    LYRICS_WINDOW_OVERLAP = int(os.getenv("LYRICS_WINDOW_OVERLAP", "64"))
+    LYRICS_MAX_WINDOWS = int(os.getenv("LYRICS_MAX_WINDOWS", "6"))
+    # "transformer": todas las letras pasan por el modelo. "cascade": VADER primero y el modelo
+    # solo para las ambiguas (|compound medio por línea| < CASCADE_AMBIGUITY_THRESHOLD, o líneas que no
+    # coinciden; ver app/analyzers/aggregator.py)
+    LYRICS_INFERENCE_MODE = os.getenv("LYRICS_INFERENCE_MODE", "transformer")
+    CASCADE_AMBIGUITY_THRESHOLD = float(os.getenv("CASCADE_AMBIGUITY_THRESHOLD", "0.3"))
+    # Con el servidor bajo presión se usa la cascada aunque el modo sea "transformer"
+    CASCADE_UNDER_PRESSURE = os.getenv("CASCADE_UNDER_PRESSURE", "true").lower() == "true"
+    COHORT_MAX_USERS = int(os.getenv("COHORT_MAX_USERS", "50"))
+    COHORT_MAX_TRACKS_PER_USER = int(os.getenv("COHORT_MAX_TRACKS_PER_USER", "50"))
+
+    # Serie temporal emocional por usuario (reproducciones y agregados diarios/semanales)
+    HISTORY_DB_PATH = os.getenv("HISTORY_DB_PATH", "cache/history.sqlite3")
+
+    # Importación de historiales extendidos (exportación de datos de Spotify), ver app/core/extended_history.py
+    # Reproducciones que se cruzan contra el catálogo por vez; acota la memoria del importador
+    HISTORY_IMPORT_CHUNK_PLAYS = int(os.getenv("HISTORY_IMPORT_CHUNK_PLAYS", "50000"))
+    # Procesos para la inferencia de letras. 0 = según la cantidad de núcleos, 1 = en el mismo proceso
+    HISTORY_IMPORT_WORKERS = int(os.getenv("HISTORY_IMPORT_WORKERS", "0"))
+    # Las reproducciones más cortas no cuentan (Spotify cuenta una reproducción a partir de los 30 s)
+    HISTORY_IMPORT_MIN_MS_PLAYED = int(os.getenv("HISTORY_IMPORT_MIN_MS_PLAYED", "30000"))
+    # Resultados del análisis de letras ya calculados, compartidos entre corridas
+    LYRICS_INFERENCE_CACHE_PATH = os.getenv("LYRICS_INFERENCE_CACHE_PATH", "cache/lyrics_inference.sqlite3")
+
+    # Índice de similitud sobre el catálogo (distribución emocional + audio features)
+    EMBEDDING_INDEX_PATH = os.getenv("EMBEDDING_INDEX_PATH", "cache/embedding_index.npz")
+    # Peso de las columnas emocionales frente a las de audio
+    EMBEDDING_EMOTION_WEIGHT = float(os.getenv("EMBEDDING_EMOTION_WEIGHT", "1.0"))
+    # Hasta esta cantidad de canciones la búsqueda es exacta; por encima se usa IVF con EMBEDDING_NPROBE grupos por consulta
+    EMBEDDING_EXACT_MAX = int(os.getenv("EMBEDDING_EXACT_MAX", "20000"))
+    EMBEDDING_NPROBE = int(os.getenv("EMBEDDING_NPROBE", "8"))
+    # Valencia y arousal del catálogo en un KD-tree (recomendaciones por estado de ánimo)
+    MOOD_INDEX_PATH = os.getenv("MOOD_INDEX_PATH", "cache/mood_index.npz")
+    MOOD_PATH_MAX_STEPS = int(os.getenv("MOOD_PATH_MAX_STEPS", "10"))
+    SIMILAR_MAX_RESULTS = int(os.getenv("SIMILAR_MAX_RESULTS", "50"))
+
+    # A partir de esta cantidad de canciones el mapa de Valencia-Arousal se dibuja como densidad
+    CHART_DENSITY_THRESHOLD = int(os.getenv("CHART_DENSITY_THRESHOLD", "2000"))
+
+    @classmethod
+    def validate(cls):
+        """
+        Rechaza al iniciar las combinaciones de configuración que fallarían recién en el primer pedido.
+        """
+        if cls.IMAGE_VLM_SOURCE == "url" and not cls.PUBLIC_BASE_URL.startswith(("http://", "https://")):
+            raise ValueError(
+                "IMAGE_VLM_SOURCE=url requiere PUBLIC_BASE_URL con la URL pública absoluta del servidor "
+                "(el modelo de descripción descarga la imagen desde ahí)"
+            )
@@ -1,3 +1,14 @@
 from .data_fetcher import DataFetcher
 from .data_analyzer import DataAnalyzer
-from .main_flow import main_flow
\ No newline at end of file
+from .job_queue import get_image_job_queue
+from .blob_store import get_blob_store
+from .image_cache import get_image_cache
+from .result_cache import get_result_cache
+from .chart_renderer import get_chart_renderer
+from .history_store import get_history_store
+from .projection import project_analysis
+from .cohort import analyze_cohort
+from .embedding_index import get_embedding_index
+from .mood_index import get_mood_index
+from .main_flow import main_flow, fetch_history, analyze_history, emotional_trend
+from .extended_history import ExtendedHistoryImport, analyze_extended_history
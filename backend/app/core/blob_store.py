@@ -0,0 +1,93 @@
+import hashlib
+import os
+import re
+from functools import lru_cache
+from typing import Optional
+
+from app.config import Config
+
+_DIGEST_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+def media_type_for(data: bytes) -> str:
+    """
+    Deduce el tipo de contenido de una imagen a partir de sus primeros bytes.
+    """
+    if data.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if data.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    return "application/octet-stream"
+
+
+class BlobStore:
+    """
+    Almacén local direccionado por contenido: cada blob se guarda bajo el SHA-256 de sus bytes.
+
+    Como la clave depende solo del contenido, dos escrituras concurrentes de la misma imagen
+    no se pisan y una misma imagen nunca se guarda dos veces.
+    """
+
+    def __init__(self, root_dir: str):
+        self.root_dir = root_dir
+        os.makedirs(self.root_dir, exist_ok=True)
+
+    @staticmethod
+    def is_valid_digest(digest: str) -> bool:
+        return bool(_DIGEST_RE.match(digest))
+
+    def _path(self, digest: str) -> str:
+        # Repartimos en subcarpetas por los dos primeros caracteres para no tener miles de archivos juntos
+        return os.path.join(self.root_dir, digest[:2], digest)
+
+    def put(self, data: bytes) -> str:
+        """
+        Guarda los bytes y devuelve su digest.
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._path(digest)
+        if os.path.exists(path):
+            return digest
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        return digest
+
+    def get(self, digest: str) -> Optional[bytes]:
+        if not self.is_valid_digest(digest):
+            return None
+        try:
+            with open(self._path(digest), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def exists(self, digest: str) -> bool:
+        return self.is_valid_digest(digest) and os.path.exists(self._path(digest))
+
+    def size(self, digest: str) -> int:
+        return os.path.getsize(self._path(digest)) if self.exists(digest) else 0
+
+    def delete(self, digest: str):
+        if self.exists(digest):
+            os.remove(self._path(digest))
+
+
+def blob_url(digest: str) -> str:
+    """
+    URL desde la que la API sirve un blob.
+    """
+    return f"{Config.PUBLIC_BASE_URL}/api/sonemica/images/{digest}"
+
+
+@lru_cache(maxsize=1)
+def get_blob_store() -> BlobStore:
+    """
+    Almacén compartido por proceso, en BLOB_STORE_DIR. El directorio se crea en el primer uso.
+    """
+    return BlobStore(root_dir=Config.BLOB_STORE_DIR)
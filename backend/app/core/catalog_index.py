@@ -0,0 +1,193 @@
+import hashlib
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import polars as pl
+
+from app.analyzers import get_model_registry
+from app.analyzers.transformer import DEFAULT_MODEL
+from app.config import Config
+from app.core.data_fetcher import AUDIO_FEATURES_PATH, LYRICS_PATH, DataFetcher, load_catalog
+from app.core.result_cache import PIPELINE_VERSION
+
+# Audio features del catálogo que se pasan a float para los índices
+AUDIO_COLUMNS = ("Energy", "Danceability", "Loudness", "Liveness", "Valence", "Acousticness", "Speechiness")
+
+
+class IndexUnavailable(Exception):
+    """
+    El índice no está construido o se construyó con otro modelo, configuración o catálogo.
+    Los pedidos no lo construyen (tarda minutos): se responde 503 hasta que se genere.
+    """
+
+
+def _file_stamp(path: str) -> str:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return f"{path}:missing"
+    return f"{path}:{stat.st_size}:{int(stat.st_mtime)}"
+
+
+def catalog_version(*extra: str) -> str:
+    """
+    Versión de un índice sobre el catálogo: cambia con el modelo de emociones, la preparación de las
+    letras, los archivos del catálogo y lo que agregue cada índice en `extra`. Un índice guardado con
+    otra versión no se usa.
+    """
+    parts = (
+        PIPELINE_VERSION,
+        DEFAULT_MODEL,
+        Config.LYRICS_MODELS,
+        f"compaction={Config.LYRICS_COMPACTION}",
+        f"windows={Config.LYRICS_WINDOWED}:{Config.LYRICS_MAX_WINDOWS}:{Config.LYRICS_WINDOW_OVERLAP}",
+        _file_stamp(AUDIO_FEATURES_PATH),
+        _file_stamp(LYRICS_PATH),
+        *extra,
+    )
+    return hashlib.sha256("|".join(parts).encode()).hexdigest()[:16]
+
+
+class CatalogIndex:
+    """
+    Base de los índices sobre el catálogo: búsqueda de canciones por (título, artista) y
+    persistencia en un .npz con sello de versión. Cada subclase declara sus arrays en `ARRAYS`
+    (además de titles y artists), que se guardan y se pasan al constructor en ese orden.
+    """
+
+    ARRAYS: Tuple[str, ...] = ()
+
+    def __init__(self, titles: np.ndarray, artists: np.ndarray):
+        self.titles = titles
+        self.artists = artists
+        self._positions = {(title, artist): i for i, (title, artist) in enumerate(zip(titles, artists))}
+
+    def __len__(self) -> int:
+        return len(self.titles)
+
+    def position(self, title: str, artist: str) -> Optional[int]:
+        return self._positions.get((title, artist))
+
+    def positions_of(self, tracks: List[dict]) -> set:
+        """
+        Posiciones en el índice de las canciones dadas (en el formato de Spotify) que están en el catálogo.
+        """
+        positions = {
+            self.position(track.get("name", ""), track["artists"][0] if track.get("artists") else "")
+            for track in tracks
+        }
+        positions.discard(None)
+        return positions
+
+    def save(self, path: str, version: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+        arrays = {name: getattr(self, name) for name in self.ARRAYS}
+        np.savez(tmp_path, titles=self.titles, artists=self.artists, version=np.array(version), **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, version: str):
+        """
+        Índice guardado en `path`, o None si no existe o tiene otra versión.
+        """
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            if "version" not in data or str(data["version"]) != version:
+                return None
+            return cls(data["titles"], data["artists"], *(data[name] for name in cls.ARRAYS))
+
+    @classmethod
+    def load_or_raise(cls, path: str, version: str, name: str):
+        index = cls.load(path, version)
+        if index is None:
+            raise IndexUnavailable(
+                f"El índice de {name} no está disponible o está desactualizado "
+                "(generarlo con python -m app.core.catalog_index)"
+            )
+        return index
+
+
+def analyze_catalog(analyzer=None, batch_size: int = None) -> Tuple[pl.DataFrame, List[Optional[dict]]]:
+    """
+    Catálogo con una fila por canción (audio features y letra) y el análisis de cada letra con el
+    modelo, en el mismo orden (None para las canciones sin letra). Analiza todo el catálogo, así que
+    puede tardar: los índices que lo usan se construyen juntos con una sola pasada (ver
+    ensure_catalog_indexes) y se guardan en disco.
+    """
+    analyzer = analyzer or get_model_registry()
+    batch_size = batch_size or Config.INFERENCE_BATCH_SIZE
+
+    audio_features_df, lyrics_df = load_catalog()
+    catalog = (
+        audio_features_df.unique(subset=["Title", "Artist"], keep="first", maintain_order=True)
+        .join(lyrics_df.unique(subset=["Title", "Artist"], keep="first"), on=["Title", "Artist"], how="left")
+        .with_columns([pl.col(column).cast(pl.Float64, strict=False) for column in AUDIO_COLUMNS])
+    )
+
+    songs = []
+    for title, artist, lyrics in catalog.select("Title", "Artist", "Lyrics").iter_rows():
+        text, lines, counts = DataFetcher.prepare_lyrics(lyrics)
+        songs.append(
+            {"Title": title, "Artist": artist, "Lyrics": text, "Lyrics_lines": lines, "Lyrics_line_counts": counts}
+        )
+    with_lyrics = [i for i, song in enumerate(songs) if song["Lyrics"]]
+
+    sentiments = [None] * len(songs)
+    if with_lyrics:
+        results = analyzer.analyze_batch([songs[i] for i in with_lyrics], batch_size)
+        for i, result in zip(with_lyrics, results):
+            sentiments[i] = result
+    return catalog, sentiments
+
+
+def _index_specs() -> List[Dict[str, Any]]:
+    # Importados acá: los módulos de los índices heredan de CatalogIndex
+    from app.core.embedding_index import build_index, embedding_version, get_embedding_index, EmbeddingIndex
+    from app.core.mood_index import build_mood_index, mood_version, get_mood_index, MoodIndex
+
+    return [
+        {
+            "name": "similitud",
+            "cls": EmbeddingIndex,
+            "path": Config.EMBEDDING_INDEX_PATH,
+            "version": embedding_version(),
+            "build": build_index,
+            "get": get_embedding_index,
+        },
+        {
+            "name": "estados de ánimo",
+            "cls": MoodIndex,
+            "path": Config.MOOD_INDEX_PATH,
+            "version": mood_version(),
+            "build": build_mood_index,
+            "get": get_mood_index,
+        },
+    ]
+
+
+def ensure_catalog_indexes(force: bool = False):
+    """
+    Recalcula y guarda los índices que faltan o son de otra versión (todos con `force`), con un solo
+    análisis del catálogo, y los deja cargados en el proceso. Se usa al iniciar (serve.py) y desde
+    la línea de comandos, nunca dentro de un pedido.
+    """
+    specs = _index_specs()
+    stale = [spec for spec in specs if force or spec["cls"].load(spec["path"], spec["version"]) is None]
+    if stale:
+        catalog, sentiments = analyze_catalog()
+        for spec in stale:
+            index = spec["build"](catalog, sentiments)
+            index.save(spec["path"], spec["version"])
+            print(f"✅ Índice de {spec['name']} ({len(index)} canciones) guardado en {spec['path']}")
+
+    for spec in specs:
+        spec["get"]()
+
+
+if __name__ == "__main__":
+    ensure_catalog_indexes(force=True)
@@ -0,0 +1,112 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Any, Dict, Optional, Tuple
+
+from app.analyzers import ValenceArousalAnalyzer
+from app.analyzers.emotional_diversity_analyzer import EmotionalDiversityAnalyzer
+from app.config import Config
+
+# Gráficos disponibles y el analizador que sabe dibujarlos
+CHART_KINDS = {
+    "valence_arousal": ValenceArousalAnalyzer,
+    "diversity": EmotionalDiversityAnalyzer,
+}
+
+
+def chart_key(kind: str, data: Dict[str, Any], fmt: str, dpi: int) -> str:
+    """
+    Clave del gráfico: hash de los datos del análisis junto con el tipo, formato y resolución.
+    """
+    canonical = json.dumps(
+        {"kind": kind, "fmt": fmt, "dpi": dpi, "data": data},
+        sort_keys=True,
+        separators=(",", ":"),
+        default=float,
+    )
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def _render_chart(kind: str, data: Dict[str, Any], fmt: str, dpi: int) -> Optional[bytes]:
+    return CHART_KINDS[kind]().render(data, fmt=fmt, dpi=dpi)
+
+
+class ChartRenderer:
+    """
+    Servicio de renderizado de gráficos fuera del pedido de análisis.
+
+    Los gráficos se dibujan en un pool acotado de hilos (las figuras se crean sin pyplot, así que
+    no comparten estado entre hilos) y el resultado se guarda en una caché LRU en memoria indexada
+    por el hash de los datos, de modo que ver el mismo gráfico otra vez no vuelve a renderizarlo.
+    """
+
+    def __init__(self, max_workers: int, max_cache_bytes: int):
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="sonemica-chart"
+        )
+        self.max_cache_bytes = max_cache_bytes
+        self._lock = threading.Lock()
+        self._cache: "OrderedDict[str, bytes]" = OrderedDict()
+        self._cache_bytes = 0
+        self._in_flight = {}
+
+    def cached(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            content = self._cache.get(key)
+            if content is not None:
+                self._cache.move_to_end(key)
+            return content
+
+    def render(
+        self, kind: str, data: Dict[str, Any], fmt: str = "png", dpi: int = None
+    ) -> Tuple[str, Optional[bytes]]:
+        """
+        Devuelve (clave, bytes) del gráfico pedido, desde la caché o renderizándolo en el pool.
+        Pedidos concurrentes del mismo gráfico esperan un único render.
+        """
+        dpi = dpi or Config.CHART_DPI
+        key = chart_key(kind, data, fmt, dpi)
+
+        content = self.cached(key)
+        if content is not None:
+            return key, content
+
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is None:
+                future = self._executor.submit(_render_chart, kind, data, fmt, dpi)
+                self._in_flight[key] = future
+
+        try:
+            content = future.result(timeout=Config.CHART_RENDER_TIMEOUT)
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+        if content is not None:
+            self._store(key, content)
+        return key, content
+
+    def _store(self, key: str, content: bytes):
+        with self._lock:
+            if key in self._cache:
+                return
+            self._cache[key] = content
+            self._cache_bytes += len(content)
+            while self._cache_bytes > self.max_cache_bytes and len(self._cache) > 1:
+                _, evicted = self._cache.popitem(last=False)
+                self._cache_bytes -= len(evicted)
+
+
+@lru_cache(maxsize=1)
+def get_chart_renderer() -> ChartRenderer:
+    """
+    Renderizador compartido por proceso; el pool de hilos se crea en el primer uso.
+    """
+    return ChartRenderer(
+        max_workers=Config.CHART_RENDER_WORKERS,
+        max_cache_bytes=Config.CHART_CACHE_MAX_MB * 1024 * 1024,
+    )
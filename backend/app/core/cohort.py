@@ -0,0 +1,105 @@
+from typing import Any, Dict, List
+
+from app.core.data_fetcher import DataFetcher
+from app.core.result_cache import history_fingerprint
+from app.analyzers import EmotionalAggregate, ValenceArousalAnalyzer, get_model_registry
+from app.analyzers import get_emotion_aggregator
+from app.analyzers import analyze_emotional_diversity
+from app.analyzers.emotional_diversity_analyzer import EmotionalDiversityAnalyzer
+from app.config import Config
+from app.utils import Deadline, stage
+
+
+def _track_key(track: Dict[str, Any]):
+    """
+    (Title, Artist) con el que las canciones de Spotify se cruzan contra el catálogo local.
+    """
+    return (track.get("name", ""), track["artists"][0] if track.get("artists") else "")
+
+
+def analyze_cohort(users_tracks: Dict[str, List[Dict[str, Any]]], deadline: Deadline = None) -> Dict[str, Any]:
+    """
+    Analiza el historial de varios usuarios en una sola pasada.
+
+    - Las canciones se deduplican entre usuarios antes de buscar audio features y letras.
+    - Las letras únicas se analizan en lotes con el modelo compartido: una canción que escucharon
+      varios usuarios se infiere una sola vez.
+    - Cada usuario recibe su análisis de Valencia-Arousal y diversidad, y el grupo un agregado
+      común (EmotionalAggregate combinado) con su centroide, dispersión y diversidad.
+
+    El paisaje emocional (imagen) no se genera para grupos.
+    """
+    deadline = deadline or Deadline(Config.REQUEST_DEADLINE_SECONDS)
+    degraded_stages = {}
+
+    # Canciones únicas del grupo, en formato de Spotify
+    unique_tracks = {}
+    for tracks in users_tracks.values():
+        for track in tracks:
+            unique_tracks.setdefault(_track_key(track), track)
+    unique_tracks = list(unique_tracks.values())
+
+    data_fetcher = DataFetcher()
+    valence_arousal_analyzer = ValenceArousalAnalyzer()
+    diversity_analyzer = EmotionalDiversityAnalyzer()
+    lyrics_analyzer = (
+        get_emotion_aggregator() if Config.LYRICS_INFERENCE_MODE == "cascade" else get_model_registry()
+    )
+
+    audio_features = data_fetcher.fetch_audio_features(unique_tracks) if unique_tracks else []
+    lyrics = data_fetcher.fetch_lyrics(unique_tracks) if unique_tracks else []
+
+    # Inferencia por lotes sobre las letras únicas. Si se agota el plazo, seguimos con las ya analizadas.
+    # Las letras se ordenan por longitud antes de partirlas en lotes: así cada lote junta letras
+    # parecidas y el padding es mínimo (ordenar dentro de cada lote no alcanza)
+    batch_size = Config.INFERENCE_BATCH_SIZE
+    lyrics = sorted(lyrics, key=lambda song: len(song.get("Lyrics") or ""))
+    inference = []
+    with stage("lyrics_inference"):
+        for start in range(0, len(lyrics), batch_size):
+            if deadline.expired():
+                degraded_stages["lyrics_inference"] = (
+                    f"deadline_exceeded: {len(inference)}/{len(lyrics)} letras analizadas"
+                )
+                break
+            inference.extend(lyrics_analyzer.analyze_batch(lyrics[start : start + batch_size], batch_size))
+
+    audio_by_key = {(song["Title"], song["Artist"]): song for song in audio_features}
+    inference_by_key = {(song["title"], song["artist"]): song for song in inference}
+
+    users = {}
+    cohort_aggregate = EmotionalAggregate()
+    for user, tracks in users_tracks.items():
+        keys = {_track_key(track) for track in tracks}
+        user_audio = [audio_by_key[key] for key in keys if key in audio_by_key]
+        user_inference = [inference_by_key[key] for key in keys if key in inference_by_key]
+
+        if not user_audio and not user_inference:
+            users[user] = {"fingerprint": history_fingerprint(tracks), "error": "Sin canciones analizables"}
+            continue
+
+        valence_arousal_result = valence_arousal_analyzer.process_songs(user_audio, user_inference)
+        cohort_aggregate.merge(EmotionalAggregate.from_songs(valence_arousal_result["songs"]))
+        users[user] = {
+            "fingerprint": history_fingerprint(tracks),
+            "valence_arousal_analysis": valence_arousal_result,
+            "graphic_diversity_analysis": analyze_emotional_diversity(valence_arousal_result),
+        }
+
+    cohort = None
+    if cohort_aggregate.count > 0:
+        cohort = {
+            "summary": valence_arousal_analyzer.summarize_aggregate(cohort_aggregate),
+            "diversity": diversity_analyzer.calculate_diversity_from_aggregate(cohort_aggregate),
+        }
+
+    return {
+        "users": users,
+        "cohort": cohort,
+        "stats": {
+            "users": len(users_tracks),
+            "unique_tracks": len(unique_tracks),
+            "unique_lyrics_analyzed": len(inference),
+        },
+        "degraded_stages": degraded_stages,
+    }
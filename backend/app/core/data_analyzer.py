@@ -29,12 +29,18 @@ class DataAnalyzer:
 
     def analyze_lyrics(self, tracks_lyrics):
         lyrics_analyzer = TransformerAnalyzer()
-        tracks_scores = []
+        lyrics_inference = [lyrics_analyzer.analyze(track) for track in tracks_lyrics]
+        return self.summarize_lyrics_inference(lyrics_inference)
+
+    def summarize_lyrics_inference(self, lyrics_inference: list[dict]):
+        """
+        Promedia las distribuciones emocionales de inferencias ya realizadas, sin volver a correr el modelo.
+        """
         emotions = {}
-        n_tracks = len(tracks_lyrics)
+        n_tracks = len(lyrics_inference)
 
-        for track in tracks_lyrics:
-            distribution = lyrics_analyzer.analyze(track)["distribution"]
+        for inference in lyrics_inference:
+            distribution = inference["distribution"]
 
             for emotion, value in distribution.items():
                 if emotion not in emotions:
@@ -1,7 +1,13 @@
 import polars as pl
 import re
+from functools import lru_cache
 from ftfy import fix_text
 from app.services import SpotifyService
+from app.config import Config
+from app.utils import Deadline, stage
+from app.core.lyrics_compaction import compact_lyrics
+from app.analyzers.transformer import get_lyrics_tokenizer
+from app.utils.metrics import LYRICS_TOKENS
 
 # Columnas esperadas en el dataset de audio features
 AUDIO_FEATURES_COLUMNS = [
@@ -18,6 +24,10 @@ AUDIO_FEATURES_COLUMNS = [
     "Popularity",
 ]
 
+# Archivos del catálogo local
+AUDIO_FEATURES_PATH = "app/data/audio_features_general.csv"
+LYRICS_PATH = "app/data/lyrics_general.csv"
+
 # Columnas esperadas en el dataset de letras
 LYRICS_COLUMNS = [
     "Title",
@@ -26,6 +36,26 @@ LYRICS_COLUMNS = [
 ]
 
 
+@lru_cache(maxsize=1)
+def load_catalog():
+    """
+    Carga los datasets locales de audio features y letras una sola vez por proceso.
+
+    Los DataFrames se comparten entre todas las instancias de DataFetcher, así que no deben modificarse.
+    """
+    audio_features_df = pl.read_csv(
+        AUDIO_FEATURES_PATH,
+        schema_overrides={"Length": pl.Utf8},
+        columns=AUDIO_FEATURES_COLUMNS,
+    )
+
+    lyrics_df = pl.read_csv(
+        LYRICS_PATH, columns=LYRICS_COLUMNS
+    )
+
+    return audio_features_df, lyrics_df
+
+
 class DataFetcher:
     """
     Clase encargada de obtener datos musicales del usuario:
@@ -34,17 +64,14 @@ class DataFetcher:
     - Letras desde dataset local
     """
 
-    def __init__(self):
+    def __init__(self, audio_features_df: pl.DataFrame = None, lyrics_df: pl.DataFrame = None):
+        """
+        Por defecto usa el catálogo local (load_catalog); se puede indicar otro, por ejemplo uno sintético.
+        """
         self.spotify_service = SpotifyService()
-        self.audio_features_df = pl.read_csv(
-            "app/data/audio_features_general.csv",
-            schema_overrides={"Length": pl.Utf8},
-            columns=AUDIO_FEATURES_COLUMNS,
-        )
-
-        self.lyrics_df = pl.read_csv(
-            "app/data/lyrics_general.csv", columns=LYRICS_COLUMNS
-        )
+        if audio_features_df is None or lyrics_df is None:
+            audio_features_df, lyrics_df = load_catalog()
+        self.audio_features_df, self.lyrics_df = audio_features_df, lyrics_df
 
     @staticmethod
     def normalize_lyrics(lyrics: str) -> str:
@@ -64,14 +91,58 @@ class DataFetcher:
 
         return lyrics
 
-    def fetch_recent_tracks(self, access_token: str):
+    @classmethod
+    def prepare_lyrics(cls, lyrics: str):
+        """
+        Prepara una letra para el modelo: corrige la codificación, la compacta (sin marcadores de
+        sección ni líneas repetidas, ver compact_lyrics) y recién después une las líneas.
+
+        Devuelve (letra, líneas, conteos): la letra es la unión de las líneas con un espacio y conteos
+        indica cuántas veces aparecía cada línea que quedó. Solo se compacta con LYRICS_COMPACTION y
+        LYRICS_WINDOWED: sin ventanas el modelo ve una sola pasada y no puede ponderar las líneas por
+        sus repeticiones, así que se le deja la letra completa. Sin compactar la letra equivale a
+        normalize_lyrics, se conservan todas las líneas y los conteos quedan vacíos.
+
+        Registra los tokens de la letra que recibe el modelo y los que tendría sin compactar (cada
+        línea por sus repeticiones, sin contar los marcadores de sección eliminados).
+        """
+        if not lyrics:
+            return None, [], []
+
+        lyrics = fix_text(lyrics)
+        if Config.LYRICS_COMPACTION and Config.LYRICS_WINDOWED:
+            lines, counts = compact_lyrics(lyrics)
+        else:
+            lines, counts = lyrics.splitlines(), []
+        lines = [re.sub(r"\s+", " ", line).strip() for line in lines]
+        lines = [line for line in lines if line]
+        compacted = " ".join(lines)
+
+        cls._count_tokens(lines, counts)
+        return compacted or None, lines, counts
+
+    @staticmethod
+    def _count_tokens(lines: list, counts: list):
+        tokenizer = get_lyrics_tokenizer()
+        if tokenizer is None or not lines:
+            return
+        lengths = [len(ids) for ids in tokenizer(lines, add_special_tokens=False)["input_ids"]]
+        LYRICS_TOKENS.inc(sum(lengths), version="compacted")
+        LYRICS_TOKENS.inc(sum(n * c for n, c in zip(lengths, counts or [1] * len(lengths))), version="original")
+
+    def fetch_recent_tracks(self, access_token: str, deadline: Deadline = None):
         """
         Obtiene las últimas 50 canciones reproducidas por el usuario en Spotify.
+
+        Si se indica un plazo, la llamada usa como timeout el presupuesto de la etapa acotado por ese plazo.
         """
+        timeout = (
+            deadline.budget("spotify", Config.STAGE_BUDGET_SPOTIFY) if deadline else None
+        )
 
         # Hacemos la llamada al servicio de Spotify
         user_50_recently_played_tracks = self.spotify_service.get_recently_played(
-            access_token=access_token, limit=50
+            access_token=access_token, limit=50, timeout=timeout
         )
 
         return user_50_recently_played_tracks
@@ -96,17 +167,16 @@ class DataFetcher:
         normalized_tracks_df = pl.DataFrame(normalized_tracks)
 
         # Join del dataframe de las canciones normalizadas y el dataframe de audio features
-        matched_df = self.audio_features_df.join(
-            normalized_tracks_df, on=["Title", "Artist"], how="inner"
-        )
+        with stage("catalog_join"):
+            matched_df = self.audio_features_df.join(
+                normalized_tracks_df, on=["Title", "Artist"], how="inner"
+            )
 
-        return matched_df.to_dicts()
+            return matched_df.to_dicts()
 
-    def fetch_lyrics(self, tracks: list):
+    def match_lyrics(self, tracks: list):
         """
-        Enlaza las canciones provistas con sus letras desde el dataset local.
-
-        Devuelve una lista de diccionarios con las letras normalizadas.
+        Enlaza las canciones provistas con sus letras desde el dataset local, sin normalizarlas.
         """
 
         # Normalización del resultado de spotify ya para agilizar la búsqueda necesitamos un dataframe con las columnas "Title" y "Artist".
@@ -122,15 +192,28 @@ class DataFetcher:
         normalized_tracks_df = pl.DataFrame(normalized_tracks)
 
         # Join del dataframe de las canciones normalizadas y el dataframe de las lyrics
-        matched_df = self.lyrics_df.join(
-            normalized_tracks_df, on=["Title", "Artist"], how="inner"
-        )
+        with stage("catalog_join"):
+            matched_df = self.lyrics_df.join(
+                normalized_tracks_df, on=["Title", "Artist"], how="inner"
+            )
 
-        lyrics_data = matched_df.to_dicts()
+            return matched_df.to_dicts()
 
-        # Limpiamos las canciones
-        for track in lyrics_data:
-            track["Lyrics"] = self.normalize_lyrics(track["Lyrics"])
+    def fetch_lyrics(self, tracks: list):
+        """
+        Enlaza las canciones provistas con sus letras desde el dataset local.
+
+        Devuelve una lista de diccionarios con las letras normalizadas.
+        """
+        lyrics_data = self.match_lyrics(tracks)
+
+        # Limpiamos y compactamos las letras; "Lyrics_lines" guarda las líneas que quedaron y
+        # "Lyrics_line_counts" las repeticiones de cada una
+        with stage("lyrics_normalization"):
+            for track in lyrics_data:
+                track["Lyrics"], track["Lyrics_lines"], track["Lyrics_line_counts"] = self.prepare_lyrics(
+                    track["Lyrics"]
+                )
 
         return lyrics_data
 
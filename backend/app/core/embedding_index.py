@@ -0,0 +1,167 @@
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+import polars as pl
+
+from app.config import Config
+from app.core.catalog_index import AUDIO_COLUMNS, CatalogIndex, catalog_version
+
+# Emociones del modelo que, junto con las audio features del catálogo, forman cada vector
+EMOTION_LABELS = ("anger", "joy", "optimism", "sadness")
+
+
+def embedding_version() -> str:
+    return catalog_version(f"emotion_weight={Config.EMBEDDING_EMOTION_WEIGHT}")
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+def _spherical_kmeans(vectors: np.ndarray, n_lists: int, iterations: int = 10, seed: int = 0):
+    """
+    Agrupa vectores unitarios en `n_lists` grupos por similitud coseno. Devuelve (centroides, grupo de cada vector).
+    """
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), n_lists, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, vectors)
+        # Un grupo que quedó vacío conserva su centroide anterior
+        empty = np.bincount(assignment, minlength=n_lists) == 0
+        sums[empty] = centroids[empty]
+        centroids = _normalize_rows(sums)
+    return centroids, np.argmax(vectors @ centroids.T, axis=1)
+
+
+class EmbeddingIndex(CatalogIndex):
+    """
+    Índice de vecinos más cercanos sobre el catálogo local.
+
+    Cada canción es un vector unitario en float16: la distribución emocional de su letra (según
+    TransformerAnalyzer) y sus audio features normalizadas, cada columna estandarizada sobre el
+    catálogo. La similitud es el producto escalar (coseno) y se calcula para todos los candidatos
+    a la vez con numpy.
+
+    Con más de `exact_max` canciones la búsqueda es aproximada (IVF): las canciones se agrupan con
+    k-means y cada consulta solo puntúa las de los `nprobe` grupos más cercanos.
+    """
+
+    ARRAYS = ("vectors",)
+
+    def __init__(
+        self,
+        titles: np.ndarray,
+        artists: np.ndarray,
+        vectors: np.ndarray,
+        nprobe: int = None,
+        exact_max: int = None,
+    ):
+        super().__init__(titles, artists)
+        self.vectors = vectors.astype(np.float16)
+        self.nprobe = Config.EMBEDDING_NPROBE if nprobe is None else nprobe
+        self.exact_max = Config.EMBEDDING_EXACT_MAX if exact_max is None else exact_max
+
+        self.centroids = None
+        if len(vectors) > self.exact_max:
+            n_lists = max(1, int(np.sqrt(len(vectors))))
+            self.centroids, assignment = _spherical_kmeans(vectors.astype(np.float32), n_lists)
+            # Listas invertidas en formato CSR: los miembros del grupo c son members[offsets[c]:offsets[c + 1]]
+            self._members = np.argsort(assignment, kind="stable")
+            self._offsets = np.concatenate(([0], np.cumsum(np.bincount(assignment, minlength=n_lists))))
+
+    def _candidates(self, query: np.ndarray) -> np.ndarray:
+        if self.centroids is None:
+            return np.arange(len(self.vectors))
+        nprobe = min(self.nprobe, len(self.centroids))
+        probed = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        return np.concatenate([self._members[self._offsets[c] : self._offsets[c + 1]] for c in probed])
+
+    def search(self, query: np.ndarray, k: int = 10, exclude: Iterable[int] = ()) -> List[Dict[str, Any]]:
+        """
+        Las `k` canciones más parecidas al vector dado, de mayor a menor similitud, sin las posiciones de `exclude`.
+        """
+        query = np.asarray(query, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1)
+
+        candidates = self._candidates(query)
+        exclude = np.fromiter(exclude, dtype=np.int64)
+        if len(exclude):
+            candidates = candidates[~np.isin(candidates, exclude)]
+        if not len(candidates):
+            return []
+
+        scores = self.vectors[candidates].astype(np.float32) @ query
+        k = min(k, len(candidates))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+
+        return [
+            {
+                "title": str(self.titles[candidates[i]]),
+                "artist": str(self.artists[candidates[i]]),
+                "score": round(float(scores[i]), 4),
+            }
+            for i in top
+        ]
+
+    def similar_to_track(self, title: str, artist: str, k: int = 10) -> Optional[List[Dict[str, Any]]]:
+        """
+        Canciones que se sienten como la indicada. None si la canción no está en el catálogo.
+        """
+        i = self.position(title, artist)
+        if i is None:
+            return None
+        return self.search(self.vectors[i], k, exclude=[i])
+
+    def similar_to_tracks(self, tracks: List[dict], k: int = 10) -> Optional[List[Dict[str, Any]]]:
+        """
+        Canciones parecidas al centroide de las canciones dadas (en el formato de Spotify), sin incluirlas.
+        None si ninguna está en el catálogo.
+        """
+        positions = self.positions_of(tracks)
+        if not positions:
+            return None
+
+        centroid = self.vectors[sorted(positions)].astype(np.float32).mean(axis=0)
+        return self.search(centroid, k, exclude=positions)
+
+
+def build_index(catalog: pl.DataFrame, sentiments: List[Optional[dict]]) -> EmbeddingIndex:
+    """
+    Calcula los vectores de todo el catálogo a partir de su análisis (ver analyze_catalog).
+    Las canciones sin letra quedan con la distribución emocional promedio del catálogo.
+    """
+    emotions = np.array(
+        [
+            [s["distribution"][label] for label in EMOTION_LABELS] if s else [np.nan] * len(EMOTION_LABELS)
+            for s in sentiments
+        ],
+        dtype=np.float64,
+    ).reshape(len(sentiments), len(EMOTION_LABELS))
+    audio = catalog.select(AUDIO_COLUMNS).to_numpy().astype(np.float64)
+    features = np.hstack([emotions, audio])
+
+    # Estandarizamos cada columna; los valores faltantes quedan en el promedio (cero)
+    mean = np.nanmean(features, axis=0)
+    std = np.nanstd(features, axis=0)
+    features = np.nan_to_num((features - mean) / np.where(std > 0, std, 1))
+    features[:, : len(EMOTION_LABELS)] *= Config.EMBEDDING_EMOTION_WEIGHT
+
+    return EmbeddingIndex(
+        np.array(catalog["Title"].to_list(), dtype=str),
+        np.array(catalog["Artist"].to_list(), dtype=str),
+        _normalize_rows(features),
+    )
+
+
+@lru_cache(maxsize=1)
+def get_embedding_index() -> EmbeddingIndex:
+    """
+    Índice compartido por proceso, leído de EMBEDDING_INDEX_PATH.
+    Lanza IndexUnavailable si no existe o es de otra versión (ver ensure_catalog_indexes).
+    """
+    return EmbeddingIndex.load_or_raise(Config.EMBEDDING_INDEX_PATH, embedding_version(), "similitud")
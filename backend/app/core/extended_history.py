@@ -0,0 +1,502 @@
+import codecs
+import gc
+import glob
+import json
+import multiprocessing
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import torch
+
+from app.analyzers import EmotionalAggregate, ValenceArousalAnalyzer
+from app.analyzers import get_emotion_aggregator, get_model_registry, get_transformer_analyzer
+from app.analyzers.emotional_diversity_analyzer import EmotionalDiversityAnalyzer
+from app.config import Config
+from app.core.data_fetcher import DataFetcher
+from app.core.history_store import get_history_store
+from app.core.inference_cache import get_lyrics_inference_cache
+
+# Archivos de la exportación de datos de Spotify con reproducciones de música: el historial
+# extendido (Streaming_History_Audio_*, antes endsong_*) y el del último año (StreamingHistory*)
+HISTORY_FILE_PATTERNS = ("Streaming_History_Audio_*.json", "endsong*.json", "StreamingHistory*.json")
+
+# Versión del formato del checkpoint; cambiarla si cambian los campos
+CHECKPOINT_VERSION = 2
+
+# Letras por tarea enviada a los procesos de inferencia
+_TASK_BATCHES = 8
+
+
+class JsonArrayReader:
+    """
+    Lee un archivo con un arreglo JSON (`[{...}, {...}]`) elemento por elemento, sin cargarlo entero.
+
+    El archivo se lee en bloques de `block_size` bytes y cada elemento se decodifica apenas está
+    completo, así que la memoria depende del tamaño del bloque y no del archivo. `bytes_read`
+    indica cuánto se leyó hasta el momento (para informar el progreso).
+    """
+
+    def __init__(self, path: str, block_size: int = 1 << 20):
+        self.path = path
+        self.block_size = block_size
+        self.bytes_read = 0
+
+    def __iter__(self) -> Iterator[Any]:
+        decoder = json.JSONDecoder()
+        text_decoder = codecs.getincrementaldecoder("utf-8-sig")()
+
+        with open(self.path, "rb") as f:
+            buffer, pos, eof = "", 0, False
+
+            def fill(buffer: str, pos: int):
+                block = f.read(self.block_size)
+                self.bytes_read += len(block)
+                return buffer[pos:] + text_decoder.decode(block, final=not block), 0, not block
+
+            started = False
+            while True:
+                # Salteamos espacios y separadores hasta el próximo elemento
+                while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                    pos += 1
+                if pos >= len(buffer):
+                    if eof:
+                        raise ValueError(f"{self.path}: el arreglo JSON está incompleto")
+                    buffer, pos, eof = fill(buffer, pos)
+                    continue
+
+                if not started:
+                    if buffer[pos] != "[":
+                        raise ValueError(f"{self.path}: no es un arreglo JSON")
+                    started = True
+                    pos += 1
+                    continue
+                if buffer[pos] == "]":
+                    return
+
+                try:
+                    item, end = decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                    buffer, pos, eof = fill(buffer, pos)
+                    continue
+                # Un número o literal cortado al final del bloque se decodifica "bien" pero incompleto
+                if end == len(buffer) and not eof:
+                    buffer, pos, eof = fill(buffer, pos)
+                    continue
+
+                yield item
+                pos = end
+
+
+def history_files(paths: List[str]) -> List[str]:
+    """
+    Archivos de historial a importar: los indicados, y en los directorios los que siguen HISTORY_FILE_PATTERNS.
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            matches = set()
+            for pattern in HISTORY_FILE_PATTERNS:
+                matches.update(glob.glob(os.path.join(path, pattern)))
+            files.extend(sorted(matches))
+        else:
+            files.append(path)
+    return [os.path.abspath(path) for path in files]
+
+
+def track_from_record(record: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Lleva una reproducción de la exportación al formato de canción de Spotify que usa DataFetcher
+    ("name", "artists", "id", "played_at") más "ms_played". Devuelve None si no es una canción
+    (episodios de podcast, audiolibros).
+    """
+    # Historial extendido
+    if "ts" in record:
+        name = record.get("master_metadata_track_name")
+        artist = record.get("master_metadata_album_artist_name")
+        uri = record.get("spotify_track_uri") or ""
+        played_at = record["ts"]
+        ms_played = record.get("ms_played") or 0
+    # Historial del último año: "endTime" en UTC con precisión de minutos
+    else:
+        name = record.get("trackName")
+        artist = record.get("artistName")
+        uri = ""
+        played_at = (record.get("endTime") or "").replace(" ", "T") + ":00Z"
+        ms_played = record.get("msPlayed") or 0
+
+    if not name or not artist:
+        return None
+    return {
+        "name": name,
+        "artists": [artist],
+        "id": uri.rsplit(":", 1)[-1] or None,
+        "played_at": played_at,
+        "ms_played": ms_played,
+    }
+
+
+def _init_worker(threads: int):
+    torch.set_num_threads(threads)
+    torch.set_num_interop_threads(1)
+
+
+def _analyze_lyrics(songs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Tarea de los procesos de inferencia: prepara las letras del catálogo (ver prepare_lyrics) y las analiza.
+    """
+    prepared = []
+    for song in songs:
+        lyrics, lines, counts = DataFetcher.prepare_lyrics(song["Lyrics"])
+        if lyrics:
+            prepared.append(
+                {
+                    "Title": song["Title"],
+                    "Artist": song["Artist"],
+                    "Lyrics": lyrics,
+                    "Lyrics_lines": lines,
+                    "Lyrics_line_counts": counts,
+                }
+            )
+    if not prepared:
+        return []
+
+    analyzer = get_emotion_aggregator() if Config.LYRICS_INFERENCE_MODE == "cascade" else get_model_registry()
+    return analyzer.analyze_batch(prepared, Config.INFERENCE_BATCH_SIZE)
+
+
+def _print_progress(progress: Dict[str, Any]):
+    fraction = progress["fraction"]
+    print(
+        f"⏳ {progress['plays']:,} reproducciones ({fraction:.0%}) · "
+        f"{progress['tracks']:,} canciones · {progress['lyrics_analyzed']:,} letras analizadas · "
+        f"{progress['plays_per_second']:,.0f} rep/s",
+        flush=True,
+    )
+
+
+class ExtendedHistoryImport:
+    """
+    Análisis emocional de un historial de reproducciones de años, como el de la exportación de datos de Spotify.
+
+    - Los archivos se leen en forma incremental (JsonArrayReader) y se procesan de a `chunk_plays`
+      reproducciones, así que la memoria depende de la cantidad de canciones distintas y no de la
+      de reproducciones.
+    - Cada canción distinta se cruza contra el catálogo una sola vez, la primera vez que aparece.
+      Sus letras se analizan en lotes en `workers` procesos creados con fork después de cargar el
+      modelo, y los resultados quedan en la caché de inferencia (LyricsInferenceCache) para las
+      próximas corridas.
+    - Cada reproducción suma su punto de Valencia-Arousal (el de su canción) a un EmotionalAggregate
+      total y a uno por mes; el resumen y la diversidad salen de esos agregados.
+    - Con `checkpoint_path`, el estado se guarda después de cada bloque: si la corrida se
+      interrumpe, la siguiente retoma desde el último bloque completo.
+    - Con `user_id`, las reproducciones analizadas se registran además en la serie temporal del
+      usuario (history_store), así que emotional_trend cubre todo el historial importado.
+    """
+
+    def __init__(
+        self,
+        paths: List[str],
+        checkpoint_path: str = None,
+        chunk_plays: int = None,
+        workers: int = None,
+        min_ms_played: int = None,
+        user_id: str = None,
+        progress: Callable[[Dict[str, Any]], None] = _print_progress,
+        data_fetcher: DataFetcher = None,
+        inference_cache=None,
+    ):
+        self.files = history_files(paths)
+        self.checkpoint_path = checkpoint_path
+        self.chunk_plays = chunk_plays or Config.HISTORY_IMPORT_CHUNK_PLAYS
+        self.workers = workers or Config.HISTORY_IMPORT_WORKERS or os.cpu_count() or 1
+        self.min_ms_played = Config.HISTORY_IMPORT_MIN_MS_PLAYED if min_ms_played is None else min_ms_played
+        self.user_id = user_id
+        self.progress = progress
+        self.data_fetcher = data_fetcher or DataFetcher()
+        self.inference_cache = inference_cache or get_lyrics_inference_cache()
+
+        self.valence_arousal_analyzer = ValenceArousalAnalyzer()
+        self.diversity_analyzer = EmotionalDiversityAnalyzer()
+
+        # Punto de Valencia-Arousal de cada canción ya cruzada con el catálogo (None si no se encontró)
+        self._points: Dict[Tuple[str, str], Optional[Tuple[float, float]]] = {}
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._reset_state()
+
+    def _reset_state(self):
+        self.consumed: Dict[str, int] = {}
+        self.completed: List[str] = []
+        self.aggregate = EmotionalAggregate()
+        self.periods: Dict[str, EmotionalAggregate] = {}
+        self.track_plays: Counter = Counter()
+        self.stats = Counter()
+        # Último played_at visto y su cantidad de registros (ver _process_records)
+        self.last_played_at: Tuple[str, int] = ("", 0)
+
+    # Checkpoint
+    def _load_checkpoint(self) -> bool:
+        if not self.checkpoint_path or not os.path.exists(self.checkpoint_path):
+            return False
+        with open(self.checkpoint_path, encoding="utf-8") as f:
+            data = json.load(f)
+
+        if data.get("version") != CHECKPOINT_VERSION or data["files"] != self.files or data[
+            "min_ms_played"
+        ] != self.min_ms_played:
+            raise ValueError(
+                f"El checkpoint {self.checkpoint_path} corresponde a otra importación; "
+                "borrarlo o indicar otro para empezar de nuevo"
+            )
+
+        self.consumed = data["consumed"]
+        self.completed = data["completed"]
+        self.aggregate = EmotionalAggregate.from_dict(data["aggregate"])
+        self.periods = {period: EmotionalAggregate.from_dict(a) for period, a in data["periods"].items()}
+        self.track_plays = Counter({(title, artist): plays for title, artist, plays in data["track_plays"]})
+        self.stats = Counter(data["stats"])
+        self.last_played_at = tuple(data["last_played_at"])
+        return True
+
+    def _save_checkpoint(self):
+        if not self.checkpoint_path:
+            return
+        data = {
+            "version": CHECKPOINT_VERSION,
+            "files": self.files,
+            "min_ms_played": self.min_ms_played,
+            "consumed": self.consumed,
+            "completed": self.completed,
+            "aggregate": self.aggregate.to_dict(),
+            "periods": {period: aggregate.to_dict() for period, aggregate in self.periods.items()},
+            "track_plays": [[title, artist, plays] for (title, artist), plays in self.track_plays.items()],
+            "stats": dict(self.stats),
+            "last_played_at": list(self.last_played_at),
+        }
+        directory = os.path.dirname(self.checkpoint_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Escritura atómica: una interrupción a mitad de camino deja el checkpoint anterior intacto
+        tmp_path = f"{self.checkpoint_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    # Inferencia
+    def _start_pool(self):
+        if self.workers <= 1:
+            return
+        # Igual que serve.py: el modelo se carga antes del fork y los procesos lo comparten copy-on-write
+        try:
+            get_transformer_analyzer()
+        except Exception as e:
+            print(f"❌ No se pudo precargar el modelo: {e}")
+        gc.collect()
+        gc.freeze()
+
+        threads = max(1, (os.cpu_count() or 1) // self.workers)
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("fork"),
+            initializer=_init_worker,
+            initargs=(threads,),
+        )
+
+    def _stop_pool(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+            gc.unfreeze()
+
+    def _infer(self, songs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        size = Config.INFERENCE_BATCH_SIZE * _TASK_BATCHES
+        tasks = [songs[start : start + size] for start in range(0, len(songs), size)]
+        if self._pool is None:
+            batches = map(_analyze_lyrics, tasks)
+        else:
+            batches = self._pool.map(_analyze_lyrics, tasks)
+        return [result for batch in batches for result in batch]
+
+    # Cruce con el catálogo
+    def _resolve(self, keys: List[Tuple[str, str]]):
+        """
+        Calcula el punto de Valencia-Arousal de canciones que todavía no se vieron.
+        """
+        tracks = [{"name": title, "artists": [artist]} for title, artist in keys]
+        audio_features = self.data_fetcher.fetch_audio_features(tracks)
+        lyrics = self.data_fetcher.match_lyrics(tracks)
+
+        cached = self.inference_cache.get_many((song["Title"], song["Artist"]) for song in lyrics)
+        pending = [song for song in lyrics if (song["Title"], song["Artist"]) not in cached]
+        sentiments = list(cached.values())
+        if pending:
+            analyzed = self._infer(pending)
+            self.inference_cache.put_many(analyzed)
+            sentiments.extend(analyzed)
+        self.stats["lyrics_cached"] += len(cached)
+        self.stats["lyrics_analyzed"] += len(pending)
+
+        points = {}
+        if audio_features or sentiments:
+            analyzer = self.valence_arousal_analyzer
+            result = analyzer.process_songs_columnar(analyzer.build_tracks_table(audio_features, sentiments))
+            points = {
+                analyzer._create_song_key(song["title"], song["artist"]): (song["valence"], song["arousal"])
+                for song in result["songs"]
+            }
+        for key in keys:
+            self._points[key] = points.get(self.valence_arousal_analyzer._create_song_key(*key))
+
+    def _process_records(self, records: List[Dict[str, Any]]):
+        tracks = []
+        for record in records:
+            track = track_from_record(record)
+            # El historial del último año tiene precisión de minutos: varias reproducciones comparten
+            # played_at. Como los registros vienen en orden, se numeran las de un mismo played_at
+            # (contando también las demasiado cortas, para que la numeración no dependa de
+            # min_ms_played) y el par (played_at, seq) las distingue en history_store.
+            if track is not None:
+                last, count = self.last_played_at
+                track["seq"] = count if track["played_at"] == last else 0
+                self.last_played_at = (track["played_at"], track["seq"] + 1)
+
+            if track is None:
+                self.stats["skipped_not_music"] += 1
+            elif track["ms_played"] < self.min_ms_played:
+                self.stats["skipped_short"] += 1
+            else:
+                tracks.append(track)
+        self.stats["records"] += len(records)
+        self.stats["plays"] += len(tracks)
+
+        keys = [(track["name"], track["artists"][0]) for track in tracks]
+        new_keys = list(dict.fromkeys(key for key in keys if key not in self._points))
+        if new_keys:
+            self._resolve(new_keys)
+
+        plays = []
+        for track, key in zip(tracks, keys):
+            point = self._points[key]
+            if point is None:
+                self.stats["unmatched_plays"] += 1
+                continue
+            valence, arousal = point
+            self.aggregate.update(valence, arousal)
+            self.periods.setdefault(track["played_at"][:7], EmotionalAggregate()).update(valence, arousal)
+            self.track_plays[key] += 1
+            plays.append((track["played_at"], track["seq"], track["id"], float(valence), float(arousal)))
+        self.stats["matched_plays"] += len(plays)
+
+        if self.user_id is not None and plays:
+            get_history_store().record_plays(self.user_id, plays)
+
+    # Corrida
+    def run(self) -> Dict[str, Any]:
+        if self._load_checkpoint():
+            print(f"↩️ Retomando desde {self.checkpoint_path}: {self.stats['records']:,} registros ya procesados")
+
+        total_bytes = sum(os.path.getsize(path) for path in self.files) or 1
+        done_bytes = sum(os.path.getsize(path) for path in self.completed)
+        start, start_plays = time.perf_counter(), self.stats["plays"]
+
+        def report(reader: JsonArrayReader = None):
+            if self.progress is None:
+                return
+            elapsed = max(1e-9, time.perf_counter() - start)
+            self.progress(
+                {
+                    "fraction": min(1.0, (done_bytes + (reader.bytes_read if reader else 0)) / total_bytes),
+                    "plays": self.stats["plays"],
+                    "tracks": len(self._points),
+                    "lyrics_analyzed": self.stats["lyrics_analyzed"],
+                    "plays_per_second": (self.stats["plays"] - start_plays) / elapsed,
+                }
+            )
+
+        self._start_pool()
+        try:
+            for path in self.files:
+                if path in self.completed:
+                    continue
+                reader = JsonArrayReader(path)
+                skip = self.consumed.get(path, 0)
+                chunk = []
+                for index, record in enumerate(reader):
+                    if index < skip:
+                        continue
+                    chunk.append(record)
+                    if len(chunk) >= self.chunk_plays:
+                        self._commit_chunk(path, chunk)
+                        chunk = []
+                        report(reader)
+                if chunk:
+                    self._commit_chunk(path, chunk)
+                self.completed.append(path)
+                self._save_checkpoint()
+                done_bytes += os.path.getsize(path)
+                report()
+
+            return self.result()
+        finally:
+            self._stop_pool()
+
+    def _commit_chunk(self, path: str, records: List[Dict[str, Any]]):
+        self._process_records(records)
+        self.consumed[path] = self.consumed.get(path, 0) + len(records)
+        self._save_checkpoint()
+
+    def _summary(self, aggregate: EmotionalAggregate) -> Dict[str, Any]:
+        return {
+            "summary": self.valence_arousal_analyzer.summarize_aggregate(aggregate),
+            "diversity": self.diversity_analyzer.calculate_diversity_from_aggregate(aggregate),
+        }
+
+    def _point_dict(self, key: Tuple[str, str]) -> Dict[str, Optional[float]]:
+        valence, arousal = self._points.get(key) or (None, None)
+        return {"valence": valence, "arousal": arousal}
+
+    def result(self, top: int = 20) -> Dict[str, Any]:
+        top_tracks = self.track_plays.most_common(top)
+        # Al retomar desde un checkpoint los puntos de las canciones vistas antes no están en memoria
+        missing = [key for key, _ in top_tracks if key not in self._points]
+        if missing:
+            self._resolve(missing)
+
+        return {
+            "overall": self._summary(self.aggregate) if self.aggregate.count > 0 else None,
+            "periods": [
+                {"period": period, **self._summary(aggregate)} for period, aggregate in sorted(self.periods.items())
+            ],
+            "top_tracks": [
+                {"title": title, "artist": artist, "plays": plays, **self._point_dict((title, artist))}
+                for (title, artist), plays in top_tracks
+            ],
+            "stats": {
+                "files": len(self.files),
+                "matched_tracks": len(self.track_plays),
+                **{
+                    key: self.stats[key]
+                    for key in (
+                        "records",
+                        "plays",
+                        "matched_plays",
+                        "unmatched_plays",
+                        "skipped_short",
+                        "skipped_not_music",
+                        "lyrics_analyzed",
+                        "lyrics_cached",
+                    )
+                },
+            },
+        }
+
+
+def analyze_extended_history(paths: List[str], **options) -> Dict[str, Any]:
+    """
+    Importa y analiza los archivos de historial indicados (ver ExtendedHistoryImport).
+    """
+    return ExtendedHistoryImport(paths, **options).run()
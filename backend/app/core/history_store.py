@@ -0,0 +1,228 @@
+import os
+import sqlite3
+import threading
+from datetime import date, timedelta
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Tuple
+
+from app.analyzers import EmotionalAggregate, ValenceArousalAnalyzer
+from app.analyzers.emotional_aggregate import QUADRANTS
+from app.config import Config
+
+# Granularidades de los agregados precalculados
+GRANULARITY_DAY = "day"
+GRANULARITY_WEEK = "week"
+GRANULARITIES = (GRANULARITY_DAY, GRANULARITY_WEEK)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS plays (
+    user_id TEXT NOT NULL,
+    played_at TEXT NOT NULL,
+    seq INTEGER NOT NULL DEFAULT 0,
+    track_id TEXT,
+    valence REAL NOT NULL,
+    arousal REAL NOT NULL,
+    PRIMARY KEY (user_id, played_at, seq)
+);
+CREATE TABLE IF NOT EXISTS rollups (
+    user_id TEXT NOT NULL,
+    granularity TEXT NOT NULL,
+    bucket TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    valence_mean REAL NOT NULL,
+    valence_m2 REAL NOT NULL,
+    arousal_mean REAL NOT NULL,
+    arousal_m2 REAL NOT NULL,
+    high_valence_high_arousal INTEGER NOT NULL,
+    low_valence_high_arousal INTEGER NOT NULL,
+    low_valence_low_arousal INTEGER NOT NULL,
+    high_valence_low_arousal INTEGER NOT NULL,
+    PRIMARY KEY (user_id, granularity, bucket)
+);
+"""
+
+_ROLLUP_COLUMNS = (
+    "count, valence_mean, valence_m2, arousal_mean, arousal_m2, " + ", ".join(QUADRANTS)
+)
+
+
+def bucket_for(day: date, granularity: str) -> str:
+    """
+    Inicio del período que contiene al día dado: el mismo día, o el lunes de su semana ISO.
+    """
+    if granularity == GRANULARITY_WEEK:
+        day = day - timedelta(days=day.weekday())
+    return day.isoformat()
+
+
+def plays_from_analysis(
+    tracks: List[Dict[str, Any]], analysis_result: Dict[str, Any]
+) -> List[Tuple[str, int, str, float, float]]:
+    """
+    Cruza las reproducciones de Spotify con las canciones de un resultado de process_songs.
+
+    Devuelve una tupla (played_at, seq, track_id, valencia, arousal) por cada reproducción que se
+    pudo analizar; una canción escuchada varias veces aporta un punto por reproducción. El
+    played_at de Spotify tiene milisegundos, así que alcanza para distinguirlas (seq 0).
+    """
+    analyzer = ValenceArousalAnalyzer()
+    points_by_key = {
+        analyzer._create_song_key(song["title"], song["artist"]): (song["valence"], song["arousal"])
+        for song in analysis_result.get("songs", [])
+    }
+
+    plays = []
+    for track in tracks:
+        played_at = track.get("played_at")
+        artist = track["artists"][0] if track.get("artists") else ""
+        point = points_by_key.get(analyzer._create_song_key(track.get("name", ""), artist))
+        if played_at and point is not None:
+            plays.append((played_at, 0, track.get("id"), float(point[0]), float(point[1])))
+    return plays
+
+
+class HistoryStore:
+    """
+    Serie temporal emocional por usuario en SQLite.
+
+    Guarda cada reproducción analizada (valencia y arousal, indexada por played_at y seq) y mantiene
+    agregados diarios y semanales en forma de EmotionalAggregate serializado. Al registrar
+    reproducciones nuevas solo se combinan en las filas de sus períodos, y las tendencias se
+    calculan leyendo esas pocas filas agregadas en lugar de las reproducciones.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._connect()
+        self._migrate()
+        self._conn.executescript(_SCHEMA)
+
+        # Una conexión de SQLite no puede compartirse entre procesos: cada worker creado con fork abre la suya
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _connect(self):
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+        self._connect()
+
+    def _migrate(self):
+        # Las bases anteriores indexaban solo por played_at: se agrega seq (0 para las filas existentes)
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(plays)")]
+        if not columns or "seq" in columns:
+            return
+        with self._conn:
+            self._conn.execute("ALTER TABLE plays RENAME TO plays_old")
+            self._conn.executescript(_SCHEMA)
+            self._conn.execute(
+                "INSERT INTO plays (user_id, played_at, seq, track_id, valence, arousal) "
+                "SELECT user_id, played_at, 0, track_id, valence, arousal FROM plays_old"
+            )
+            self._conn.execute("DROP TABLE plays_old")
+
+    def record_plays(self, user_id: str, plays: Iterable[Tuple[str, int, str, float, float]]) -> int:
+        """
+        Registra reproducciones (played_at, seq, track_id, valencia, arousal) y actualiza los agregados.
+
+        `seq` distingue reproducciones con el mismo played_at (el historial del último año de la
+        exportación tiene precisión de minutos). Las ya registradas (mismo played_at y seq) se
+        ignoran, así que volver a registrar el mismo historial no altera la serie. Devuelve la
+        cantidad de nuevas.
+        """
+        with self._lock, self._conn:
+            new_aggregates: Dict[Tuple[str, str], EmotionalAggregate] = {}
+            inserted = 0
+            for played_at, seq, track_id, valence, arousal in plays:
+                cursor = self._conn.execute(
+                    "INSERT OR IGNORE INTO plays (user_id, played_at, seq, track_id, valence, arousal) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (user_id, played_at, seq, track_id, valence, arousal),
+                )
+                if cursor.rowcount == 0:
+                    continue
+
+                inserted += 1
+                day = date.fromisoformat(played_at[:10])
+                for granularity in GRANULARITIES:
+                    key = (granularity, bucket_for(day, granularity))
+                    new_aggregates.setdefault(key, EmotionalAggregate()).update(valence, arousal)
+
+            for (granularity, bucket), aggregate in new_aggregates.items():
+                stored = self._read_rollup(user_id, granularity, bucket)
+                if stored is not None:
+                    aggregate = stored.merge(aggregate)
+                self._write_rollup(user_id, granularity, bucket, aggregate)
+
+        return inserted
+
+    def trend(
+        self, user_id: str, start: date, end: date, granularity: str = GRANULARITY_DAY
+    ) -> List[Tuple[str, EmotionalAggregate]]:
+        """
+        Devuelve los agregados (período, EmotionalAggregate) entre `start` y `end` inclusive, en orden.
+        Con granularidad semanal se incluyen las semanas que contienen a `start` y a `end`.
+        """
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"Granularidad no soportada: {granularity}")
+
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT bucket, {_ROLLUP_COLUMNS} FROM rollups "
+                "WHERE user_id = ? AND granularity = ? AND bucket BETWEEN ? AND ? ORDER BY bucket",
+                (user_id, granularity, bucket_for(start, granularity), bucket_for(end, granularity)),
+            ).fetchall()
+
+        return [(row[0], self._aggregate_from_row(row[1:])) for row in rows]
+
+    def _read_rollup(self, user_id: str, granularity: str, bucket: str):
+        row = self._conn.execute(
+            f"SELECT {_ROLLUP_COLUMNS} FROM rollups "
+            "WHERE user_id = ? AND granularity = ? AND bucket = ?",
+            (user_id, granularity, bucket),
+        ).fetchone()
+        return self._aggregate_from_row(row) if row is not None else None
+
+    def _write_rollup(self, user_id: str, granularity: str, bucket: str, aggregate: EmotionalAggregate):
+        data = aggregate.to_dict()
+        self._conn.execute(
+            f"INSERT OR REPLACE INTO rollups (user_id, granularity, bucket, {_ROLLUP_COLUMNS}) "
+            f"VALUES ({', '.join('?' * (len(QUADRANTS) + 8))})",
+            (
+                user_id,
+                granularity,
+                bucket,
+                data["count"],
+                data["valence"]["mean"],
+                data["valence"]["m2"],
+                data["arousal"]["mean"],
+                data["arousal"]["m2"],
+                *(data["quadrant_counts"][quadrant] for quadrant in QUADRANTS),
+            ),
+        )
+
+    @staticmethod
+    def _aggregate_from_row(row) -> EmotionalAggregate:
+        count, valence_mean, valence_m2, arousal_mean, arousal_m2, *quadrant_counts = row
+        return EmotionalAggregate.from_dict(
+            {
+                "count": count,
+                "valence": {"mean": valence_mean, "m2": valence_m2},
+                "arousal": {"mean": arousal_mean, "m2": arousal_m2},
+                "quadrant_counts": dict(zip(QUADRANTS, quadrant_counts)),
+            }
+        )
+
+
+@lru_cache(maxsize=1)
+def get_history_store() -> HistoryStore:
+    """
+    Serie temporal compartida por proceso, en HISTORY_DB_PATH. La base se crea en el primer uso.
+    """
+    return HistoryStore(db_path=Config.HISTORY_DB_PATH)
@@ -0,0 +1,213 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.config import Config
+from app.core.blob_store import BlobStore, get_blob_store
+
+# fcntl solo existe en Unix: sin él el lock protege únicamente a los hilos del proceso
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+def quantize_distribution(distribution: Dict[str, float], step: float) -> Dict[str, float]:
+    """
+    Redondea cada valor de la distribución emocional al múltiplo de `step` más cercano.
+
+    Distribuciones parecidas caen en el mismo "balde" y por lo tanto comparten imagen y descripción.
+    """
+    if step <= 0:
+        return {k: round(float(v), 4) for k, v in distribution.items()}
+
+    return {k: round(round(float(v) / step) * step, 4) for k, v in distribution.items()}
+
+
+class ImageCache:
+    """
+    Caché en disco de imágenes generadas y sus descripciones.
+
+    Cada entrada es un archivo `<clave>.json` con la descripción, metadatos y el digest de la
+    imagen, cuyos bytes viven en el almacén direccionado por contenido. Cuando el tamaño total
+    (imágenes + metadatos) supera `max_bytes` se eliminan las entradas usadas hace más tiempo (LRU,
+    según la fecha de modificación de cada archivo, que se actualiza al leerlo).
+
+    El disco es la única fuente de verdad: los workers de serve.py comparten la caché y su límite.
+    Las escrituras y desalojos se serializan entre procesos con un lock de archivo (`.lock`) y el
+    tamaño total se calcula recorriendo el directorio en cada escritura.
+
+    La imagen de una entrada eliminada no se borra enseguida: los resultados de /analyzer ya
+    cacheados (hasta RESULT_CACHE_TTL_SECONDS) pueden seguir apuntando a su URL. Queda retirada
+    (una marca en `retired/`) y se borra recién cuando pasa `blob_grace_seconds` sin que otra
+    entrada vuelva a usarla.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int, blobs: BlobStore, blob_grace_seconds: float = 0):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.blobs = blobs
+        self.blob_grace_seconds = blob_grace_seconds
+        self.retired_dir = os.path.join(cache_dir, "retired")
+        self._lock_path = os.path.join(cache_dir, ".lock")
+        self._lock = threading.Lock()
+
+        os.makedirs(self.retired_dir, exist_ok=True)
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _locked(self):
+        """
+        Exclusión entre hilos del proceso y, con fcntl, entre los workers.
+        """
+        with self._lock, open(self._lock_path, "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _meta_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _read_meta(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._meta_path(key), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _scan(self) -> List[Tuple[float, str, int, str]]:
+        """
+        Entradas en disco como (último acceso, clave, tamaño, digest), de la menos a la más usada.
+        """
+        entries = []
+        for filename in os.listdir(self.cache_dir):
+            if not filename.endswith(".json"):
+                continue
+            key = filename[: -len(".json")]
+            meta_path = self._meta_path(key)
+            try:
+                accessed_at, meta_size = os.path.getmtime(meta_path), os.path.getsize(meta_path)
+            except OSError:
+                continue
+            digest = (self._read_meta(key) or {}).get("image_digest", "")
+            entries.append((accessed_at, key, self.blobs.size(digest) + meta_size, digest))
+        return sorted(entries)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Devuelve los metadatos guardados ({"image_digest", "descripcion", ...}) si la clave está en caché, o None.
+        """
+        entry = self._read_meta(key)
+        if entry is None:
+            return None
+        if not self.blobs.exists(entry.get("image_digest", "")):
+            with self._locked():
+                self._drop(key)
+            return None
+
+        # Marcamos la entrada como usada recientemente
+        try:
+            os.utime(self._meta_path(key))
+        except OSError:
+            pass
+        return entry
+
+    def put(self, key: str, image_bytes: bytes, metadata: Dict[str, Any]):
+        """
+        Guarda la imagen en el almacén de blobs y sus metadatos bajo la clave dada, y aplica el límite de tamaño.
+        Devuelve el digest de la imagen.
+        """
+        meta_path = self._meta_path(key)
+
+        with self._locked():
+            # El blob se escribe con el lock tomado: otro worker no puede borrarlo entre que se guarda y se desretira
+            digest = self.blobs.put(image_bytes)
+            # Si la imagen estaba retirada, vuelve a estar en uso
+            self._unretire(digest)
+            if os.path.exists(meta_path):
+                self._drop(key, keep_blob=digest)
+
+            # Escribimos en un archivo temporal y renombramos para no dejar entradas a medio escribir
+            meta_bytes = json.dumps({**metadata, "image_digest": digest}, ensure_ascii=False).encode("utf-8")
+            tmp_path = f"{meta_path}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(meta_bytes)
+            os.replace(tmp_path, meta_path)
+
+            entries = self._scan()
+            total_bytes = sum(size for _, _, size, _ in entries)
+            remaining = len(entries)
+            in_use = set()
+            for _, entry_key, size, entry_digest in entries:
+                if total_bytes > self.max_bytes and remaining > 1 and entry_key != key:
+                    self._drop(entry_key, keep_blob=digest)
+                    total_bytes -= size
+                    remaining -= 1
+                else:
+                    in_use.add(entry_digest)
+
+            self._sweep_retired(in_use)
+
+        return digest
+
+    def _drop(self, key: str, keep_blob: Optional[str] = None):
+        digest = (self._read_meta(key) or {}).get("image_digest", "")
+        meta_path = self._meta_path(key)
+        if os.path.exists(meta_path):
+            os.remove(meta_path)
+        # El blob se conserva si es la misma imagen que se acaba de guardar bajo otra clave
+        if digest and digest != keep_blob:
+            self._retire(digest)
+
+    def _retire(self, digest: str):
+        if self.blob_grace_seconds <= 0:
+            self.blobs.delete(digest)
+            return
+        # La fecha de modificación de la marca es el momento en que se retiró la imagen
+        with open(os.path.join(self.retired_dir, digest), "w"):
+            pass
+
+    def _unretire(self, digest: str):
+        marker = os.path.join(self.retired_dir, digest)
+        if os.path.exists(marker):
+            os.remove(marker)
+
+    def _sweep_retired(self, in_use: set):
+        """
+        Borra las imágenes retiradas hace más de `blob_grace_seconds` que ninguna entrada usa.
+        """
+        now = time.time()
+        for digest in os.listdir(self.retired_dir):
+            marker = os.path.join(self.retired_dir, digest)
+            try:
+                if now - os.path.getmtime(marker) <= self.blob_grace_seconds:
+                    continue
+            except OSError:
+                continue
+            if digest not in in_use:
+                self.blobs.delete(digest)
+            self._unretire(digest)
+
+
+@lru_cache(maxsize=1)
+def get_image_cache() -> ImageCache:
+    """
+    Caché de imágenes compartida por proceso, en IMAGE_CACHE_DIR. El directorio se crea en el primer uso.
+    """
+    return ImageCache(
+        cache_dir=Config.IMAGE_CACHE_DIR,
+        max_bytes=Config.IMAGE_CACHE_MAX_MB * 1024 * 1024,
+        blobs=get_blob_store(),
+        blob_grace_seconds=Config.RESULT_CACHE_TTL_SECONDS,
+    )
@@ -0,0 +1,98 @@
+import json
+import os
+import sqlite3
+import threading
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Tuple
+
+from app.analyzers.transformer import DEFAULT_MODEL
+from app.config import Config
+from app.core.result_cache import PIPELINE_VERSION, inference_settings
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS lyrics_inference (
+    version TEXT NOT NULL,
+    title TEXT NOT NULL,
+    artist TEXT NOT NULL,
+    result TEXT NOT NULL,
+    PRIMARY KEY (version, title, artist)
+);
+"""
+
+# SQLite acepta como mucho 999 parámetros por consulta en versiones viejas
+_LOOKUP_BATCH = 400
+
+
+def inference_version() -> str:
+    """
+    Identifica la configuración con la que se analizaron las letras (ver inference_settings):
+    los resultados guardados con otra versión se ignoran.
+    """
+    return "|".join((PIPELINE_VERSION, DEFAULT_MODEL, *inference_settings()))
+
+
+class LyricsInferenceCache:
+    """
+    Resultados del análisis de letras en SQLite, indexados por (título, artista) del catálogo.
+
+    Una canción del catálogo se analiza una sola vez por versión (ver inference_version), aunque
+    aparezca en muchos historiales o en varias corridas del importador de historiales extendidos.
+    """
+
+    def __init__(self, db_path: str, version: str = None):
+        self.db_path = db_path
+        self.version = version or inference_version()
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._connect()
+        self._conn.executescript(_SCHEMA)
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _connect(self):
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+        self._connect()
+
+    def get_many(self, keys: Iterable[Tuple[str, str]]) -> Dict[Tuple[str, str], Dict[str, Any]]:
+        """
+        Resultados guardados para las claves (título, artista) indicadas; las que no están se omiten.
+        """
+        keys = list(keys)
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), _LOOKUP_BATCH):
+                batch = keys[start : start + _LOOKUP_BATCH]
+                placeholders = ", ".join("(?, ?)" for _ in batch)
+                rows = self._conn.execute(
+                    "SELECT title, artist, result FROM lyrics_inference "
+                    f"WHERE version = ? AND (title, artist) IN (VALUES {placeholders})",
+                    (self.version, *(value for key in batch for value in key)),
+                ).fetchall()
+                for title, artist, result in rows:
+                    found[(title, artist)] = json.loads(result)
+        return found
+
+    def put_many(self, results: List[Dict[str, Any]]):
+        """
+        Guarda resultados de analyze_batch (con "title" y "artist").
+        """
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO lyrics_inference (version, title, artist, result) VALUES (?, ?, ?, ?)",
+                [
+                    (self.version, result["title"], result["artist"], json.dumps(result))
+                    for result in results
+                    if result.get("title") and result.get("artist")
+                ],
+            )
+
+
+@lru_cache(maxsize=1)
+def get_lyrics_inference_cache() -> LyricsInferenceCache:
+    return LyricsInferenceCache(Config.LYRICS_INFERENCE_CACHE_PATH)
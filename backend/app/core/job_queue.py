@@ -0,0 +1,202 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Any, Callable, Dict, Optional
+
+from app.config import Config
+from app.utils.serialization import dumps
+
+# Estados posibles de un trabajo
+JOB_PENDING = "pending"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+# Etapa no ejecutada (por ejemplo, servicio externo caído)
+JOB_SKIPPED = "skipped"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    key TEXT NOT NULL,
+    status TEXT NOT NULL,
+    result BLOB,
+    error TEXT,
+    owner_pid INTEGER NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_by_key ON jobs (key, status);
+CREATE INDEX IF NOT EXISTS jobs_by_status ON jobs (status, updated_at);
+"""
+
+_ACTIVE = (JOB_PENDING, JOB_RUNNING)
+_ORPHANED = "El proceso que ejecutaba el trabajo terminó antes de completarlo"
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobQueue:
+    """
+    Cola de trabajos en segundo plano con concurrencia acotada.
+
+    - Los trabajos se ejecutan en un pool de hilos con un máximo de `max_workers` por proceso.
+    - El estado de los trabajos vive en SQLite (`db_path`), compartido por todos los workers de
+      serve.py: un job_id se puede consultar desde cualquier worker, la deduplicación por clave y
+      pending_count abarcan a todos.
+    - Dos trabajos con la misma clave de deduplicación que estén en curso comparten el mismo ID.
+    - Un trabajo en curso cuyo proceso terminó (reinicio o caída del worker) se da por fallido.
+    - Se conservan los últimos `max_finished` trabajos terminados para poder consultar su resultado.
+    """
+
+    def __init__(self, max_workers: int, db_path: str, max_finished: int = 500):
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="sonemica-job"
+        )
+        self.db_path = db_path
+        self.max_finished = max_finished
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._connect()
+        self._conn.executescript(_SCHEMA)
+
+        # Una conexión de SQLite no puede compartirse entre procesos: cada worker creado con fork abre la suya
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _connect(self):
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+        self._connect()
+
+    def _orphaned(self, status: str, owner_pid: int) -> bool:
+        return status in _ACTIVE and not _pid_alive(owner_pid)
+
+    def _fail_orphan(self, job_id: str):
+        self._conn.execute(
+            "UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE job_id = ? AND status IN (?, ?)",
+            (JOB_FAILED, _ORPHANED, time.time(), job_id, *_ACTIVE),
+        )
+
+    def submit(self, key: str, fn: Callable[..., Any], *args, **kwargs) -> str:
+        """
+        Encola `fn(*args, **kwargs)` y devuelve el ID del trabajo.
+
+        Si ya hay un trabajo pendiente o en ejecución con la misma clave (en cualquier worker),
+        devuelve su ID en lugar de encolar uno nuevo.
+        """
+        with self._lock, self._conn:
+            # Transacción de escritura desde el principio: dos workers no pueden encolar la misma clave a la vez
+            self._conn.execute("BEGIN IMMEDIATE")
+            rows = self._conn.execute(
+                "SELECT job_id, status, owner_pid FROM jobs WHERE key = ? AND status IN (?, ?)", (key, *_ACTIVE)
+            ).fetchall()
+            for job_id, status, owner_pid in rows:
+                if not self._orphaned(status, owner_pid):
+                    return job_id
+                self._fail_orphan(job_id)
+
+            job_id = uuid.uuid4().hex
+            self._conn.execute(
+                "INSERT INTO jobs (job_id, key, status, owner_pid, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (job_id, key, JOB_PENDING, os.getpid(), time.time()),
+            )
+
+        self._executor.submit(self._run, job_id, fn, args, kwargs)
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Devuelve el estado del trabajo, o None si no existe (o ya fue descartado).
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status, result, error, owner_pid FROM jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+            if row is None:
+                return None
+
+            status, result, error, owner_pid = row
+            if self._orphaned(status, owner_pid):
+                with self._conn:
+                    self._fail_orphan(job_id)
+                status, error = JOB_FAILED, _ORPHANED
+
+        return {
+            "job_id": job_id,
+            "status": status,
+            "result": json.loads(result) if result is not None else None,
+            "error": error,
+        }
+
+    def pending_count(self) -> int:
+        """
+        Cantidad de trabajos pendientes o en ejecución en todos los workers.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT owner_pid, COUNT(*) FROM jobs WHERE status IN (?, ?) GROUP BY owner_pid", _ACTIVE
+            ).fetchall()
+        return sum(count for owner_pid, count in rows if _pid_alive(owner_pid))
+
+    def _update(self, job_id: str, status: str, result: Optional[bytes] = None, error: Optional[str] = None):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, updated_at = ? WHERE job_id = ?",
+                (status, result, error, time.time(), job_id),
+            )
+
+    def _run(self, job_id: str, fn, args, kwargs):
+        self._update(job_id, JOB_RUNNING)
+
+        try:
+            result = dumps(fn(*args, **kwargs))
+            status, error = JOB_DONE, None
+        except Exception as e:
+            print(f"❌ Error en el trabajo {job_id}: {e}")
+            result, status, error = None, JOB_FAILED, str(e)
+
+        self._update(job_id, status, result, error)
+
+        # Descartamos los trabajos terminados más antiguos
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                DELETE FROM jobs WHERE status NOT IN (?, ?) AND job_id NOT IN (
+                    SELECT job_id FROM jobs WHERE status NOT IN (?, ?) ORDER BY updated_at DESC LIMIT ?
+                )
+                """,
+                (*_ACTIVE, *_ACTIVE, self.max_finished),
+            )
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
+
+
+@lru_cache(maxsize=1)
+def get_image_job_queue() -> JobQueue:
+    """
+    Cola compartida para la generación del paisaje emocional (SDXL + descripción), en
+    IMAGE_JOB_DB_PATH. La base se crea en el primer uso.
+    """
+    return JobQueue(
+        max_workers=Config.IMAGE_JOB_WORKERS,
+        db_path=Config.IMAGE_JOB_DB_PATH,
+        max_finished=Config.IMAGE_JOB_MAX_FINISHED,
+    )
@@ -0,0 +1,44 @@
+import re
+from typing import List, Tuple
+
+# Marcadores de sección al estilo Genius: "[Chorus]", "[Verse 1: Eminem]", "[Intro: Alfred Hitchcock]"
+SECTION_MARKER = re.compile(r"^\s*\[[^\]]*\]\s*$")
+
+
+def _line_key(line: str) -> str:
+    """
+    Clave para comparar líneas: sin mayúsculas, puntuación ni espacios de más.
+    """
+    return re.sub(r"\s+", " ", re.sub(r"[^\w\s]", "", line.lower())).strip()
+
+
+def compact_lyrics(lyrics: str) -> Tuple[List[str], List[int]]:
+    """
+    Compacta una letra antes de tokenizarla.
+
+    - Elimina los marcadores de sección ([Chorus], [Verse 1: ...]).
+    - Deja una sola aparición de cada línea repetida (estribillos, ganchos), en el orden de su primera aparición.
+
+    Devuelve las líneas que quedan y cuántas veces aparecía cada una en la letra original, para
+    poder ponderar por repetición más adelante.
+    """
+    lines = []
+    counts = []
+    index_by_key = {}
+
+    for line in lyrics.splitlines():
+        if not line.strip() or SECTION_MARKER.match(line):
+            continue
+
+        key = _line_key(line)
+        if not key:
+            continue
+        if key in index_by_key:
+            counts[index_by_key[key]] += 1
+            continue
+
+        index_by_key[key] = len(lines)
+        lines.append(line.strip())
+        counts.append(1)
+
+    return lines, counts
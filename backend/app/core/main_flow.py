@@ -1,19 +1,115 @@
 from app.core import DataFetcher
 from app.core import DataAnalyzer
 from app.analyzers import ValenceArousalAnalyzer
-from app.analyzers import TransformerAnalyzer
-from app.analyzers import graficar_paisaje_emocional
+from app.analyzers import get_model_registry, get_emotion_aggregator
+from app.analyzers import generar_paisaje_emocional, calcular_emociones_combinadas, clave_distribucion
+from app.analyzers import imagen_a_data_url, subir_imagen_a_imgbb
 from app.analyzers import analyze_emotional_diversity
+from app.core.job_queue import get_image_job_queue, JOB_PENDING, JOB_RUNNING, JOB_DONE, JOB_SKIPPED
+from app.core.image_cache import get_image_cache, quantize_distribution
+from app.core.blob_store import get_blob_store, blob_url
+from app.core.result_cache import get_result_cache, history_fingerprint
+from app.core.history_store import get_history_store, plays_from_analysis, GRANULARITY_DAY
+from app.analyzers import EmotionalAggregate
+from app.analyzers.emotional_diversity_analyzer import EmotionalDiversityAnalyzer
+from app.services import SpotifyService
+from app.config import Config
+from app.utils import Deadline, get_breaker, stage
+from app.utils.metrics import MATCHED_TRACKS, DEGRADED_STAGES
+from app.utils.circuit_breaker import CIRCUIT_OPEN
+
+
+def _url_para_modelo(image_bytes):
+  """
+  URL con la que el modelo de descripción recibe la imagen, según IMAGE_VLM_SOURCE.
+  """
+  if Config.IMAGE_VLM_SOURCE == "url":
+    return blob_url(get_blob_store().put(image_bytes))
+  if Config.IMAGE_VLM_SOURCE == "imgbb":
+    return subir_imagen_a_imgbb(image_bytes)
+  return imagen_a_data_url(image_bytes)
+
+
+def _paisaje_omitido(reason):
+  return {"job_id": None, "status": JOB_SKIPPED, "result": None, "error": reason}
+
+
+def _tiene_audio_features(avg_audio):
+  return all(v is not None for v in avg_audio["average_audio_features"].values())
+
+
+def _resultado_paisaje(image_digest, descripcion):
+  return {
+    "url_publica": blob_url(image_digest),
+    "image_digest": image_digest,
+    "descripcion": descripcion,
+  }
+
+
+def _generar_y_cachear_paisaje(emotion_distribution, key):
+  """
+  Trabajo en segundo plano: genera el paisaje emocional y lo guarda en la caché de imágenes.
+  Los bytes de la imagen quedan en el almacén de blobs y se sirven desde /api/sonemica/images/{digest}.
+  """
+  paisaje = generar_paisaje_emocional(emotion_distribution, url_para_modelo=_url_para_modelo)
+  image_digest = get_image_cache().put(
+    key,
+    paisaje["image_bytes"],
+    {"descripcion": paisaje["descripcion"], "distribution": emotion_distribution},
+  )
+  return _resultado_paisaje(image_digest, paisaje["descripcion"])
+
+
+def fetch_history(access_token, deadline=None):
+  """
+  Obtiene las últimas 50 canciones escuchadas por el usuario y la huella de ese historial.
+  """
+  deadline = deadline or Deadline(Config.REQUEST_DEADLINE_SECONDS)
+  data_fetcher = DataFetcher()
+  with stage("spotify_fetch"):
+    user_songs = data_fetcher.fetch_recent_tracks(access_token, deadline=deadline)
+  return user_songs, history_fingerprint(user_songs)
+
+
+def main_flow(access_token, deadline=None):
+  """
+  Flujo completo de análisis para las últimas canciones del usuario.
+  """
+  deadline = deadline or Deadline(Config.REQUEST_DEADLINE_SECONDS)
+  user_songs, fingerprint = fetch_history(access_token, deadline=deadline)
+  return analyze_history(user_songs, fingerprint, deadline=deadline, access_token=access_token)
+
+
+def analyze_history(user_songs, fingerprint, deadline=None, access_token=None, under_pressure=False):
+  """
+  Analiza un historial ya obtenido de Spotify.
+
+  Si se pasa el `access_token`, las reproducciones analizadas se registran en la serie temporal
+  del usuario (ver emotional_trend).
+
+  Si el mismo historial (misma huella) ya se analizó, se devuelve el resultado cacheado sin volver
+  a correr la inferencia ni la generación de imagen.
+
+  Todo el pedido corre dentro de un plazo (`deadline`). Las etapas que no llegan a completarse
+  se omiten o se truncan y quedan registradas en "degraded_stages", devolviendo igualmente los
+  resultados parciales (por ejemplo valencia/arousal sin imagen). Los resultados parciales no se cachean.
+
+  Con `under_pressure` (servidor sobrecargado), o si la cola de imágenes ya tiene IMAGE_JOB_BACKLOG_MAX
+  trabajos pendientes, no se encolan imágenes nuevas; las que ya están en caché se devuelven igual.
+  Bajo presión las letras se analizan además con la cascada VADER → transformer (CASCADE_UNDER_PRESSURE)
+  y ese resultado no se cachea.
+  """
+  cached = get_result_cache().get(fingerprint)
+  if cached is not None:
+    return _refrescar_paisaje(cached)
+
+  deadline = deadline or Deadline(Config.REQUEST_DEADLINE_SECONDS)
+  degraded_stages = {}
 
-def main_flow(access_token):
   # Instanciamos las clases
   data_fetcher = DataFetcher()
   data_analyzer = DataAnalyzer()
   valence_arousal_analyzer = ValenceArousalAnalyzer()
-  transformer_analyzer = TransformerAnalyzer()
-
-  # Obtenemos las últimas 50 canciones escuchadas por el usuario
-  user_songs = data_fetcher.fetch_recent_tracks(access_token)
 
   # b
   songs_with_audio_features = data_fetcher.fetch_audio_features(user_songs)
@@ -21,28 +117,203 @@ def main_flow(access_token):
   # Letras
   songs_with_lyrics = data_fetcher.fetch_lyrics(user_songs)
 
+  MATCHED_TRACKS.observe(len(songs_with_audio_features), source="audio_features")
+  MATCHED_TRACKS.observe(len(songs_with_lyrics), source="lyrics")
+
   # Inferimos emociones sobre las letras encontradas
-  songs_lyrics_emotional_inference = [transformer_analyzer.analyze(song) for song in songs_with_lyrics]
+  # La cascada activada por presión da un resultado distinto al del modo configurado: no se cachea
+  # bajo la misma huella (los pedidos siguientes, ya sin presión, deben recibir el análisis completo)
+  pressure_cascade = (
+    Config.LYRICS_INFERENCE_MODE != "cascade" and under_pressure and Config.CASCADE_UNDER_PRESSURE
+  )
+  cascade = Config.LYRICS_INFERENCE_MODE == "cascade" or pressure_cascade
+  with stage("lyrics_inference"):
+    songs_lyrics_emotional_inference = _inferir_letras(songs_with_lyrics, cascade, deadline, degraded_stages)
 
   # Análisis 
   avg_songs_audio_feautre = data_analyzer.average_audio_features(songs_with_audio_features)
-  avg_songs_lyrics = data_analyzer.analyze_lyrics(songs_with_lyrics)
+  avg_songs_lyrics = data_analyzer.summarize_lyrics_inference(songs_lyrics_emotional_inference)
 
   # (1) Realizamos análisis de dimensiones Valence y Arousal
-  valence_arousal_result = valence_arousal_analyzer.process_songs(songs_with_audio_features, songs_lyrics_emotional_inference) 
+  with stage("valence_arousal"):
+    valence_arousal_result = valence_arousal_analyzer.process_songs(songs_with_audio_features, songs_lyrics_emotional_inference) 
 
   # (2) Dudoso
-  emotional_diversity_result = analyze_emotional_diversity(valence_arousal_result)
+  with stage("diversity"):
+    emotional_diversity_result = analyze_emotional_diversity(valence_arousal_result)
 
   # (3) Representación artística de las emociones.
-  grafico_descripcion = graficar_paisaje_emocional(avg_songs_audio_feautre, avg_songs_lyrics)
+  grafico_descripcion = _paisaje_emocional(
+    avg_songs_audio_feautre, avg_songs_lyrics, degraded_stages, skip_image=under_pressure
+  )
 
-  return {
+  # (4) Serie temporal del usuario
+  if access_token is not None:
+    _registrar_historial(access_token, user_songs, valence_arousal_result, deadline, degraded_stages)
+
+  result = {
+    "fingerprint": fingerprint,
     "valence_arousal_analysis": valence_arousal_result,
     "graphic_diversity_analysis": emotional_diversity_result,
     "graphic_description": grafico_descripcion,
+    "degraded_stages": degraded_stages,
+    "lyrics_inference": {
+      "mode": "cascade" if cascade else "transformer",
+      "analyzed": len(songs_lyrics_emotional_inference),
+      "escalated": sum(1 for r in songs_lyrics_emotional_inference if r["method"] == "transformer"),
+    },
   }
 
+  if not degraded_stages and not pressure_cascade:
+    get_result_cache().put(fingerprint, result)
+  for stage_name in degraded_stages:
+    DEGRADED_STAGES.inc(stage=stage_name)
+
+  return result
+
+
+def _usuario_spotify(access_token, deadline):
+  """
+  ID de Spotify del usuario. Se consulta directamente al servicio para no cargar el catálogo local.
+  """
+  timeout = deadline.budget("spotify", Config.STAGE_BUDGET_SPOTIFY)
+  return SpotifyService().get_current_user_id(access_token, timeout=timeout)
+
+
+def _inferir_letras(songs_with_lyrics, cascade, deadline, degraded_stages):
+  """
+  Analiza las letras en lotes de INFERENCE_BATCH_SIZE, con el transformer o con la cascada VADER → transformer.
+  Si se agota el plazo, seguimos con las que ya se analizaron.
+
+  Las letras se ordenan por longitud antes de partirlas en lotes (para que el padding de cada lote sea
+  mínimo) y los resultados vuelven en el orden original.
+  """
+  analyzer = get_emotion_aggregator() if cascade else get_model_registry()
+  batch_size = Config.INFERENCE_BATCH_SIZE
+  order = sorted(range(len(songs_with_lyrics)), key=lambda i: len(songs_with_lyrics[i].get("Lyrics") or ""))
+
+  results = {}
+  for start in range(0, len(order), batch_size):
+    if deadline.expired():
+      degraded_stages["lyrics_inference"] = (
+        f"deadline_exceeded: {len(results)}/{len(songs_with_lyrics)} letras analizadas"
+      )
+      break
+    batch = order[start : start + batch_size]
+    for i, result in zip(batch, analyzer.analyze_batch([songs_with_lyrics[i] for i in batch], batch_size)):
+      results[i] = result
+  return [results[i] for i in sorted(results)]
+
+
+def _registrar_historial(access_token, user_songs, valence_arousal_result, deadline, degraded_stages):
+  """
+  Guarda las reproducciones analizadas en la serie temporal del usuario.
+  Si no se puede (Spotify o la base no responden), el resultado queda como degradado y no se cachea,
+  así el próximo pedido con el mismo historial vuelve a intentarlo.
+  """
+  try:
+    with stage("history"):
+      user_id = _usuario_spotify(access_token, deadline)
+      get_history_store().record_plays(user_id, plays_from_analysis(user_songs, valence_arousal_result))
+  except Exception as e:
+    print(f"❌ No se pudo registrar el historial: {e}")
+    degraded_stages["history"] = str(e)
+
+
+def emotional_trend(access_token, start, end, granularity=GRANULARITY_DAY, deadline=None):
+  """
+  Evolución del centroide de Valencia-Arousal y de la diversidad emocional del usuario entre dos fechas.
+
+  Se calcula a partir de los agregados diarios o semanales ya guardados, sin volver a analizar canciones.
+  """
+  deadline = deadline or Deadline(Config.REQUEST_DEADLINE_SECONDS)
+  user_id = _usuario_spotify(access_token, deadline)
+
+  valence_arousal_analyzer = ValenceArousalAnalyzer()
+  diversity_analyzer = EmotionalDiversityAnalyzer()
+
+  def resumen(aggregate):
+    return {
+      "summary": valence_arousal_analyzer.summarize_aggregate(aggregate),
+      "diversity": diversity_analyzer.calculate_diversity_from_aggregate(aggregate),
+    }
+
+  buckets = get_history_store().trend(user_id, start, end, granularity)
+  total = EmotionalAggregate()
+  series = []
+  for bucket, aggregate in buckets:
+    series.append({"bucket": bucket, **resumen(aggregate)})
+    total.merge(aggregate)
+
+  return {
+    "start": start.isoformat(),
+    "end": end.isoformat(),
+    "granularity": granularity,
+    "series": series,
+    "overall": resumen(total) if total.count > 0 else None,
+  }
+
+
+def _refrescar_paisaje(cached_result):
+  """
+  Devuelve el resultado cacheado con el estado actualizado del trabajo de generación de imagen.
+  """
+  grafico_descripcion = cached_result["graphic_description"]
+  job_id = grafico_descripcion.get("job_id")
+  if job_id is None or grafico_descripcion["status"] not in (JOB_PENDING, JOB_RUNNING):
+    return cached_result
+
+  job = get_image_job_queue().get(job_id)
+  if job is None:
+    return cached_result
+
+  refreshed = {**cached_result, "graphic_description": job}
+  if job["status"] == JOB_DONE:
+    get_result_cache().put(cached_result["fingerprint"], refreshed)
+  return refreshed
+
+
+def _paisaje_emocional(avg_songs_audio_feautre, avg_songs_lyrics, degraded_stages, skip_image=False):
+  """
+  Devuelve el paisaje emocional desde la caché o encola su generación.
+  Si no hay datos suficientes, el servicio de imágenes está caído o el servidor está sobrecargado, la etapa se omite.
+  """
+  if not avg_songs_lyrics["average_lyrics_inference"] or not _tiene_audio_features(avg_songs_audio_feautre):
+    degraded_stages["image_generation"] = "insufficient_data"
+    return _paisaje_omitido("insufficient_data")
+
+  # La generación (SDXL + descripción) se encola como trabajo en segundo plano; el cliente consulta el resultado con el job_id.
+  # La distribución se cuantiza para que estados de ánimo parecidos compartan la imagen en caché.
+  emotion_distribution = quantize_distribution(
+    calcular_emociones_combinadas(
+      avg_songs_audio_feautre["average_audio_features"], avg_songs_lyrics["average_lyrics_inference"]
+    ),
+    Config.IMAGE_CACHE_STEP,
+  )
+  image_key = clave_distribucion(emotion_distribution)
+
+  cached = get_image_cache().get(image_key)
+  if cached is None and get_breaker("hf_sdxl").state == CIRCUIT_OPEN:
+    degraded_stages["image_generation"] = "circuit_open"
+    grafico_descripcion = _paisaje_omitido("circuit_open")
+  elif cached is not None:
+    grafico_descripcion = {
+      "job_id": None,
+      "status": JOB_DONE,
+      "result": _resultado_paisaje(cached["image_digest"], cached["descripcion"]),
+      "error": None,
+    }
+  elif skip_image or get_image_job_queue().pending_count() >= Config.IMAGE_JOB_BACKLOG_MAX:
+    degraded_stages["image_generation"] = "overloaded"
+    grafico_descripcion = _paisaje_omitido("overloaded")
+  else:
+    job_id = get_image_job_queue().submit(
+      image_key, _generar_y_cachear_paisaje, emotion_distribution, image_key
+    )
+    grafico_descripcion = get_image_job_queue().get(job_id)
+
+  return grafico_descripcion
+
 
 """ if __name__ == "__main__":
   access_token = "BQDDS96pO5i0HYrAU_sqmEkGGoefMn2h3PP9S1ZU8C2MHCd5mZZCN1UjqmSvmURIkEGounkfqtrVzwplEOa9zKp7dH4Q6Lb0-5oKV8umytb9-eebiBGH9T6S3dNONqtfJgL8pdB8VF0kZmGq6pZqD9MdOyFrtfoPGortBGwhozm3NA1ponDeMumT7uOItwTPFiOBSoA8j0huKWnD7BAImySnwN2K58sv4NPR2XUSoWEPPY0bk8dnDGH8zSiUK04p"
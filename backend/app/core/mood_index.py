@@ -0,0 +1,131 @@
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import polars as pl
+from scipy.spatial import cKDTree
+
+from app.analyzers import ValenceArousalAnalyzer
+from app.config import Config
+from app.core.catalog_index import CatalogIndex, catalog_version
+
+# Punto central de cada cuadrante del plano Valencia-Arousal (0 a 100 en cada eje)
+QUADRANT_CENTERS = {
+    "high_valence_high_arousal": (75.0, 75.0),
+    "low_valence_high_arousal": (25.0, 75.0),
+    "low_valence_low_arousal": (25.0, 25.0),
+    "high_valence_low_arousal": (75.0, 25.0),
+}
+
+
+class MoodIndex(CatalogIndex):
+    """
+    Valencia y arousal de cada canción del catálogo en un KD-tree.
+
+    Los puntos se calculan una vez con las mismas fórmulas que process_songs (fusión de valencia
+    musical y lírica, arousal por energía y volumen), así que son comparables con la posición del
+    usuario. Cada consulta recorre solo las ramas del árbol cercanas al punto buscado.
+    """
+
+    ARRAYS = ("points",)
+
+    def __init__(self, titles: np.ndarray, artists: np.ndarray, points: np.ndarray):
+        super().__init__(titles, artists)
+        self.points = points.astype(np.float32)
+        self.tree = cKDTree(self.points)
+
+    def _track(self, i: int, distance: float) -> Dict[str, Any]:
+        return {
+            "title": str(self.titles[i]),
+            "artist": str(self.artists[i]),
+            "valence": round(float(self.points[i, 0]), 2),
+            "arousal": round(float(self.points[i, 1]), 2),
+            "distance": round(float(distance), 2),
+        }
+
+    def _query(self, points: np.ndarray, k: int, exclude: set) -> Tuple[np.ndarray, np.ndarray]:
+        # Pedimos de más para poder descartar las excluidas sin volver a consultar
+        n = min(k + len(exclude), len(self))
+        distances, indices = self.tree.query(points, k=n)
+        return distances.reshape(len(points), n), indices.reshape(len(points), n)
+
+    def near(self, valence: float, arousal: float, k: int = 10, exclude: set = frozenset()) -> List[Dict[str, Any]]:
+        """
+        Las `k` canciones más cercanas al punto (valencia, arousal), de la más cercana a la más lejana.
+        """
+        distances, indices = self._query(np.array([[valence, arousal]]), k, exclude)
+        tracks = [self._track(i, d) for d, i in zip(distances[0], indices[0]) if i not in exclude]
+        return tracks[:k]
+
+    def path(
+        self, start: Tuple[float, float], target: Tuple[float, float], steps: int = 5, k: int = 3,
+        exclude: set = frozenset(),
+    ) -> List[Dict[str, Any]]:
+        """
+        Recorrido de `start` a `target` en `steps` puntos equiespaciados, con las `k` canciones más
+        cercanas a cada uno. Una canción aparece como mucho en un paso.
+        """
+        waypoints = np.linspace(start, target, steps)
+        distances, indices = self._query(waypoints, k + steps * k, exclude)
+
+        used = set(exclude)
+        route = []
+        for waypoint, row_distances, row_indices in zip(waypoints, distances, indices):
+            tracks = []
+            for d, i in zip(row_distances, row_indices):
+                if i in used:
+                    continue
+                used.add(i)
+                tracks.append(self._track(i, d))
+                if len(tracks) == k:
+                    break
+            route.append(
+                {
+                    "valence": round(float(waypoint[0]), 2),
+                    "arousal": round(float(waypoint[1]), 2),
+                    "tracks": tracks,
+                }
+            )
+        return route
+
+    def centroid(self, positions: set) -> Optional[Tuple[float, float]]:
+        if not positions:
+            return None
+        valence, arousal = self.points[sorted(positions)].mean(axis=0)
+        return float(valence), float(arousal)
+
+
+def mood_version() -> str:
+    return catalog_version()
+
+
+def build_mood_index(catalog: pl.DataFrame, sentiments: List[Optional[dict]]) -> MoodIndex:
+    """
+    Calcula valencia y arousal de todo el catálogo (ver analyze_catalog) con el camino columnar de
+    ValenceArousalAnalyzer.
+    """
+    va_analyzer = ValenceArousalAnalyzer()
+    tracks = va_analyzer.build_tracks_table(
+        catalog.select("Title", "Artist", "Valence", "Energy", "Loudness").to_dicts(),
+        [s for s in sentiments if s],
+    )
+    songs = [
+        song
+        for song in va_analyzer.process_songs_columnar(tracks)["songs"]
+        if not (np.isnan(song["valence"]) or np.isnan(song["arousal"]))
+    ]
+
+    return MoodIndex(
+        np.array([song["title"] for song in songs], dtype=str),
+        np.array([song["artist"] for song in songs], dtype=str),
+        np.array([[song["valence"], song["arousal"]] for song in songs], dtype=np.float32).reshape(-1, 2),
+    )
+
+
+@lru_cache(maxsize=1)
+def get_mood_index() -> MoodIndex:
+    """
+    Índice compartido por proceso, leído de MOOD_INDEX_PATH.
+    Lanza IndexUnavailable si no existe o es de otra versión (ver ensure_catalog_indexes).
+    """
+    return MoodIndex.load_or_raise(Config.MOOD_INDEX_PATH, mood_version(), "estados de ánimo")
@@ -0,0 +1,66 @@
+from typing import Any, Dict, List, Optional
+
+# Columnas del formato compacto de canciones, en el orden en que se devuelven
+SONG_COLUMNS = [
+    "title",
+    "artist",
+    "valence",
+    "arousal",
+    "music_valence",
+    "lyrics_valence",
+    "energy",
+    "loudness",
+    "data_source",
+]
+EMOTION_COLUMNS = ["anger", "joy", "optimism", "sadness"]
+
+
+def songs_to_columns(songs: List[Dict[str, Any]]) -> Dict[str, List[Any]]:
+    """
+    Pasa la lista de canciones de process_songs a un diccionario de listas paralelas (una por campo).
+
+    De "sentiment_scores" solo se conservan la emoción principal y la distribución, ya que título,
+    artista y método repiten datos de la canción.
+    """
+    columns = {column: [song.get(column) for song in songs] for column in SONG_COLUMNS}
+
+    scores = [song.get("sentiment_scores") or {} for song in songs]
+    columns["emotion"] = [s.get("emotion") for s in scores]
+    for emotion in EMOTION_COLUMNS:
+        columns[emotion] = [s.get("distribution", {}).get(emotion) for s in scores]
+
+    return columns
+
+
+def project_analysis(
+    result: Dict[str, Any], fields: Optional[List[str]] = None, compact: bool = False
+) -> Dict[str, Any]:
+    """
+    Recorta un resultado de análisis a las secciones pedidas.
+
+    - `fields`: rutas separadas por puntos (por ejemplo "valence_arousal_analysis.summary"). Sin
+      `fields` se devuelven todas las secciones. Una ruta inexistente lanza KeyError.
+    - `compact`: las canciones de "valence_arousal_analysis" se devuelven en formato columnar
+      (ver songs_to_columns).
+    """
+    if compact and isinstance(result.get("valence_arousal_analysis"), dict):
+        analysis = result["valence_arousal_analysis"]
+        if isinstance(analysis.get("songs"), list):
+            result = {
+                **result,
+                "valence_arousal_analysis": {**analysis, "songs": songs_to_columns(analysis["songs"])},
+            }
+
+    if not fields:
+        return result
+
+    projected = {}
+    for field in fields:
+        path = field.split(".")
+        source, target = result, projected
+        for part in path[:-1]:
+            source = source[part]
+            target = target.setdefault(part, {})
+        target[path[-1]] = source[path[-1]]
+
+    return projected
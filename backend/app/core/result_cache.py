@@ -0,0 +1,133 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.config import Config
+from app.utils.serialization import dumps
+
+# Versión del pipeline de análisis. Cambiarla invalida todos los resultados cacheados,
+# por lo que hay que incrementarla cada vez que cambie el cálculo o la forma de la respuesta.
+# 2: compactación de letras, inferencia por ventanas y cascada VADER por línea
+PIPELINE_VERSION = "2"
+
+
+def inference_settings() -> Tuple[str, ...]:
+    """
+    Configuración que cambia el análisis de las letras: modelos, modo de inferencia (con el umbral
+    de la cascada y su criterio, el compound por línea) y preparación del texto.
+    """
+    return (
+        Config.LYRICS_MODELS,
+        Config.LYRICS_INFERENCE_MODE,
+        f"cascade=lines:{Config.CASCADE_AMBIGUITY_THRESHOLD}",
+        f"compaction={Config.LYRICS_COMPACTION}",
+        f"windows={Config.LYRICS_WINDOWED}:{Config.LYRICS_MAX_WINDOWS}:{Config.LYRICS_WINDOW_OVERLAP}",
+    )
+
+
+def history_fingerprint(tracks: List[Dict[str, Any]]) -> str:
+    """
+    Huella del historial de reproducciones: hash de la lista ordenada de (id, played_at) más la versión del
+    pipeline y la configuración de inferencia (ver inference_settings).
+
+    Mientras el usuario no escuche nada nuevo y no cambie la configuración, la huella no cambia.
+    """
+    digest = hashlib.sha256("|".join((f"v{PIPELINE_VERSION}", *inference_settings())).encode())
+    for track in tracks:
+        digest.update(f"\n{track.get('id')}|{track.get('played_at')}".encode())
+    return digest.hexdigest()
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    fingerprint TEXT PRIMARY KEY,
+    stored_at REAL NOT NULL,
+    accessed_at REAL NOT NULL,
+    result BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_by_access ON results (accessed_at);
+"""
+
+
+class ResultCache:
+    """
+    Caché de respuestas completas de análisis, indexada por huella de historial.
+
+    Guarda como máximo `max_entries` resultados (LRU) y cada uno vence a los `ttl_seconds`.
+    Los resultados se guardan serializados en SQLite (`db_path`), así que todos los workers de
+    serve.py comparten la misma caché y el mismo límite de entradas.
+    """
+
+    def __init__(self, db_path: str, max_entries: int, ttl_seconds: float):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._connect()
+        self._conn.executescript(_SCHEMA)
+
+        # Una conexión de SQLite no puede compartirse entre procesos: cada worker creado con fork abre la suya
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _connect(self):
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+        self._connect()
+
+    def get(self, fingerprint: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT stored_at, result FROM results WHERE fingerprint = ?", (fingerprint,)
+            ).fetchone()
+            if row is None:
+                return None
+
+            stored_at, result = row
+            if now - stored_at > self.ttl_seconds:
+                self._conn.execute("DELETE FROM results WHERE fingerprint = ?", (fingerprint,))
+                return None
+
+            self._conn.execute("UPDATE results SET accessed_at = ? WHERE fingerprint = ?", (now, fingerprint))
+        return json.loads(result)
+
+    def put(self, fingerprint: str, result: Dict[str, Any]):
+        payload = dumps(result)
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results (fingerprint, stored_at, accessed_at, result) VALUES (?, ?, ?, ?)",
+                (fingerprint, now, now, payload),
+            )
+            self._conn.execute(
+                """
+                DELETE FROM results WHERE stored_at < ? OR fingerprint NOT IN (
+                    SELECT fingerprint FROM results ORDER BY accessed_at DESC LIMIT ?
+                )
+                """,
+                (now - self.ttl_seconds, self.max_entries),
+            )
+
+
+@lru_cache(maxsize=1)
+def get_result_cache() -> ResultCache:
+    """
+    Caché compartida por proceso, en RESULT_CACHE_DB_PATH. La base se crea en el primer uso.
+    """
+    return ResultCache(
+        db_path=Config.RESULT_CACHE_DB_PATH,
+        max_entries=Config.RESULT_CACHE_MAX_ENTRIES,
+        ttl_seconds=Config.RESULT_CACHE_TTL_SECONDS,
+    )
@@ -1,12 +1,380 @@
-from fastapi import APIRouter
-from app.core import main_flow
+import hashlib
+import hmac
+import os
+import time
+import requests
+from contextlib import contextmanager
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+from fastapi import APIRouter, Body, HTTPException, Request, Response
+from fastapi.responses import FileResponse
+from app.config import Config
+from app.core import fetch_history, analyze_history, analyze_cohort, project_analysis, emotional_trend, get_image_job_queue, get_blob_store, get_chart_renderer
+from app.core import get_embedding_index, get_mood_index
+from app.core.catalog_index import IndexUnavailable
+from app.core.mood_index import QUADRANT_CENTERS
+from app.core.history_store import GRANULARITIES, GRANULARITY_DAY
+from app.core.blob_store import media_type_for
+from app.core.chart_renderer import CHART_KINDS, chart_key
+from app.analyzers.charts import CHART_MEDIA_TYPES
+from app.utils import CircuitOpenError, Deadline, DeadlineExceeded, json_response
+from app.utils import Overloaded, analyzer_admission
+from app.utils import request_timings, server_timing_header
+from app.utils.profiling import PROFILE_HEADER, find_profile, profile_request, should_profile
 
 main_router = APIRouter()
 
+
+@contextmanager
+def _upstream_errors():
+  """
+  Traduce a respuestas HTTP los errores de lo que el pedido no controla: servicio externo con el
+  circuito abierto o índice del catálogo sin generar (503 con Retry-After), y plazo o timeout
+  vencidos (504).
+  """
+  try:
+    yield
+  except CircuitOpenError as e:
+    raise HTTPException(
+      status_code=503, detail=str(e), headers={"Retry-After": str(int(e.retry_after) + 1)}
+    )
+  except IndexUnavailable as e:
+    raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "60"})
+  except (DeadlineExceeded, requests.exceptions.Timeout) as e:
+    raise HTTPException(status_code=504, detail=str(e))
+
+
 @main_router.get("/analyzer")
-async def sonemica_analyzer(access_token: str):
+def sonemica_analyzer(
+  access_token: str, request: Request, fields: Optional[str] = None, compact: bool = False
+):
   """
   Endpoint principal
+
+  - `fields`: secciones a devolver separadas por comas, admite rutas con puntos
+    (por ejemplo "fingerprint,valence_arousal_analysis.summary").
+  - `compact=true`: las canciones se devuelven como listas paralelas por campo en lugar de una
+    lista de objetos, sin repetir título y artista dentro de "sentiment_scores".
+
+  Las respuestas grandes se comprimen con brotli o gzip según Accept-Encoding.
+
+  La imagen del paisaje emocional se genera en segundo plano: la respuesta incluye en
+  "graphic_description" el job_id que se consulta en /image/{job_id}.
+  Si alguna etapa se omite por falta de tiempo o por un servicio caído, se indica en "degraded_stages".
+
+  El ETag combina la huella del historial de reproducciones, la proyección pedida (`fields` y
+  `compact`) y el estado de la imagen: si el cliente manda If-None-Match con la misma representación
+  se responde 304. Con el historial ya analizado (en la caché de resultados) eso cuesta una sola
+  llamada a Spotify.
+
+  El header Server-Timing detalla la duración de cada etapa ejecutada en el pedido.
+
+  Como mucho ANALYZER_MAX_CONCURRENT análisis corren a la vez y ANALYZER_MAX_QUEUE esperan turno;
+  el resto recibe 503 con Retry-After. Mientras haya pedidos esperando, los análisis en curso no
+  generan imágenes nuevas ("image_generation": "overloaded" en degraded_stages).
+
+  Si el pedido se perfila (ver app/utils/profiling.py), el id del perfil guardado se devuelve en
+  X-Sonemica-Profile-Id y se descarga desde /profiles/{profile_id}.
+  """
+
+  profile = None
+  with request_timings() as timings:
+    start = time.perf_counter()
+    try:
+      with analyzer_admission.slot():
+        if should_profile(request):
+          with profile_request("analyzer") as profile:
+            response = _analyzer_response(access_token, request, fields, compact)
+        else:
+          response = _analyzer_response(access_token, request, fields, compact)
+    except Overloaded as e:
+      raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    timings["total"] = time.perf_counter() - start
+
+  response.headers["Server-Timing"] = server_timing_header(timings)
+  if profile and profile["profile_id"]:
+    response.headers["X-Sonemica-Profile-Id"] = profile["profile_id"]
+  return response
+
+
+def _analyzer_response(access_token, request, fields, compact):
+  with _upstream_errors():
+    deadline = Deadline(Config.REQUEST_DEADLINE_SECONDS)
+    user_songs, fingerprint = fetch_history(access_token, deadline=deadline)
+
+    result = analyze_history(
+      user_songs,
+      fingerprint,
+      deadline=deadline,
+      access_token=access_token,
+      under_pressure=analyzer_admission.under_pressure(),
+    )
+
+  field_list = sorted({f.strip() for f in fields.split(",") if f.strip()}) if fields else None
+  try:
+    payload = project_analysis(result, fields=field_list, compact=compact)
+  except (KeyError, TypeError) as e:
+    raise HTTPException(status_code=400, detail=f"Campo desconocido: {e}")
+
+  # Los resultados parciales no se cachean, así que tampoco se les asigna ETag
+  if result["degraded_stages"]:
+    return json_response(request, payload)
+
+  etag = _analyzer_etag(fingerprint, field_list, compact, result)
+  if etag in _if_none_match(request):
+    return Response(status_code=304, headers={"ETag": etag})
+  return json_response(request, payload, headers={"ETag": etag})
+
+
+def _analyzer_etag(fingerprint, field_list, compact, result):
+  """
+  ETag de una respuesta de /analyzer: la misma huella con otra proyección, o con la imagen en otro
+  estado (pendiente → lista), es otra representación.
+  """
+  image_status = (result.get("graphic_description") or {}).get("status")
+  variant = hashlib.sha256(
+    f"{','.join(field_list or [])}|{compact}|{image_status}".encode()
+  ).hexdigest()[:16]
+  return f'"{fingerprint}-{variant}"'
+
+
+def _if_none_match(request):
+  header = request.headers.get("if-none-match", "")
+  return {tag.strip().removeprefix("W/") for tag in header.split(",") if tag.strip()}
+
+
+@main_router.get("/profiles/{profile_id}")
+def sonemica_profile(profile_id: str, request: Request):
+  """
+  Descarga un perfil guardado. Requiere el mismo token de PROFILE_TOKEN en el header X-Sonemica-Profile.
+  """
+
+  token = request.headers.get(PROFILE_HEADER, "")
+  if not Config.PROFILE_TOKEN or not hmac.compare_digest(token, Config.PROFILE_TOKEN):
+    raise HTTPException(status_code=403, detail="Token de perfilado inválido")
+
+  path = find_profile(profile_id)
+  if path is None:
+    raise HTTPException(status_code=404, detail="Perfil no encontrado")
+
+  return FileResponse(path, filename=os.path.basename(path))
+
+
+@main_router.post("/cohort")
+def sonemica_cohort(users: Dict[str, List[Dict[str, Any]]] = Body(..., embed=True)):
+  """
+  Análisis de un grupo de usuarios.
+
+  Recibe {"users": {"<usuario>": [canciones]}} con las canciones en el formato de /recently-played
+  (name, artists, id, played_at). Devuelve el análisis de cada usuario y el agregado del grupo;
+  las canciones compartidas se analizan una sola vez.
+
+  Se admiten hasta COHORT_MAX_USERS usuarios con COHORT_MAX_TRACKS_PER_USER canciones cada uno, y el
+  análisis ocupa un turno del mismo control de admisión que /analyzer (503 con Retry-After si no hay lugar).
+  """
+
+  if not users:
+    raise HTTPException(status_code=400, detail="No se recibieron usuarios")
+  if len(users) > Config.COHORT_MAX_USERS:
+    raise HTTPException(
+      status_code=413, detail=f"Se admiten como máximo {Config.COHORT_MAX_USERS} usuarios"
+    )
+  if any(len(tracks) > Config.COHORT_MAX_TRACKS_PER_USER for tracks in users.values()):
+    raise HTTPException(
+      status_code=413,
+      detail=f"Se admiten como máximo {Config.COHORT_MAX_TRACKS_PER_USER} canciones por usuario",
+    )
+
+  try:
+    with analyzer_admission.slot():
+      return analyze_cohort(users)
+  except Overloaded as e:
+    raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+
+@main_router.get("/trend")
+def sonemica_trend(
+  access_token: str,
+  start: Optional[date] = None,
+  end: Optional[date] = None,
+  granularity: str = GRANULARITY_DAY,
+):
+  """
+  Evolución del centro emocional y de la diversidad del usuario entre `start` y `end` (fechas ISO, UTC).
+
+  Por defecto devuelve los últimos 30 días. `granularity` puede ser "day" o "week".
+  Solo incluye las reproducciones registradas por análisis anteriores (/analyzer).
+  """
+
+  if granularity not in GRANULARITIES:
+    raise HTTPException(status_code=400, detail="Granularidad no soportada")
+
+  end = end or datetime.now(timezone.utc).date()
+  start = start or end - timedelta(days=30)
+  if start > end:
+    raise HTTPException(status_code=400, detail="La fecha de inicio es posterior a la de fin")
+
+  with _upstream_errors():
+    return emotional_trend(access_token, start, end, granularity)
+
+
+@main_router.get("/similar")
+def sonemica_similar(
+  access_token: Optional[str] = None,
+  title: Optional[str] = None,
+  artist: Optional[str] = None,
+  k: int = 10,
+):
+  """
+  Canciones del catálogo que se sienten parecidas, por distribución emocional de la letra y audio features.
+
+  - Con `title` y `artist`: parecidas a esa canción.
+  - Con `access_token`: parecidas al centroide de las últimas canciones escuchadas por el usuario,
+    sin incluirlas.
+
+  Si el índice no está generado (o es de otro modelo o catálogo) responde 503.
+  """
+
+  if k < 1 or k > Config.SIMILAR_MAX_RESULTS:
+    raise HTTPException(status_code=400, detail=f"k debe estar entre 1 y {Config.SIMILAR_MAX_RESULTS}")
+
+  if not access_token and not (title and artist):
+    raise HTTPException(status_code=400, detail="Se requiere access_token, o title y artist")
+
+  with _upstream_errors():
+    index = get_embedding_index()
+    if access_token:
+      user_songs, _ = fetch_history(access_token)
+      similar = index.similar_to_tracks(user_songs, k)
+    else:
+      similar = index.similar_to_track(title, artist, k)
+
+  if similar is None:
+    raise HTTPException(status_code=404, detail="Ninguna canción está en el catálogo")
+
+  return {"similar": similar}
+
+
+@main_router.get("/mood")
+def sonemica_mood(valence: float, arousal: float, k: int = 10):
+  """
+  Las `k` canciones del catálogo más cercanas a un punto del plano Valencia-Arousal (0 a 100).
+
+  Si el índice no está generado (o es de otro modelo o catálogo) responde 503.
+  """
+
+  if not (0 <= valence <= 100 and 0 <= arousal <= 100):
+    raise HTTPException(status_code=400, detail="valence y arousal deben estar entre 0 y 100")
+  if k < 1 or k > Config.SIMILAR_MAX_RESULTS:
+    raise HTTPException(status_code=400, detail=f"k debe estar entre 1 y {Config.SIMILAR_MAX_RESULTS}")
+
+  with _upstream_errors():
+    return {"tracks": get_mood_index().near(valence, arousal, k)}
+
+
+@main_router.get("/mood/path")
+def sonemica_mood_path(access_token: str, quadrant: str, steps: int = 5, k: int = 3):
+  """
+  Recorrido desde el centro emocional del usuario hacia el centro de un cuadrante
+  ("high_valence_high_arousal", "low_valence_high_arousal", "low_valence_low_arousal" o
+  "high_valence_low_arousal"): `steps` puntos intermedios con `k` canciones cercanas a cada uno.
+
+  El centro del usuario es el promedio de sus últimas canciones que están en el catálogo, y esas
+  canciones no se recomiendan. Si el índice no está generado responde 503.
+  """
+
+  if quadrant not in QUADRANT_CENTERS:
+    raise HTTPException(status_code=400, detail="Cuadrante desconocido")
+  if steps < 2 or steps > Config.MOOD_PATH_MAX_STEPS:
+    raise HTTPException(status_code=400, detail=f"steps debe estar entre 2 y {Config.MOOD_PATH_MAX_STEPS}")
+  if k < 1 or k > Config.SIMILAR_MAX_RESULTS:
+    raise HTTPException(status_code=400, detail=f"k debe estar entre 1 y {Config.SIMILAR_MAX_RESULTS}")
+
+  with _upstream_errors():
+    index = get_mood_index()
+    user_songs, _ = fetch_history(access_token)
+
+  positions = index.positions_of(user_songs)
+  start = index.centroid(positions)
+  if start is None:
+    raise HTTPException(status_code=404, detail="Ninguna canción está en el catálogo")
+
+  return {
+    "centroid": {"valence": round(start[0], 2), "arousal": round(start[1], 2)},
+    "target": quadrant,
+    "path": index.path(start, QUADRANT_CENTERS[quadrant], steps, k, exclude=positions),
+  }
+
+
+@main_router.get("/image/{job_id}")
+def sonemica_image_job(job_id: str):
   """
+  Estado y resultado (url_publica y descripcion) de un trabajo de generación de imagen.
+  """
+
+  job = get_image_job_queue().get(job_id)
+  if job is None:
+    raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+
+  return job
+
+
+@main_router.get("/images/{digest}")
+def sonemica_image_blob(digest: str, request: Request):
+  """
+  Sirve una imagen generada desde el almacén local por su digest SHA-256.
+  Como el contenido nunca cambia para un digest dado, se cachea indefinidamente.
+  """
+
+  etag = f'"{digest}"'
+  headers = {"ETag": etag, "Cache-Control": "public, max-age=31536000, immutable"}
+
+  if request.headers.get("if-none-match") == etag and get_blob_store().exists(digest):
+    return Response(status_code=304, headers=headers)
+
+  data = get_blob_store().get(digest)
+  if data is None:
+    raise HTTPException(status_code=404, detail="Imagen no encontrada")
+
+  return Response(content=data, media_type=media_type_for(data), headers=headers)
+
+
+@main_router.post("/charts/{kind}")
+def sonemica_chart(
+  kind: str,
+  request: Request,
+  data: Dict[str, Any] = Body(...),
+  format: str = "png",
+):
+  """
+  Renderiza un gráfico a partir del resultado de un análisis.
+
+  - kind "valence_arousal": recibe "valence_arousal_analysis" de /analyzer.
+  - kind "diversity": recibe "graphic_diversity_analysis" de /analyzer.
+
+  El ETag es el hash de los datos, así que un mismo análisis siempre produce el mismo gráfico
+  y las vistas repetidas se sirven desde la caché sin volver a dibujar.
+  """
+
+  if kind not in CHART_KINDS:
+    raise HTTPException(status_code=404, detail="Gráfico no encontrado")
+  if format not in CHART_MEDIA_TYPES:
+    raise HTTPException(status_code=400, detail="Formato no soportado")
+
+  etag = f'"{chart_key(kind, data, format, Config.CHART_DPI)}"'
+  headers = {"ETag": etag, "Cache-Control": "private, max-age=3600"}
+  if request.headers.get("if-none-match") == etag:
+    return Response(status_code=304, headers=headers)
+
+  try:
+    _, content = get_chart_renderer().render(kind, data, format)
+  except FuturesTimeoutError:
+    raise HTTPException(status_code=504, detail="El gráfico tardó demasiado en generarse")
+  except (KeyError, TypeError, ValueError) as e:
+    raise HTTPException(status_code=422, detail=f"Datos de análisis inválidos: {e}")
+
+  if content is None:
+    raise HTTPException(status_code=422, detail="No se pudo generar el gráfico")
 
-  return main_flow(access_token)
\ No newline at end of file
+  return Response(content=content, media_type=CHART_MEDIA_TYPES[format], headers=headers)
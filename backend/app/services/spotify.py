@@ -1,5 +1,6 @@
 from urllib import response
 from ..config import Config
+from ..utils import get_breaker
 from typing import List, Dict, Any
 import base64
 import requests
@@ -10,7 +11,20 @@ class SpotifyService:
         self.client_id = Config.SPOTIFY_CLIENT_ID
         self.client_secret = Config.SPOTIFY_CLIENT_SECRET
         self.redirect_uri = Config.SPOTIFY_REDIRECT_URI
-        self.spotify_api_base = "https://api.spotify.com/v1"
+        self.spotify_api_base = Config.SPOTIFY_API_BASE
+
+    def _request(self, breaker_name: str, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        Realiza una solicitud a Spotify a través del circuit breaker del servicio, con timeout.
+        """
+        kwargs.setdefault("timeout", Config.STAGE_BUDGET_SPOTIFY)
+
+        def _send():
+            response = requests.request(method, url, **kwargs)
+            response.raise_for_status()
+            return response
+
+        return get_breaker(breaker_name).call(_send)
 
     def get_spotify_auth_url(self):
         """
@@ -20,7 +34,7 @@ class SpotifyService:
         """
         scope = "user-read-recently-played user-top-read"
         auth_url = (
-            "https://accounts.spotify.com/authorize"
+            f"{Config.SPOTIFY_ACCOUNTS_BASE}/authorize"
             f"?client_id={self.client_id}"
             f"&response_type=code"
             f"&redirect_uri={self.redirect_uri}"
@@ -35,7 +49,7 @@ class SpotifyService:
 
         Realiza una solicitud POST al endpoint de Spotify para obtener el token de acceso utilizando el código recibido tras la autorización del usuario. Este token permitirá realizar solicitudes autenticadas a la API de Spotify en nombre del usuario.
         """
-        token_url = "https://accounts.spotify.com/api/token"
+        token_url = f"{Config.SPOTIFY_ACCOUNTS_BASE}/api/token"
         auth_str = f"{self.client_id}:{self.client_secret}"
         b64_auth_str = base64.b64encode(auth_str.encode()).decode()
 
@@ -50,15 +64,16 @@ class SpotifyService:
             "Content-Type": "application/x-www-form-urlencoded",
         }
 
-        response = requests.post(token_url, data=data, headers=headers)
-        response.raise_for_status()
+        response = self._request(
+            "spotify_accounts", "POST", token_url, data=data, headers=headers
+        )
         return response.json()
 
     def refresh_access_token(self, refresh_token: str) -> Dict[str, Any]:
         """
         Método que se encarga de obtener un nuevo access token sin requerir que el usuario vuelva a autenticarse manteniendo la sesión activa.
         """
-        token_url = "https://accounts.spotify.com/api/token"
+        token_url = f"{Config.SPOTIFY_ACCOUNTS_BASE}/api/token"
         auth_str = f"{self.client_id}:{self.client_secret}"
         b64_auth_str = base64.b64encode(auth_str.encode()).decode()
 
@@ -68,25 +83,44 @@ class SpotifyService:
             "Content-Type": "application/x-www-form-urlencoded",
         }
 
-        response = requests.post(token_url, data=data, headers=headers)
-        response.raise_for_status()
+        response = self._request(
+            "spotify_accounts", "POST", token_url, data=data, headers=headers
+        )
         return response.json()
 
     def _auth_headers(self, access_token: str) -> Dict[str, str]:
         return {"Authorization": f"Bearer {access_token}"}
 
+    def get_current_user_id(self, access_token: str, timeout: float = None) -> str:
+        """
+        Método que obtiene el ID de Spotify del usuario dueño del token.
+        """
+        url = f"{self.spotify_api_base}/me"
+        response = self._request(
+            "spotify_api",
+            "GET",
+            url,
+            headers=self._auth_headers(access_token),
+            timeout=timeout or Config.STAGE_BUDGET_SPOTIFY,
+        )
+        return response.json()["id"]
+
     def get_recently_played(
-        self, access_token: str, limit: int = 20
+        self, access_token: str, limit: int = 20, timeout: float = None
     ) -> List[Dict[str, Any]]:
         """
         Método que obtiene las canciones reproducidas recientemente por el usuario.
         """
         url = f"{self.spotify_api_base}/me/player/recently-played"
         params = {"limit": limit}
-        response = requests.get(
-            url, headers=self._auth_headers(access_token), params=params
+        response = self._request(
+            "spotify_api",
+            "GET",
+            url,
+            headers=self._auth_headers(access_token),
+            params=params,
+            timeout=timeout or Config.STAGE_BUDGET_SPOTIFY,
         )
-        response.raise_for_status()
         data = response.json().get("items", [])
         tracks = []
         for item in data:
@@ -122,16 +156,17 @@ class SpotifyService:
             ids_param = ",".join(chunk)
             url = f"{self.spotify_api_base}/audio-features"
             try:
-                response = requests.get(
+                response = self._request(
+                    "spotify_api",
+                    "GET",
                     url,
                     headers=self._auth_headers(access_token),
                     params={"ids": ids_param},
                 )
-                response.raise_for_status()
 
             except requests.exceptions.HTTPError as e:
                 print("Error al obtener audio features:", e)
-                print("Respuesta:", response.text)
+                print("Respuesta:", e.response.text)
                 raise
             items = response.json().get("audio_features", [])
             for feat in items:
@@ -1 +1,6 @@
-from .middleware.cors import setup_cors
\ No newline at end of file
+from .middleware.cors import setup_cors
+from .deadline import Deadline, DeadlineExceeded
+from .circuit_breaker import CircuitBreaker, CircuitOpenError, get_breaker
+from .serialization import dumps, json_response
+from .admission import AdmissionController, Overloaded, analyzer_admission
+from .metrics import registry as metrics_registry, stage, request_timings, server_timing_header
@@ -0,0 +1,119 @@
+import math
+import threading
+from contextlib import contextmanager
+
+from app.config import Config
+from app.utils.metrics import ADMISSION_IN_FLIGHT, ADMISSION_QUEUE_DEPTH, ADMISSION_SHED
+
+
+class Overloaded(Exception):
+    """
+    El pedido se rechaza porque no hay lugar en ejecución ni en la cola de espera.
+    """
+
+    def __init__(self, name: str, reason: str, retry_after: float):
+        self.name = name
+        self.reason = reason
+        self.retry_after = retry_after
+        super().__init__(f"Servicio '{name}' sobrecargado ({reason}), reintentar en {retry_after:.0f}s")
+
+
+class AdmissionController:
+    """
+    Limita la cantidad de pedidos que se ejecutan a la vez.
+
+    - Hasta `max_concurrent` pedidos se ejecutan en simultáneo.
+    - Hasta `max_queue` pedidos más esperan su turno, como mucho `queue_timeout` segundos.
+    - El resto se rechaza enseguida con Overloaded, en lugar de acumularse hasta que el cliente corte.
+    """
+
+    def __init__(self, name: str, max_concurrent: int, max_queue: int, queue_timeout: float):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._cond = threading.Condition()
+        self._active = 0
+        self._waiting = 0
+        self._publish()
+
+    @property
+    def retry_after(self) -> int:
+        return max(1, math.ceil(self.queue_timeout))
+
+    def under_pressure(self) -> bool:
+        """
+        True si hay pedidos esperando turno: conviene abaratar los que se están atendiendo.
+        """
+        with self._cond:
+            return self._waiting > 0
+
+    def share(self, workers: int, index: int):
+        """
+        Se queda con la parte del worker `index` (de 0 a workers - 1) de los límites, repartidos entre
+        `workers` procesos que atienden el mismo endpoint (ver serve.py): el resto de la división va a
+        los primeros workers, así que la suma de todos sigue siendo el total configurado.
+
+        Cada worker conserva al menos un lugar de ejecución, y uno en la cola si la cola total no es
+        cero: con más workers que ANALYZER_MAX_CONCURRENT el total se excede (serve.py lo advierte).
+        """
+
+        def part(total: int) -> int:
+            return total // workers + (1 if index < total % workers else 0)
+
+        with self._cond:
+            self.max_concurrent = max(1, part(self.max_concurrent))
+            self.max_queue = max(1, part(self.max_queue)) if self.max_queue > 0 else 0
+            self._publish()
+            self._cond.notify_all()
+
+    def _publish(self):
+        ADMISSION_IN_FLIGHT.set(self._active, endpoint=self.name)
+        ADMISSION_QUEUE_DEPTH.set(self._waiting, endpoint=self.name)
+
+    def _shed(self, reason: str):
+        ADMISSION_SHED.inc(endpoint=self.name, reason=reason)
+        raise Overloaded(self.name, reason, self.retry_after)
+
+    @contextmanager
+    def slot(self):
+        """
+        Ocupa un lugar de ejecución durante el bloque, esperando en la cola si hace falta.
+        """
+        with self._cond:
+            if self._active >= self.max_concurrent:
+                if self._waiting >= self.max_queue:
+                    self._shed("queue_full")
+
+                self._waiting += 1
+                self._publish()
+                try:
+                    admitted = self._cond.wait_for(
+                        lambda: self._active < self.max_concurrent, timeout=self.queue_timeout
+                    )
+                finally:
+                    self._waiting -= 1
+                    self._publish()
+                if not admitted:
+                    self._shed("queue_timeout")
+
+            self._active += 1
+            self._publish()
+
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._active -= 1
+                self._publish()
+                self._cond.notify()
+
+
+# Control de admisión de /api/sonemica/analyzer y /api/sonemica/cohort.
+# ANALYZER_MAX_CONCURRENT y ANALYZER_MAX_QUEUE son totales del servidor: serve.py los reparte entre los workers
+analyzer_admission = AdmissionController(
+    "analyzer",
+    max_concurrent=Config.ANALYZER_MAX_CONCURRENT,
+    max_queue=Config.ANALYZER_MAX_QUEUE,
+    queue_timeout=Config.ANALYZER_QUEUE_TIMEOUT,
+)
@@ -0,0 +1,129 @@
+import threading
+import time
+from typing import Any, Callable, Dict
+
+import requests
+
+from app.config import Config
+
+CIRCUIT_CLOSED = "closed"
+CIRCUIT_OPEN = "open"
+CIRCUIT_HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """
+    Se lanza cuando se intenta llamar a un servicio externo cuyo circuito está abierto.
+    """
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"El servicio '{name}' no está disponible temporalmente")
+        self.name = name
+        self.retry_after = retry_after
+
+
+def is_upstream_failure(error: Exception) -> bool:
+    """
+    Indica si un error cuenta como falla del servicio externo.
+    Los errores 4xx (salvo 429) son culpa del pedido, no del servicio, y no abren el circuito.
+    """
+    if isinstance(error, requests.exceptions.HTTPError) and error.response is not None:
+        status = error.response.status_code
+        return status >= 500 or status == 429
+    return True
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker por servicio externo.
+
+    - Cerrado: las llamadas pasan. Tras `failure_threshold` fallas seguidas se abre.
+    - Abierto: las llamadas fallan inmediatamente con CircuitOpenError durante `reset_timeout` segundos.
+    - Semiabierto: se deja pasar una llamada de prueba; si funciona se cierra, si falla se vuelve a abrir.
+    """
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = CIRCUIT_CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> str:
+        if self._state == CIRCUIT_OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = CIRCUIT_HALF_OPEN
+            self._probe_in_flight = False
+        return self._state
+
+    def allow_request(self) -> bool:
+        with self._lock:
+            state = self._current_state()
+            if state == CIRCUIT_CLOSED:
+                return True
+            if state == CIRCUIT_HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def retry_after(self) -> float:
+        with self._lock:
+            return max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+
+    def record_success(self):
+        with self._lock:
+            self._state = CIRCUIT_CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == CIRCUIT_HALF_OPEN or self._failures >= self.failure_threshold:
+                self._state = CIRCUIT_OPEN
+                self._opened_at = time.monotonic()
+                self._probe_in_flight = False
+
+    def call(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Ejecuta `fn` si el circuito lo permite y registra el resultado.
+        """
+        if not self.allow_request():
+            raise CircuitOpenError(self.name, self.retry_after())
+
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            if is_upstream_failure(e):
+                self.record_failure()
+            else:
+                self.record_success()
+            raise
+
+        self.record_success()
+        return result
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """
+    Devuelve el circuit breaker compartido del servicio externo `name`, creándolo si hace falta.
+    """
+    with _breakers_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(
+                name,
+                failure_threshold=Config.CIRCUIT_FAILURE_THRESHOLD,
+                reset_timeout=Config.CIRCUIT_RESET_SECONDS,
+            )
+        return _breakers[name]
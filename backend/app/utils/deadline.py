@@ -0,0 +1,39 @@
+import time
+
+
+class DeadlineExceeded(Exception):
+    """
+    Se lanza cuando una etapa no tiene más tiempo disponible dentro del plazo del pedido.
+    """
+
+    def __init__(self, stage: str):
+        super().__init__(f"Se agotó el plazo antes de la etapa '{stage}'")
+        self.stage = stage
+
+
+class Deadline:
+    """
+    Plazo total de un pedido, repartido en presupuestos por etapa.
+
+    Cada etapa pide su presupuesto con `budget(stage, seconds)` y obtiene el mínimo entre lo que
+    tiene asignado y lo que queda del plazo total, de modo que ninguna etapa puede pasarse del plazo.
+    """
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def budget(self, stage: str, seconds: float) -> float:
+        """
+        Tiempo disponible para la etapa. Lanza DeadlineExceeded si ya no queda tiempo.
+        """
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise DeadlineExceeded(stage)
+        return min(seconds, remaining)
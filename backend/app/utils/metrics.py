@@ -0,0 +1,393 @@
+import bisect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+# Límites (en segundos) de los baldes de los histogramas de duración
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+# Límites de los baldes para tamaños (canciones, tamaño de lote)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512)
+
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...], extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = labels + extra
+    if not pairs:
+        return ""
+    escaped = (
+        (name, str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"'))
+        for name, value in pairs
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """
+    Contador monótono con etiquetas.
+    """
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[Tuple[str, str], ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self._values)
+
+    def reset(self):
+        self._lock = threading.Lock()
+        self._values = {}
+
+    @staticmethod
+    def merge(total: dict, values: dict):
+        for key, value in values.items():
+            total[key] = total.get(key, 0) + value
+
+    def samples(self, values: dict = None) -> List[str]:
+        values = self.snapshot() if values is None else values
+        return [
+            f"{self.name}{_format_labels(labels)} {_format_value(value)}"
+            for labels, value in sorted(values.items())
+        ]
+
+
+class Gauge:
+    """
+    Valor instantáneo con etiquetas (por ejemplo, largo de una cola).
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[Tuple[str, str], ...], float] = {}
+
+    def set(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = value
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self._values)
+
+    def reset(self):
+        self._lock = threading.Lock()
+        self._values = {}
+
+    @staticmethod
+    def merge(total: dict, values: dict):
+        # Entre procesos se suman: pedidos en curso, memoria cargada, etc. de todos los workers vivos
+        for key, value in values.items():
+            total[key] = total.get(key, 0) + value
+
+    def samples(self, values: dict = None) -> List[str]:
+        values = self.snapshot() if values is None else values
+        return [
+            f"{self.name}{_format_labels(labels)} {_format_value(value)}"
+            for labels, value in sorted(values.items())
+        ]
+
+
+class Histogram:
+    """
+    Histograma acumulativo con etiquetas, con los mismos baldes que usa Prometheus ("le").
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, buckets=DURATION_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        # Por combinación de etiquetas: [conteos por balde (+Inf al final), suma]
+        self._values: Dict[Tuple[Tuple[str, str], ...], list] = {}
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {key: [list(counts), total] for key, (counts, total) in self._values.items()}
+
+    def reset(self):
+        self._lock = threading.Lock()
+        self._values = {}
+
+    @staticmethod
+    def merge(total: dict, values: dict):
+        for key, (counts, value_sum) in values.items():
+            entry = total.get(key)
+            if entry is None:
+                total[key] = [list(counts), value_sum]
+            else:
+                entry[0] = [a + b for a, b in zip(entry[0], counts)]
+                entry[1] += value_sum
+
+    def samples(self, values: dict = None) -> List[str]:
+        values = self.snapshot() if values is None else values
+
+        lines = []
+        for labels, (counts, total) in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(labels, (('le', _format_value(float(bound))),))} {cumulative}"
+                )
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {cumulative}")
+        return lines
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class MetricsRegistry:
+    """
+    Registro de métricas del proceso.
+
+    Con varios workers (serve.py) cada proceso tiene sus propios valores. enable_multiprocess hace
+    que cada uno guarde periódicamente una foto de sus valores en `<directorio>/<pid>-<id>.json` y
+    que render() combine las de todos: contadores e histogramas se suman (también los de workers
+    ya terminados, para que sigan siendo monótonos) y los gauges se suman solo entre procesos vivos.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, object] = {}
+        self.multiprocess_dir: Optional[str] = None
+        self._snapshot_name: Optional[str] = None
+
+    def _register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, documentation: str) -> Counter:
+        return self._register(Counter(name, documentation))
+
+    def gauge(self, name: str, documentation: str) -> Gauge:
+        return self._register(Gauge(name, documentation))
+
+    def histogram(self, name: str, documentation: str, buckets=DURATION_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, buckets))
+
+    def enable_multiprocess(self, directory: str):
+        """
+        Activa la combinación de métricas entre procesos. Se llama en el proceso principal antes de
+        crear los workers: borra las fotos de corridas anteriores y, en cada worker creado con fork,
+        descarta los valores heredados (ya quedan contados en la foto del proceso principal).
+        """
+        os.makedirs(directory, exist_ok=True)
+        for filename in os.listdir(directory):
+            if filename.endswith(".json"):
+                os.remove(os.path.join(directory, filename))
+
+        self.multiprocess_dir = directory
+        self._snapshot_name = f"{os.getpid()}-{os.urandom(4).hex()}.json"
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+        self._snapshot_name = f"{os.getpid()}-{os.urandom(4).hex()}.json"
+        for metric in self._metrics.values():
+            metric.reset()
+
+    def write_snapshot(self):
+        """
+        Guarda los valores de este proceso para que los combine render() en cualquier worker.
+        """
+        if self.multiprocess_dir is None:
+            return
+        with self._lock:
+            metrics = list(self._metrics.values())
+        snapshot = {
+            metric.name: [[list(labels), value] for labels, value in metric.snapshot().items()]
+            for metric in metrics
+        }
+
+        path = os.path.join(self.multiprocess_dir, self._snapshot_name)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f)
+        os.replace(tmp_path, path)
+
+    def start_flusher(self, interval: float):
+        """
+        Hilo que guarda la foto de este proceso cada `interval` segundos.
+        """
+
+        def flush():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.write_snapshot()
+                except OSError as e:
+                    print(f"⚠️ No se pudieron guardar las métricas del proceso: {e}")
+
+        threading.Thread(target=flush, name="sonemica-metrics", daemon=True).start()
+
+    def _combined(self, metrics) -> Dict[str, dict]:
+        self.write_snapshot()
+        combined = {metric.name: {} for metric in metrics}
+        by_name = {metric.name: metric for metric in metrics}
+
+        for filename in os.listdir(self.multiprocess_dir):
+            if not filename.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.multiprocess_dir, filename), "r", encoding="utf-8") as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue
+            alive = _pid_alive(int(filename.split("-", 1)[0]))
+
+            for name, values in snapshot.items():
+                metric = by_name.get(name)
+                if metric is None or (metric.kind == "gauge" and not alive):
+                    continue
+                metric.merge(
+                    combined[name], {tuple(tuple(pair) for pair in labels): value for labels, value in values}
+                )
+        return combined
+
+    def render(self) -> str:
+        """
+        Todas las métricas en el formato de texto de Prometheus (combinadas entre procesos si corresponde).
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        combined = self._combined(metrics) if self.multiprocess_dir is not None else {}
+
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples(combined.get(metric.name)))
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+STAGE_DURATION = registry.histogram(
+    "sonemica_stage_duration_seconds", "Duración de cada etapa del análisis."
+)
+STAGE_ERRORS = registry.counter(
+    "sonemica_stage_errors_total", "Errores por etapa del análisis."
+)
+MATCHED_TRACKS = registry.histogram(
+    "sonemica_matched_tracks", "Canciones encontradas en el catálogo local por pedido.", SIZE_BUCKETS
+)
+INFERENCE_BATCH_SIZE = registry.histogram(
+    "sonemica_inference_batch_size", "Cantidad de letras por pasada del modelo.", SIZE_BUCKETS
+)
+LYRICS_TOKENS = registry.counter(
+    "sonemica_lyrics_tokens_total",
+    "Tokens de las letras analizadas, compactadas y como serían sin compactar (líneas por sus repeticiones).",
+)
+INFERENCE_WINDOWS = registry.histogram(
+    "sonemica_inference_windows", "Ventanas de 512 tokens analizadas por letra.", SIZE_BUCKETS
+)
+INFERENCE_TOKENS = registry.counter(
+    "sonemica_inference_tokens_total", "Tokens procesados por el modelo de emociones (sin padding)."
+)
+ROUTED_LYRICS = registry.counter(
+    "sonemica_routed_lyrics_total", "Letras asignadas a cada modelo de emociones según su idioma."
+)
+MODEL_LOADED_BYTES = registry.gauge(
+    "sonemica_model_loaded_bytes", "Memoria de los modelos adicionales cargados."
+)
+MODEL_EVICTIONS = registry.counter(
+    "sonemica_model_evictions_total", "Modelos adicionales descartados por el presupuesto de memoria."
+)
+CASCADE_LYRICS = registry.counter(
+    "sonemica_cascade_lyrics_total", "Letras resueltas por cada nivel de la cascada VADER → transformer."
+)
+ADMISSION_IN_FLIGHT = registry.gauge(
+    "sonemica_admission_in_flight", "Pedidos en ejecución por endpoint con control de admisión."
+)
+ADMISSION_QUEUE_DEPTH = registry.gauge(
+    "sonemica_admission_queue_depth", "Pedidos esperando turno por endpoint con control de admisión."
+)
+ADMISSION_SHED = registry.counter(
+    "sonemica_admission_shed_total", "Pedidos rechazados con 503 por sobrecarga."
+)
+DEGRADED_STAGES = registry.counter(
+    "sonemica_degraded_stages_total", "Análisis con etapas omitidas o truncadas, por etapa."
+)
+
+# Duraciones de las etapas del pedido en curso, para el header Server-Timing
+_request_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_timings", default=None)
+
+
+@contextmanager
+def stage(name: str):
+    """
+    Mide la duración de una etapa: la registra en el histograma, cuenta el error si la etapa lanza
+    una excepción y la suma a los tiempos del pedido en curso (si lo hay).
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.inc(stage=name)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_DURATION.observe(elapsed, stage=name)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings[name] = timings.get(name, 0.0) + elapsed
+
+
+@contextmanager
+def request_timings():
+    """
+    Junta los tiempos de las etapas que se ejecutan en el contexto actual durante el bloque.
+    Las etapas que corren en otros hilos (por ejemplo, los trabajos de imagen) no se incluyen.
+    """
+    timings: Dict[str, float] = {}
+    token = _request_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _request_timings.reset(token)
+
+
+def server_timing_header(timings: Dict[str, float]) -> str:
+    return ", ".join(f"{name};dur={elapsed * 1000:.1f}" for name, elapsed in timings.items())
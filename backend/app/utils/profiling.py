@@ -0,0 +1,155 @@
+import cProfile
+import hmac
+import os
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+from app.config import Config
+
+# pyinstrument está en requirements.txt. Si falta, el perfilado se desactiva; con PROFILE_ALLOW_CPROFILE
+# se usa cProfile en modo degradado (instrumenta cada llamada) y el perfil se guarda en formato pstats (.prof)
+try:
+    from pyinstrument import Profiler
+    from pyinstrument.renderers import SpeedscopeRenderer
+except ImportError:
+    Profiler = None
+
+PROFILE_HEADER = "x-sonemica-profile"
+
+_prune_lock = threading.Lock()
+# Un solo pedido perfilado a la vez: los profilers de Python no admiten sesiones simultáneas
+_active = threading.Lock()
+
+
+_warned = False
+
+
+def profiler_backend() -> Optional[str]:
+    """
+    "pyinstrument", "cprofile" (modo degradado, solo con PROFILE_ALLOW_CPROFILE) o None si no hay profiler.
+    """
+    if Profiler is not None:
+        return "pyinstrument"
+    if Config.PROFILE_ALLOW_CPROFILE:
+        return "cprofile"
+    return None
+
+
+def profiling_enabled() -> bool:
+    global _warned
+    if not Config.PROFILE_TOKEN and Config.PROFILE_SAMPLE_RATE <= 0:
+        return False
+
+    backend = profiler_backend()
+    if backend != "pyinstrument" and not _warned:
+        _warned = True
+        if backend is None:
+            print("⚠️ pyinstrument no está instalado: el perfilado de pedidos queda desactivado")
+        else:
+            print("⚠️ pyinstrument no está instalado: se perfila con cProfile (modo degradado, más lento)")
+    return backend is not None
+
+
+def should_profile(request) -> bool:
+    """
+    Decide si el pedido se perfila: cuando trae el header X-Sonemica-Profile con el token
+    configurado (PROFILE_TOKEN), o al azar según PROFILE_SAMPLE_RATE.
+    """
+    if not profiling_enabled():
+        return False
+
+    token = request.headers.get(PROFILE_HEADER)
+    if token and Config.PROFILE_TOKEN and hmac.compare_digest(token, Config.PROFILE_TOKEN):
+        return True
+    return random.random() < Config.PROFILE_SAMPLE_RATE
+
+
+def _prune(profile_dir: str, max_files: int):
+    """
+    Borra los perfiles más viejos hasta dejar como máximo `max_files`.
+    """
+    with _prune_lock:
+        paths = [os.path.join(profile_dir, name) for name in os.listdir(profile_dir)]
+        paths = sorted((p for p in paths if os.path.isfile(p)), key=os.path.getmtime)
+        for path in paths[: max(len(paths) - max_files, 0)]:
+            os.remove(path)
+
+
+def _save(profile_id: str, extension: str, write) -> str:
+    os.makedirs(Config.PROFILE_DIR, exist_ok=True)
+    path = os.path.join(Config.PROFILE_DIR, f"{profile_id}{extension}")
+    write(path)
+    _prune(Config.PROFILE_DIR, Config.PROFILE_MAX_FILES)
+    return path
+
+
+@contextmanager
+def profile_request(name: str):
+    """
+    Ejecuta el bloque bajo un profiler y guarda el resultado en PROFILE_DIR.
+
+    Con pyinstrument (profiler por muestreo) se guarda un archivo speedscope
+    (<id>.speedscope.json, se abre en https://www.speedscope.app); en el modo degradado
+    (PROFILE_ALLOW_CPROFILE sin pyinstrument), un volcado de cProfile (<id>.prof). Sin profiler
+    disponible el bloque corre sin perfilar. Devuelve un diccionario donde, al salir del bloque,
+    queda "profile_id".
+    """
+    info = {"profile_id": None}
+    if profiler_backend() is None or not _active.acquire(blocking=False):
+        yield info
+        return
+
+    try:
+        with _run_profiler(name) as saved:
+            yield info
+        info["profile_id"] = saved[0]
+    finally:
+        _active.release()
+
+
+@contextmanager
+def _run_profiler(name: str):
+    profile_id = f"{time.strftime('%Y%m%dT%H%M%S')}-{re.sub(r'[^A-Za-z0-9_-]', '_', name)}-{os.urandom(3).hex()}"
+    saved = [None]
+
+    if Profiler is not None:
+        profiler = Profiler(interval=Config.PROFILE_INTERVAL, async_mode="disabled")
+        profiler.start()
+        try:
+            yield saved
+        finally:
+            profiler.stop()
+            output = profiler.output(renderer=SpeedscopeRenderer())
+
+            def write(path):
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write(output)
+
+            _save(profile_id, ".speedscope.json", write)
+            saved[0] = profile_id
+    else:
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield saved
+        finally:
+            profiler.disable()
+            _save(profile_id, ".prof", profiler.dump_stats)
+            saved[0] = profile_id
+
+
+def find_profile(profile_id: str) -> Optional[str]:
+    """
+    Ruta del perfil guardado con ese id, o None si no existe (o ya fue borrado por la retención).
+    """
+    if not re.fullmatch(r"[A-Za-z0-9_-]+", profile_id):
+        return None
+    for extension in (".speedscope.json", ".prof"):
+        path = os.path.join(Config.PROFILE_DIR, f"{profile_id}{extension}")
+        if os.path.isfile(path):
+            return path
+    return None
@@ -0,0 +1,73 @@
+import gzip
+import json
+from typing import Any, Dict
+
+import numpy as np
+from fastapi import Request, Response
+
+from app.config import Config
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# brotli es opcional: sin él se comprime con gzip
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def _default(value):
+    """
+    Convierte los tipos de numpy que quedan en los resultados (np.float64, arrays) a tipos de Python.
+    """
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"Tipo no serializable: {type(value).__name__}")
+
+
+def dumps(payload: Any) -> bytes:
+    """
+    Serializa a JSON con orjson (que entiende numpy sin conversión previa) o, si no está, con json.
+    """
+    if orjson is not None:
+        return orjson.dumps(
+            payload, default=_default, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        )
+    return json.dumps(payload, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _accepted_encodings(request: Request) -> set:
+    header = request.headers.get("accept-encoding", "")
+    encodings = set()
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        if params.replace(" ", "") not in ("q=0", "q=0.0"):
+            encodings.add(name.strip().lower())
+    return encodings
+
+
+def json_response(
+    request: Request, payload: Any, status_code: int = 200, headers: Dict[str, str] = None
+) -> Response:
+    """
+    Respuesta JSON serializada con `dumps` y comprimida (brotli si está instalado, si no gzip) cuando
+    supera Config.COMPRESSION_MIN_BYTES y el cliente lo acepta.
+    """
+    body = dumps(payload)
+    headers = {**(headers or {}), "Vary": "Accept-Encoding"}
+
+    if len(body) >= Config.COMPRESSION_MIN_BYTES:
+        encodings = _accepted_encodings(request)
+        if brotli is not None and "br" in encodings:
+            body = brotli.compress(body, quality=Config.BROTLI_QUALITY)
+            headers["Content-Encoding"] = "br"
+        elif "gzip" in encodings:
+            body = gzip.compress(body, compresslevel=Config.GZIP_LEVEL)
+            headers["Content-Encoding"] = "gzip"
+
+    return Response(content=body, status_code=status_code, media_type="application/json", headers=headers)
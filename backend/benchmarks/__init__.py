@@ -0,0 +1,3 @@
+"""
+Benchmarks de las etapas del análisis con datos sintéticos y un modelo de prueba (ver run.py).
+"""
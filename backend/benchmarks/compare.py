@@ -0,0 +1,70 @@
+"""
+Compara dos resultados de benchmarks.run y marca las etapas que empeoraron.
+
+Uso (desde backend/):
+    python -m benchmarks.compare base.json actual.json [--threshold 0.2] [--min-ms 1]
+
+Una etapa empeoró si su mediana creció más que `threshold` (0.2 = 20%) y además más de `min-ms`
+milisegundos, para no marcar ruido en las etapas que tardan microsegundos. Termina con código 1
+si alguna empeoró, así se puede usar en CI.
+"""
+import argparse
+import json
+import sys
+from typing import Any, Dict, List, Tuple
+
+
+def _by_key(report: Dict[str, Any]) -> Dict[Tuple[str, int], Dict[str, Any]]:
+    return {(r["benchmark"], r["size"]): r for r in report["results"]}
+
+
+def compare(base: Dict[str, Any], current: Dict[str, Any], threshold: float, min_ms: float) -> List[Dict[str, Any]]:
+    base_results = _by_key(base)
+    rows = []
+    for key, result in _by_key(current).items():
+        previous = base_results.get(key)
+        if previous is None:
+            continue
+        before, after = previous["median_ms"], result["median_ms"]
+        ratio = after / before if before > 0 else float("inf")
+        rows.append(
+            {
+                "benchmark": key[0],
+                "size": key[1],
+                "base_ms": before,
+                "current_ms": after,
+                "ratio": ratio,
+                "regression": ratio > 1 + threshold and after - before > min_ms,
+            }
+        )
+    return rows
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Compara dos resultados de benchmarks")
+    parser.add_argument("base")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=0.2)
+    parser.add_argument("--min-ms", type=float, default=1.0)
+    args = parser.parse_args(argv)
+
+    with open(args.base, encoding="utf-8") as f:
+        base = json.load(f)
+    with open(args.current, encoding="utf-8") as f:
+        current = json.load(f)
+
+    rows = compare(base, current, args.threshold, args.min_ms)
+    for row in rows:
+        mark = "❌" if row["regression"] else "  "
+        print(
+            f"{mark} {row['benchmark']:<42} {row['size']:>8} "
+            f"{row['base_ms']:>12.3f} → {row['current_ms']:>12.3f} ms  x{row['ratio']:.2f}"
+        )
+
+    regressions = [row for row in rows if row["regression"]]
+    print(f"\n{len(regressions)} de {len(rows)} etapas empeoraron más de {args.threshold:.0%}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
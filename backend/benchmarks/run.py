@@ -0,0 +1,188 @@
+"""
+Benchmarks de las etapas del análisis con datos sintéticos.
+
+Para cada tamaño genera un catálogo y un historial de ese tamaño (ver synthetic.py), mide cada
+etapa `--repeat` veces después de una corrida de calentamiento y guarda los tiempos en JSON.
+No usa la red ni el modelo real: la inferencia corre con el modelo de prueba de stub_model.py.
+
+Uso (desde backend/):
+    python -m benchmarks.run --sizes 50,5000,500000 --output cache/benchmarks/actual.json
+    python -m benchmarks.compare cache/benchmarks/base.json cache/benchmarks/actual.json
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+import polars as pl
+import torch
+
+from app.analyzers.emotion_image import calcular_emociones_combinadas
+from app.analyzers.emotional_diversity_analyzer import EmotionalDiversityAnalyzer
+from app.analyzers.valence_arousal_analyzer import ValenceArousalAnalyzer
+from app.core.data_analyzer import DataAnalyzer
+from app.core.data_fetcher import DataFetcher
+from benchmarks.stub_model import stub_analyzer
+from benchmarks.synthetic import EMOTION_LABELS, synthetic_catalog, synthetic_history, synthetic_sentiments
+
+# Versión del formato de resultados; cambiarla si cambian los campos
+SCHEMA_VERSION = 1
+DEFAULT_SIZES = (50, 5000, 500000)
+# La inferencia con el modelo de prueba se mide sobre como mucho esta cantidad de letras
+INFERENCE_MAX_SONGS = 2000
+# Lo mismo para las etapas que procesan el texto de cada letra (ftfy domina su costo)
+TEXT_MAX_SONGS = 5000
+
+
+def build_cases(size: int, seed: int) -> Dict[str, Callable[[], Any]]:
+    """
+    Prepara los datos de un tamaño y devuelve las etapas a medir, cada una como una función sin argumentos.
+    """
+    audio_features_df, lyrics_df = synthetic_catalog(size, seed)
+    history = synthetic_history(audio_features_df, size, seed)
+    fetcher = DataFetcher(audio_features_df, lyrics_df)
+
+    audio_features = fetcher.fetch_audio_features(history)
+    # Todas las canciones del catálogo sintético tienen letra, así que hay un análisis por canción encontrada
+    sentiments = synthetic_sentiments(audio_features, seed)
+    raw_lyrics = lyrics_df["Lyrics"].head(TEXT_MAX_SONGS).to_list()
+    text_history = history[:TEXT_MAX_SONGS]
+
+    va_analyzer = ValenceArousalAnalyzer()
+    va_result = va_analyzer.process_songs(audio_features, sentiments)
+    diversity_analyzer = EmotionalDiversityAnalyzer()
+    data_analyzer = DataAnalyzer()
+    distributions = [s["distribution"] for s in sentiments] or [dict.fromkeys(EMOTION_LABELS, 0.25)]
+
+    inference_songs = fetcher.fetch_lyrics(history[:INFERENCE_MAX_SONGS])
+    analyzer = stub_analyzer()
+
+    return {
+        "fetch_audio_features": lambda: fetcher.fetch_audio_features(history),
+        "fetch_lyrics": lambda: fetcher.fetch_lyrics(text_history),
+        "normalize_lyrics": lambda: [DataFetcher.normalize_lyrics(text) for text in raw_lyrics],
+        "prepare_lyrics": lambda: [DataFetcher.prepare_lyrics(text) for text in raw_lyrics],
+        "average_audio_features": lambda: data_analyzer.average_audio_features(audio_features),
+        "process_songs": lambda: va_analyzer.process_songs(audio_features, sentiments),
+        "process_songs_columnar": lambda: va_analyzer.process_songs_columnar(
+            va_analyzer.build_tracks_table(audio_features, sentiments)
+        ),
+        "calculate_diversity_from_valence_arousal": lambda: diversity_analyzer.calculate_diversity_from_valence_arousal(
+            va_result
+        ),
+        "calcular_emociones_combinadas": lambda: [
+            calcular_emociones_combinadas(features, distributions[i % len(distributions)])
+            for i, features in enumerate(audio_features)
+        ],
+        "stub_inference": lambda: analyzer.analyze_batch(inference_songs, 16),
+    }, {
+        "fetch_lyrics": len(text_history),
+        "normalize_lyrics": len(raw_lyrics),
+        "prepare_lyrics": len(raw_lyrics),
+        "stub_inference": len(inference_songs),
+    }
+
+
+def measure(fn: Callable[[], Any], repeat: int, warmup: bool = True) -> List[float]:
+    """
+    Tiempos en milisegundos de `repeat` corridas. El recolector de basura se ejecuta antes de cada
+    corrida y queda desactivado durante ella, para que sus pausas no caigan al azar en una etapa.
+    """
+    if warmup:
+        fn()
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            fn()
+            times.append((time.perf_counter() - start) * 1000)
+        finally:
+            gc.enable()
+    return times
+
+
+def environment() -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "polars": pl.__version__,
+        "torch": torch.__version__,
+        "git_commit": commit,
+    }
+
+
+def run(sizes: List[int], repeat: int, seed: int, only: List[str] = None) -> Dict[str, Any]:
+    results = []
+    for size in sizes:
+        print(f"⏱️ Tamaño {size}: generando datos...", file=sys.stderr)
+        cases, counts = build_cases(size, seed)
+        for name, fn in cases.items():
+            if only and name not in only:
+                continue
+            times = measure(fn, repeat)
+            result = {
+                "benchmark": name,
+                "size": size,
+                "n": counts.get(name, size),
+                "repeat": repeat,
+                "min_ms": round(min(times), 3),
+                "median_ms": round(statistics.median(times), 3),
+                "mean_ms": round(statistics.fmean(times), 3),
+                "max_ms": round(max(times), 3),
+            }
+            results.append(result)
+            print(f"  {name:<42} {result['median_ms']:>12.3f} ms (mediana de {repeat})", file=sys.stderr)
+
+    return {
+        "schema": SCHEMA_VERSION,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "environment": environment(),
+        "config": {"sizes": sizes, "repeat": repeat, "seed": seed},
+        "results": results,
+    }
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="Benchmarks de las etapas del análisis con datos sintéticos")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)), help="tamaños separados por comas")
+    parser.add_argument("--repeat", type=int, default=5, help="corridas medidas por etapa y tamaño")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--only", default="", help="etapas a medir separadas por comas (por defecto, todas)")
+    parser.add_argument("--output", default="cache/benchmarks/latest.json")
+    args = parser.parse_args(argv)
+
+    report = run(
+        [int(size) for size in args.sizes.split(",") if size.strip()],
+        args.repeat,
+        args.seed,
+        [name.strip() for name in args.only.split(",") if name.strip()],
+    )
+
+    directory = os.path.dirname(args.output)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Resultados guardados en {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Modelo de emociones de prueba para correr los benchmarks sin descargar nada.
+
+Tiene la misma interfaz que el modelo de Hugging Face que usa TransformerAnalyzer (tokenizer rápido
+y modelo que devuelve `.logits`), así que el tokenizado, las ventanas y los lotes se miden con el
+mismo código que en producción; solo el costo del modelo en sí es mucho menor.
+"""
+from types import SimpleNamespace
+
+import torch
+from tokenizers import Tokenizer, models, pre_tokenizers, processors
+from transformers import PreTrainedTokenizerFast
+
+from app.analyzers.transformer import EMOTION_LABELS, TransformerAnalyzer
+from benchmarks.synthetic import VOCABULARY
+
+SPECIAL_TOKENS = ["<pad>", "<s>", "</s>", "<unk>"]
+
+
+def stub_tokenizer() -> PreTrainedTokenizerFast:
+    vocab = {token: i for i, token in enumerate(SPECIAL_TOKENS + sorted(set(VOCABULARY)))}
+    tokenizer = Tokenizer(models.WordLevel(vocab, unk_token="<unk>"))
+    tokenizer.pre_tokenizer = pre_tokenizers.Whitespace()
+    tokenizer.post_processor = processors.TemplateProcessing(
+        single="<s> $A </s>", special_tokens=[("<s>", vocab["<s>"]), ("</s>", vocab["</s>"])]
+    )
+    return PreTrainedTokenizerFast(
+        tokenizer_object=tokenizer,
+        pad_token="<pad>",
+        bos_token="<s>",
+        eos_token="</s>",
+        unk_token="<unk>",
+        model_max_length=512,
+    )
+
+
+class StubEmotionModel(torch.nn.Module):
+    """
+    Embedding promediado y una capa lineal con pesos fijos por semilla.
+    """
+
+    def __init__(self, vocab_size: int, hidden_size: int = 32, seed: int = 0):
+        super().__init__()
+        generator = torch.Generator().manual_seed(seed)
+        self.embeddings = torch.nn.Embedding(vocab_size, hidden_size)
+        self.classifier = torch.nn.Linear(hidden_size, len(EMOTION_LABELS))
+        with torch.no_grad():
+            self.embeddings.weight.copy_(torch.randn(vocab_size, hidden_size, generator=generator))
+            self.classifier.weight.copy_(torch.randn(len(EMOTION_LABELS), hidden_size, generator=generator))
+        self.config = SimpleNamespace(
+            num_labels=len(EMOTION_LABELS), id2label=dict(enumerate(EMOTION_LABELS))
+        )
+
+    def forward(self, input_ids, attention_mask, **_):
+        mask = attention_mask.unsqueeze(-1).float()
+        pooled = (self.embeddings(input_ids) * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1)
+        return SimpleNamespace(logits=self.classifier(pooled))
+
+
+def stub_analyzer() -> TransformerAnalyzer:
+    tokenizer = stub_tokenizer()
+    model = StubEmotionModel(len(tokenizer)).eval()
+    return TransformerAnalyzer("benchmarks/stub", tokenizer=tokenizer, model=model)
@@ -0,0 +1,132 @@
+"""
+Datos sintéticos para los benchmarks: catálogo (audio features y letras), historial de
+reproducciones en el formato de Spotify y análisis de letras, todos reproducibles por semilla.
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List
+
+import numpy as np
+import polars as pl
+
+EMOTION_LABELS = ["anger", "joy", "optimism", "sadness"]
+
+# Vocabulario de las letras: palabras funcionales (para que la detección de idioma las vea en
+# inglés) y palabras de contenido con carga emocional
+VOCABULARY = (
+    "the and you i to a it me my is in that of on your for be all we with what this "
+    "love heart night fire rain cry dance light dark tears run fight free alone home "
+    "dream broken gone forever baby feel lost burn sky road blood cold stay wild"
+).split()
+
+# Proporción del historial que no está en el catálogo
+UNKNOWN_RATIO = 0.1
+
+# Cantidad de versos distintos de los que se arman las letras
+LINE_POOL_SIZE = 4096
+
+
+def _line_pool(rng: np.random.Generator, words_per_line: int = 7) -> List[str]:
+    words = rng.choice(VOCABULARY, size=(LINE_POOL_SIZE, words_per_line))
+    return [" ".join(row) for row in words]
+
+
+def synthetic_lyrics(size: int, rng: np.random.Generator, verses: int = 3, verse_lines: int = 4) -> List[str]:
+    """
+    Letras al estilo Genius: estrofas con marcador de sección y un estribillo de dos versos que se
+    repite después de cada una. Los versos se toman de un conjunto fijo, así generar cientos de
+    miles de letras lleva segundos.
+    """
+    pool = _line_pool(rng)
+    picks = rng.integers(0, LINE_POOL_SIZE, size=(size, verses * verse_lines + 2))
+
+    lyrics = []
+    for row in picks:
+        chorus = [pool[i] for i in row[-2:]]
+        parts = []
+        for verse in range(verses):
+            parts.append(f"[Verse {verse + 1}]")
+            parts.extend(pool[i] for i in row[verse * verse_lines : (verse + 1) * verse_lines])
+            parts.append("[Chorus]")
+            parts.extend(chorus)
+        lyrics.append("\n".join(parts))
+    return lyrics
+
+
+def synthetic_catalog(size: int, seed: int = 0):
+    """
+    Catálogo de `size` canciones: (audio_features_df, lyrics_df) con las columnas de load_catalog.
+    """
+    rng = np.random.default_rng(seed)
+    titles = [f"Track {i:07d}" for i in range(size)]
+    artists = [f"Artist {i % max(1, size // 10):06d}" for i in range(size)]
+
+    def percent():
+        return rng.integers(0, 101, size)
+
+    audio_features_df = pl.DataFrame(
+        {
+            "Title": titles,
+            "Artist": artists,
+            "Energy": percent(),
+            "Danceability": percent(),
+            "Loudness": rng.integers(-30, 1, size),
+            "Liveness": percent(),
+            "Valence": percent(),
+            "Length": rng.integers(90, 420, size).astype(str),
+            "Acousticness": percent(),
+            "Speechiness": percent(),
+            "Popularity": percent(),
+        }
+    )
+    lyrics_df = pl.DataFrame(
+        {"Title": titles, "Artist": artists, "Lyrics": synthetic_lyrics(size, rng)}
+    )
+    return audio_features_df, lyrics_df
+
+
+def synthetic_history(audio_features_df: pl.DataFrame, size: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """
+    `size` reproducciones en el formato de /recently-played: canciones del catálogo elegidas al
+    azar (con repeticiones) y una fracción UNKNOWN_RATIO de canciones que no están en el catálogo.
+    """
+    rng = np.random.default_rng(seed + 1)
+    titles = audio_features_df["Title"].to_list()
+    artists = audio_features_df["Artist"].to_list()
+    picks = rng.integers(0, len(titles), size)
+    unknown = rng.random(size) < UNKNOWN_RATIO
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+    history = []
+    for n, (i, is_unknown) in enumerate(zip(picks, unknown)):
+        name = f"Unknown {n}" if is_unknown else titles[i]
+        history.append(
+            {
+                "name": name,
+                "artists": ["Unknown Artist" if is_unknown else artists[i]],
+                "id": f"{n:022d}",
+                "played_at": (start + timedelta(minutes=4 * n)).isoformat().replace("+00:00", "Z"),
+            }
+        )
+    return history
+
+
+def synthetic_sentiments(lyrics: List[Dict[str, Any]], seed: int = 0) -> List[Dict[str, Any]]:
+    """
+    Análisis de letras con la forma de los de TransformerAnalyzer, sin correr ningún modelo.
+    """
+    rng = np.random.default_rng(seed + 2)
+    distributions = rng.dirichlet(np.ones(len(EMOTION_LABELS)), size=len(lyrics))
+    results = []
+    for song, probs in zip(lyrics, distributions):
+        top = int(np.argmax(probs))
+        results.append(
+            {
+                "method": "transformer",
+                "title": song.get("Title"),
+                "artist": song.get("Artist"),
+                "emotion": EMOTION_LABELS[top],
+                "confidence": float(probs[top]),
+                "distribution": dict(zip(EMOTION_LABELS, map(float, probs))),
+            }
+        )
+    return results
@@ -0,0 +1,65 @@
+"""
+Análisis emocional del historial extendido de la exportación de datos de Spotify.
+
+Recibe los archivos Streaming_History_Audio_*.json (o el directorio de la exportación), los lee en
+forma incremental y guarda el resumen de Valencia-Arousal y diversidad, total y por mes, en JSON.
+El progreso se guarda en un checkpoint después de cada bloque: si se interrumpe, volver a correr
+el mismo comando retoma desde ahí.
+
+Variables de entorno (ver app/config.py): HISTORY_IMPORT_CHUNK_PLAYS, HISTORY_IMPORT_WORKERS,
+HISTORY_IMPORT_MIN_MS_PLAYED y LYRICS_INFERENCE_CACHE_PATH.
+
+Uso (desde backend/):
+    python import_history.py ~/Descargas/my_spotify_data/ --output cache/history_import/resultado.json
+    python import_history.py Streaming_History_Audio_2019.json --workers 4 --user-id <id de Spotify>
+"""
+import argparse
+import json
+import os
+import time
+from typing import List
+
+from app.core.extended_history import analyze_extended_history
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="Análisis del historial extendido de Spotify")
+    parser.add_argument("paths", nargs="+", help="archivos de historial o directorios de la exportación")
+    parser.add_argument("--output", default="cache/history_import/result.json")
+    parser.add_argument("--checkpoint", default=None, help="por defecto, <output>.checkpoint")
+    parser.add_argument("--restart", action="store_true", help="ignorar el checkpoint y empezar de nuevo")
+    parser.add_argument("--chunk-plays", type=int, default=None)
+    parser.add_argument("--workers", type=int, default=None, help="procesos de inferencia (1 = en el mismo proceso)")
+    parser.add_argument("--min-ms-played", type=int, default=None)
+    parser.add_argument("--user-id", default=None, help="registrar las reproducciones en la serie temporal del usuario")
+    args = parser.parse_args(argv)
+
+    checkpoint = args.checkpoint or f"{args.output}.checkpoint"
+    if args.restart and os.path.exists(checkpoint):
+        os.remove(checkpoint)
+
+    start = time.perf_counter()
+    result = analyze_extended_history(
+        args.paths,
+        checkpoint_path=checkpoint,
+        chunk_plays=args.chunk_plays,
+        workers=args.workers,
+        min_ms_played=args.min_ms_played,
+        user_id=args.user_id,
+    )
+
+    directory = os.path.dirname(args.output)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2, ensure_ascii=False)
+
+    stats = result["stats"]
+    print(
+        f"✅ {stats['plays']:,} reproducciones ({stats['matched_plays']:,} analizadas) en "
+        f"{time.perf_counter() - start:.1f}s. Resultado guardado en {args.output}"
+    )
+
+
+if __name__ == "__main__":
+    main()
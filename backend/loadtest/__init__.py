@@ -0,0 +1,3 @@
+"""
+Pruebas de carga con servicios externos simulados (ver fake_upstreams.py y driver.py).
+"""
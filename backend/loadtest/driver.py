@@ -0,0 +1,238 @@
+"""
+Generador de carga para /api/sonemica/analyzer.
+
+Lanza `--concurrency` clientes que piden el análisis en bucle durante `--duration` segundos (o
+hasta completar `--requests`), con tokens tomados de un conjunto de `--users` usuarios ficticios:
+menos usuarios implican más aciertos en la caché de resultados. Los pedidos de los primeros
+`--warmup` segundos no se cuentan, ni en el reporte ni para `--requests`; el throughput se mide
+desde el primer pedido contado hasta la última respuesta contada.
+
+Informa el throughput, los códigos de respuesta y los percentiles p50/p95/p99 de la latencia
+total y de cada etapa según el header Server-Timing. Si se indica `--upstreams`, agrega los
+contadores de los servidores de prueba (ver fake_upstreams.py).
+
+Uso (desde backend/):
+    python -m loadtest.driver --target http://127.0.0.1:8000 --upstreams http://127.0.0.1:9100 \\
+        --concurrency 8 --duration 60 --users 200 --output cache/loadtest/report.json
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import requests
+
+PERCENTILES = (50, 95, 99)
+
+
+def parse_server_timing(header: str) -> Dict[str, float]:
+    """
+    Duraciones en ms de un header Server-Timing ("etapa;dur=12.3, otra;dur=4.0").
+    """
+    timings = {}
+    for entry in header.split(","):
+        name, *params = [part.strip() for part in entry.split(";")]
+        for param in params:
+            key, _, value = param.partition("=")
+            if name and key == "dur":
+                try:
+                    timings[name] = float(value)
+                except ValueError:
+                    pass
+    return timings
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {}
+    points = np.percentile(np.asarray(values), PERCENTILES)
+    return {
+        "count": len(values),
+        **{f"p{p}": round(float(v), 2) for p, v in zip(PERCENTILES, points)},
+        "mean": round(float(np.mean(values)), 2),
+        "max": round(float(np.max(values)), 2),
+    }
+
+
+class LoadDriver:
+    def __init__(
+        self,
+        url: str,
+        concurrency: int,
+        duration: float,
+        max_requests: Optional[int],
+        users: int,
+        warmup: float,
+        seed: int,
+        params: Dict[str, str],
+        timeout: float,
+    ):
+        self.url = url
+        self.concurrency = concurrency
+        self.duration = duration
+        self.max_requests = max_requests
+        self.users = users
+        self.warmup = warmup
+        self.seed = seed
+        self.params = params
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._issued = 0
+        self.samples: List[Dict[str, Any]] = []
+
+    def _next_request(self) -> bool:
+        with self._lock:
+            if self.max_requests is not None and self._issued >= self.max_requests:
+                return False
+            self._issued += 1
+            return True
+
+    def _worker(self, worker: int, start: float):
+        rng = random.Random(self.seed * 1000 + worker)
+        session = requests.Session()
+        while True:
+            sent = time.perf_counter()
+            if sent - start >= self.warmup + self.duration:
+                break
+            # Los pedidos del calentamiento no consumen el cupo de --requests
+            measured = sent - start >= self.warmup
+            if measured and not self._next_request():
+                break
+
+            token = f"loadtest-user-{rng.randrange(self.users)}"
+            try:
+                response = session.get(
+                    self.url, params={"access_token": token, **self.params}, timeout=self.timeout
+                )
+                status = response.status_code
+                timings = parse_server_timing(response.headers.get("server-timing", ""))
+            except requests.RequestException as e:
+                status = type(e).__name__
+                timings = {}
+            finished = time.perf_counter()
+
+            if measured:
+                with self._lock:
+                    self.samples.append(
+                        {
+                            "status": status,
+                            "latency_ms": (finished - sent) * 1000,
+                            "timings": timings,
+                            "sent": sent,
+                            "finished": finished,
+                        }
+                    )
+
+    def run(self) -> Dict[str, Any]:
+        start = time.perf_counter()
+        threads = [
+            threading.Thread(target=self._worker, args=(worker, start), daemon=True)
+            for worker in range(self.concurrency)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if not self.samples:
+            return self.report(0.0)
+        # Desde el primer pedido contado hasta la última respuesta contada
+        elapsed = max(s["finished"] for s in self.samples) - min(s["sent"] for s in self.samples)
+        return self.report(elapsed)
+
+    def report(self, elapsed: float) -> Dict[str, Any]:
+        statuses = Counter(str(sample["status"]) for sample in self.samples)
+        ok = [sample for sample in self.samples if sample["status"] in (200, 304)]
+
+        stages: Dict[str, List[float]] = {}
+        for sample in ok:
+            for name, duration in sample["timings"].items():
+                stages.setdefault(name, []).append(duration)
+
+        return {
+            "requests": len(self.samples),
+            "duration_s": round(elapsed, 2),
+            "throughput_rps": round(len(self.samples) / elapsed, 2) if elapsed > 0 else 0.0,
+            "successful_rps": round(len(ok) / elapsed, 2) if elapsed > 0 else 0.0,
+            "status_codes": dict(statuses),
+            "latency_ms": percentiles([sample["latency_ms"] for sample in ok]),
+            "stages_ms": {name: percentiles(values) for name, values in sorted(stages.items())},
+        }
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="Prueba de carga de /api/sonemica/analyzer")
+    parser.add_argument("--target", default="http://127.0.0.1:8000")
+    parser.add_argument("--path", default="/api/sonemica/analyzer")
+    parser.add_argument("--upstreams", default="", help="URL de fake_upstreams para incluir sus contadores")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=60)
+    parser.add_argument("--requests", type=int, default=None, help="cortar después de esta cantidad de pedidos")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--warmup", type=float, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--param", action="append", default=[], help="parámetro extra clave=valor (ej. compact=true)")
+    parser.add_argument("--output", default="cache/loadtest/report.json")
+    args = parser.parse_args(argv)
+
+    def upstream_stats():
+        if not args.upstreams:
+            return None
+        return requests.get(f"{args.upstreams.rstrip('/')}/_stats", timeout=5).json()
+
+    before = upstream_stats()
+    driver = LoadDriver(
+        url=f"{args.target.rstrip('/')}{args.path}",
+        concurrency=args.concurrency,
+        duration=args.duration,
+        max_requests=args.requests,
+        users=args.users,
+        warmup=args.warmup,
+        seed=args.seed,
+        params=dict(param.split("=", 1) for param in args.param),
+        timeout=args.timeout,
+    )
+    result = driver.run()
+
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "result": result,
+    }
+    after = upstream_stats()
+    if after is not None:
+        report["upstreams"] = {
+            service: {key: value - before.get(service, {}).get(key, 0) for key, value in counters.items()}
+            for service, counters in after.items()
+        }
+
+    print(
+        f"{result['requests']} pedidos en {result['duration_s']}s: {result['throughput_rps']} req/s "
+        f"({result['successful_rps']} exitosos), códigos {result['status_codes']}",
+        file=sys.stderr,
+    )
+    print(f"{'etapa':<24}{'n':>7}{'p50':>10}{'p95':>10}{'p99':>10}  (ms)", file=sys.stderr)
+    for name, stats in [("total (cliente)", result["latency_ms"])] + list(result["stages_ms"].items()):
+        if stats:
+            print(
+                f"{name:<24}{stats['count']:>7}{stats['p50']:>10.1f}{stats['p95']:>10.1f}{stats['p99']:>10.1f}",
+                file=sys.stderr,
+            )
+
+    directory = os.path.dirname(args.output)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Reporte guardado en {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,299 @@
+"""
+Servidores locales que reemplazan a los servicios externos durante las pruebas de carga.
+
+Imitan solo los endpoints que usa el backend:
+- Spotify API: /spotify/v1/me, /spotify/v1/me/player/recently-played, /spotify/v1/audio-features
+- Spotify Accounts: /spotify-accounts/api/token
+- SDXL (router de Hugging Face): /hf/sdxl
+- imgbb: /imgbb/1/upload
+- Chat completions (InferenceClient): /hf-chat/v1/chat/completions
+
+Cada servicio tiene latencia, errores 500 y respuestas 429 (con Retry-After) configurables, con
+una semilla fija para que las corridas sean repetibles. El historial de cada token sale del
+catálogo local, así que las canciones se encuentran como con usuarios reales; tokens distintos
+tienen historiales distintos y el mismo token siempre devuelve el mismo.
+
+- GET /_stats: pedidos y fallas inyectadas por servicio.
+- GET/POST /_faults: lee o cambia la configuración de fallas durante la corrida.
+
+Uso (desde backend/):
+    python -m loadtest.fake_upstreams --port 9100 --latency spotify=80,sdxl=3000,chat=1500 --throttle spotify=0.02
+y el backend con las variables que imprime al iniciar.
+"""
+import argparse
+import asyncio
+import hashlib
+import io
+import random
+import threading
+import time
+from collections import Counter
+from typing import Dict, List
+from urllib.parse import parse_qs
+
+import polars as pl
+import uvicorn
+from fastapi import Body, FastAPI, Request, Response
+from fastapi.responses import JSONResponse
+from PIL import Image
+
+SERVICES = ("spotify", "spotify_accounts", "sdxl", "imgbb", "chat")
+# Latencia por defecto (ms) de cada servicio, del orden de la de los servicios reales
+DEFAULT_LATENCY_MS = {"spotify": 80, "spotify_accounts": 100, "sdxl": 3000, "imgbb": 300, "chat": 1500}
+
+
+class FaultInjector:
+    """
+    Latencia (media y variación uniforme), proporción de errores 500 y de 429 por servicio.
+    """
+
+    def __init__(self, seed: int = 0):
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.config = {
+            service: {
+                "latency_ms": DEFAULT_LATENCY_MS[service],
+                "jitter_ms": DEFAULT_LATENCY_MS[service] * 0.25,
+                "error_rate": 0.0,
+                "throttle_rate": 0.0,
+                "retry_after": 1,
+            }
+            for service in SERVICES
+        }
+        self.stats = {service: Counter() for service in SERVICES}
+
+    def update(self, changes: Dict[str, Dict[str, float]]):
+        with self._lock:
+            for service, values in changes.items():
+                if service in self.config:
+                    self.config[service].update({k: v for k, v in values.items() if k in self.config[service]})
+
+    async def apply(self, service: str):
+        """
+        Espera la latencia del servicio y devuelve la respuesta de error a inyectar, o None.
+        """
+        with self._lock:
+            config = dict(self.config[service])
+            jitter = self._rng.uniform(-config["jitter_ms"], config["jitter_ms"])
+            roll = self._rng.random()
+            self.stats[service]["requests"] += 1
+
+        await asyncio.sleep(max(0.0, config["latency_ms"] + jitter) / 1000)
+
+        if roll < config["throttle_rate"]:
+            with self._lock:
+                self.stats[service]["throttled"] += 1
+            return JSONResponse(
+                {"error": {"status": 429, "message": "API rate limit exceeded"}},
+                status_code=429,
+                headers={"Retry-After": str(int(config["retry_after"]))},
+            )
+        if roll < config["throttle_rate"] + config["error_rate"]:
+            with self._lock:
+                self.stats[service]["errors"] += 1
+            return JSONResponse({"error": {"status": 500, "message": "Injected failure"}}, status_code=500)
+        return None
+
+
+def _token(request: Request) -> str:
+    return request.headers.get("authorization", "").removeprefix("Bearer ").strip()
+
+
+def _seed_for(text: str) -> int:
+    return int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], "big")
+
+
+def _png(prompt: str, size: int = 256) -> bytes:
+    # El color depende del prompt: distribuciones distintas dan imágenes (y digests) distintos
+    color = tuple(hashlib.sha256(prompt.encode()).digest()[:3])
+    buffer = io.BytesIO()
+    Image.new("RGB", (size, size), color).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def create_fake_app(catalog: List[Dict[str, str]], faults: FaultInjector, unknown_ratio: float = 0.2) -> FastAPI:
+    app = FastAPI(title="Servicios externos de prueba")
+
+    def recently_played(token: str, limit: int) -> List[dict]:
+        rng = random.Random(_seed_for(token))
+        start = 1_735_689_600  # 2025-01-01T00:00:00Z
+        items = []
+        for n in range(limit):
+            if rng.random() < unknown_ratio:
+                title, artist = f"Unknown Song {rng.randrange(10**6)}", "Unknown Artist"
+            else:
+                track = catalog[rng.randrange(len(catalog))]
+                title, artist = track["Title"], track["Artist"]
+            track_id = hashlib.sha1(f"{title}|{artist}".encode()).hexdigest()[:22]
+            played_at = time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime(start + (limit - n) * 240))
+            items.append(
+                {
+                    "track": {
+                        "id": track_id,
+                        "name": title,
+                        "artists": [{"name": artist}],
+                        "album": {"name": f"{artist} - Album"},
+                        "duration_ms": 180_000 + rng.randrange(120_000),
+                    },
+                    "played_at": played_at,
+                }
+            )
+        return items
+
+    @app.get("/spotify/v1/me")
+    async def spotify_me(request: Request):
+        if (error := await faults.apply("spotify")) is not None:
+            return error
+        return {"id": f"user-{_seed_for(_token(request)) % 10**8}", "display_name": "Load Test"}
+
+    @app.get("/spotify/v1/me/player/recently-played")
+    async def spotify_recently_played(request: Request, limit: int = 20):
+        if (error := await faults.apply("spotify")) is not None:
+            return error
+        return {"items": recently_played(_token(request), min(limit, 50))}
+
+    @app.get("/spotify/v1/audio-features")
+    async def spotify_audio_features(ids: str = ""):
+        if (error := await faults.apply("spotify")) is not None:
+            return error
+        features = []
+        for track_id in ids.split(","):
+            rng = random.Random(_seed_for(track_id))
+            features.append(
+                {
+                    "id": track_id,
+                    "danceability": rng.random(),
+                    "energy": rng.random(),
+                    "key": rng.randrange(12),
+                    "loudness": -rng.uniform(0, 30),
+                    "mode": rng.randrange(2),
+                    "speechiness": rng.random() * 0.3,
+                    "acousticness": rng.random(),
+                    "instrumentalness": rng.random() * 0.5,
+                    "liveness": rng.random() * 0.5,
+                    "valence": rng.random(),
+                    "tempo": rng.uniform(60, 180),
+                    "duration_ms": 200_000,
+                }
+            )
+        return {"audio_features": features}
+
+    @app.post("/spotify-accounts/api/token")
+    async def spotify_token():
+        if (error := await faults.apply("spotify_accounts")) is not None:
+            return error
+        return {
+            "access_token": f"loadtest-{random.randrange(10**12)}",
+            "token_type": "Bearer",
+            "expires_in": 3600,
+            "refresh_token": "loadtest-refresh",
+            "scope": "user-read-recently-played user-top-read",
+        }
+
+    @app.post("/hf/sdxl")
+    async def sdxl(payload: dict = Body(...)):
+        if (error := await faults.apply("sdxl")) is not None:
+            return error
+        return Response(content=_png(payload.get("inputs", "")), media_type="image/png")
+
+    @app.post("/imgbb/1/upload")
+    async def imgbb(request: Request):
+        if (error := await faults.apply("imgbb")) is not None:
+            return error
+        # Formulario urlencoded (como lo manda requests con data=); sin depender de python-multipart
+        form = parse_qs((await request.body()).decode())
+        digest = hashlib.sha256("".join(form.get("image", [])).encode()).hexdigest()[:16]
+        return {"data": {"url": f"http://{request.url.netloc}/imgbb/images/{digest}.png"}, "success": True}
+
+    async def chat_completions(payload: dict):
+        if (error := await faults.apply("chat")) is not None:
+            return error
+        content = (
+            "Un paisaje amplio bajo una luz tenue, con colores que reflejan la emoción dominante "
+            "y ecos de las emociones secundarias en el fondo."
+        )
+        return {
+            "id": f"chatcmpl-{random.randrange(10**12)}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": payload.get("model", "fake"),
+            "choices": [
+                {"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}
+            ],
+            "usage": {"prompt_tokens": 400, "completion_tokens": 40, "total_tokens": 440},
+        }
+
+    # Según la versión de huggingface_hub, la ruta termina en /v1/chat/completions o en /chat/completions
+    app.post("/hf-chat/v1/chat/completions")(chat_completions)
+    app.post("/hf-chat/chat/completions")(chat_completions)
+
+    @app.get("/_stats")
+    def stats():
+        return {service: dict(counter) for service, counter in faults.stats.items()}
+
+    @app.get("/_faults")
+    def get_faults():
+        return faults.config
+
+    @app.post("/_faults")
+    def set_faults(changes: Dict[str, Dict[str, float]] = Body(...)):
+        faults.update(changes)
+        return faults.config
+
+    return app
+
+
+def _per_service(value: str) -> Dict[str, float]:
+    """
+    Lee "servicio=valor,servicio=valor".
+    """
+    result = {}
+    for item in value.split(","):
+        service, _, number = item.partition("=")
+        if service.strip():
+            if service.strip() not in SERVICES:
+                raise argparse.ArgumentTypeError(f"Servicio desconocido: {service}")
+            result[service.strip()] = float(number)
+    return result
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="Servicios externos de prueba para pruebas de carga")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--catalog", default="app/data/audio_features_general.csv")
+    parser.add_argument("--unknown-ratio", type=float, default=0.2, help="canciones del historial fuera del catálogo")
+    parser.add_argument("--latency", type=_per_service, default={}, help="ms por servicio, ej. spotify=80,sdxl=3000")
+    parser.add_argument("--jitter", type=_per_service, default={}, help="variación en ms por servicio")
+    parser.add_argument("--errors", type=_per_service, default={}, help="proporción de 500 por servicio")
+    parser.add_argument("--throttle", type=_per_service, default={}, help="proporción de 429 por servicio")
+    parser.add_argument("--retry-after", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    faults = FaultInjector(args.seed)
+    changes = {service: {"retry_after": args.retry_after} for service in SERVICES}
+    for option, field in (
+        (args.latency, "latency_ms"),
+        (args.jitter, "jitter_ms"),
+        (args.errors, "error_rate"),
+        (args.throttle, "throttle_rate"),
+    ):
+        for service, value in option.items():
+            changes[service][field] = value
+    faults.update(changes)
+
+    catalog = pl.read_csv(args.catalog, columns=["Title", "Artist"]).drop_nulls().to_dicts()
+    base = f"http://{args.host}:{args.port}"
+    print("Variables para el backend:")
+    print(f"  SPOTIFY_API_BASE={base}/spotify/v1")
+    print(f"  SPOTIFY_ACCOUNTS_BASE={base}/spotify-accounts")
+    print(f"  HF_SDXL_URL={base}/hf/sdxl")
+    print(f"  HF_CHAT_BASE_URL={base}/hf-chat/v1")
+    print(f"  IMGBB_UPLOAD_URL={base}/imgbb/1/upload")
+
+    uvicorn.run(create_fake_app(catalog, faults, args.unknown_ratio), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+"""
+Lanzador de producción.
+
+El proceso principal carga una sola vez el catálogo local y el modelo de emociones, congela el
+heap (gc.freeze) y recién entonces crea los workers con fork: todos comparten esas páginas de
+memoria copy-on-write en lugar de cargar cada uno su copia. Cada worker atiende el mismo socket
+con uvicorn y usa su parte del presupuesto de hilos de torch.
+
+Estado compartido entre workers:
+- Los trabajos de imagen (IMAGE_JOB_DB_PATH) y la caché de resultados (RESULT_CACHE_DB_PATH) viven en
+  SQLite: un job_id se consulta desde cualquier worker y el límite de la caché es uno solo.
+- La caché de imágenes calcula su tamaño desde el disco con un lock de archivo, así que el
+  presupuesto IMAGE_CACHE_MAX_MB es del servidor y no de cada worker.
+- ANALYZER_MAX_CONCURRENT y ANALYZER_MAX_QUEUE se reparten entre los workers según su número de
+  lugar (al menos un lugar de ejecución por worker: con más workers que ANALYZER_MAX_CONCURRENT
+  el total se excede y se advierte al iniciar).
+- /metrics combina las métricas de todos los workers (METRICS_DIR).
+
+Variables de entorno (ver app/config.py): SERVER_HOST, SERVER_PORT, SERVER_WORKERS, SERVER_THREADS,
+METRICS_DIR y METRICS_FLUSH_SECONDS.
+
+Señales del proceso principal:
+- SIGTERM / SIGINT: apagado ordenado (cada worker termina los pedidos en curso).
+- SIGHUP: reinicio escalonado de los workers, de a uno, sin dejar de atender. Los workers nuevos
+  vuelven a partir de la memoria precargada, así que los cambios de código requieren reiniciar el proceso principal.
+
+Uso: python serve.py
+"""
+import os
+import socket
+
+from app.config import Config
+
+WORKERS = Config.SERVER_WORKERS or os.cpu_count() or 1
+THREADS_PER_WORKER = max(1, (Config.SERVER_THREADS or os.cpu_count() or 1) // WORKERS)
+
+# Las librerías numéricas leen estas variables al importarse, así que van antes de importar la app
+for _variable in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS", "POLARS_MAX_THREADS"):
+    os.environ.setdefault(_variable, str(THREADS_PER_WORKER))
+
+import gc
+import signal
+import time
+
+import torch
+import uvicorn
+
+from app.app import create_app
+from app.analyzers import get_emotion_aggregator, get_transformer_analyzer
+from app.analyzers.transformer import get_lyrics_tokenizer
+from app.core.data_fetcher import load_catalog
+from app.core.catalog_index import ensure_catalog_indexes
+from app.utils import analyzer_admission, metrics_registry
+
+
+def preload():
+    """
+    Carga en el proceso principal todo lo que los workers comparten.
+    Si algo no se puede cargar, el worker lo cargará por su cuenta en el primer pedido; la cascada
+    VADER → transformer es la excepción (ver load_cascade).
+    """
+    torch.set_num_threads(THREADS_PER_WORKER)
+    torch.set_num_interop_threads(1)
+
+    for name, loader in (
+        ("catálogo", load_catalog),
+        ("modelo", get_transformer_analyzer),
+        ("tokenizer de letras", get_lyrics_tokenizer),
+        ("índices del catálogo", ensure_catalog_indexes),
+    ):
+        try:
+            start = time.perf_counter()
+            loader()
+            print(f"✅ {name} precargado en {time.perf_counter() - start:.1f}s")
+        except Exception as e:
+            print(f"❌ No se pudo precargar el {name}: {e}")
+
+    load_cascade()
+
+    # Sacamos lo ya cargado del recolector de basura: si no, cada recolección en un worker
+    # escribiría sobre esas páginas y rompería el copy-on-write
+    gc.collect()
+    gc.freeze()
+
+
+def load_cascade():
+    """
+    Carga la cascada si algún pedido puede usarla (LYRICS_INFERENCE_MODE=cascade o CASCADE_UNDER_PRESSURE).
+
+    Necesita el léxico de VADER (nltk.download("vader_lexicon")). Si falta, el servidor no arranca:
+    de otro modo el error aparecería recién bajo carga, justo cuando se activa la cascada.
+    """
+    if Config.LYRICS_INFERENCE_MODE != "cascade" and not Config.CASCADE_UNDER_PRESSURE:
+        return
+    try:
+        get_emotion_aggregator()
+    except LookupError as e:
+        raise SystemExit(
+            "❌ No se pudo cargar la cascada VADER → transformer: falta el léxico de VADER "
+            "(python -m nltk.downloader vader_lexicon) o hay que desactivar CASCADE_UNDER_PRESSURE.\n"
+            f"{e}"
+        )
+    print("✅ cascada VADER → transformer precargada")
+
+
+def bind_socket() -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((Config.SERVER_HOST, Config.SERVER_PORT))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(app, sock: socket.socket, slot: int):
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    torch.set_num_threads(THREADS_PER_WORKER)
+    analyzer_admission.share(WORKERS, slot)
+    metrics_registry.start_flusher(Config.METRICS_FLUSH_SECONDS)
+
+    config = uvicorn.Config(app, log_level="info", timeout_graceful_shutdown=30)
+    try:
+        uvicorn.Server(config).run(sockets=[sock])
+    finally:
+        metrics_registry.write_snapshot()
+
+
+class Supervisor:
+    """
+    Crea los workers, los reemplaza si terminan inesperadamente y atiende las señales.
+    Cada worker ocupa un lugar (0 a workers - 1) que conserva su reemplazo, para que el reparto
+    de los límites de admisión no cambie.
+    """
+
+    def __init__(self, app, sock: socket.socket, workers: int):
+        self.app = app
+        self.sock = sock
+        self.workers = workers
+        # pid → lugar del worker
+        self.children = {}
+        self.running = True
+        self.reload_requested = False
+
+    def spawn(self, slot: int) -> int:
+        pid = os.fork()
+        if pid == 0:
+            for sig in (signal.SIGTERM, signal.SIGINT):
+                signal.signal(sig, signal.SIG_DFL)
+            try:
+                run_worker(self.app, self.sock, slot)
+            finally:
+                os._exit(0)
+
+        self.children[pid] = slot
+        return pid
+
+    def reap(self, block: bool = False):
+        while self.children:
+            try:
+                pid, _ = os.waitpid(-1, 0 if block else os.WNOHANG)
+            except ChildProcessError:
+                self.children.clear()
+                return
+            if pid == 0:
+                return
+            self.children.pop(pid, None)
+            if block:
+                return
+
+    def rolling_restart(self):
+        for old_pid, slot in list(self.children.items()):
+            self.spawn(slot)
+            os.kill(old_pid, signal.SIGTERM)
+            while old_pid in self.children:
+                self.reap(block=True)
+        print(f"🔄 {len(self.children)} workers reiniciados")
+
+    def stop(self):
+        for pid in self.children:
+            os.kill(pid, signal.SIGTERM)
+        while self.children:
+            self.reap(block=True)
+
+    def run(self):
+        signal.signal(signal.SIGTERM, lambda *_: setattr(self, "running", False))
+        signal.signal(signal.SIGINT, lambda *_: setattr(self, "running", False))
+        signal.signal(signal.SIGHUP, lambda *_: setattr(self, "reload_requested", True))
+
+        for slot in range(self.workers):
+            self.spawn(slot)
+        print(
+            f"🚀 Escuchando en {Config.SERVER_HOST}:{Config.SERVER_PORT} con {self.workers} workers "
+            f"de {THREADS_PER_WORKER} hilos"
+        )
+
+        while self.running:
+            if self.reload_requested:
+                self.reload_requested = False
+                self.rolling_restart()
+
+            self.reap()
+            for slot in sorted(set(range(self.workers)) - set(self.children.values())):
+                print("⚠️ Un worker terminó inesperadamente, creando uno nuevo")
+                self.spawn(slot)
+            time.sleep(0.5)
+
+        self.stop()
+
+
+if __name__ == "__main__":
+    if WORKERS > Config.ANALYZER_MAX_CONCURRENT:
+        print(
+            f"⚠️ {WORKERS} workers y ANALYZER_MAX_CONCURRENT={Config.ANALYZER_MAX_CONCURRENT}: cada worker "
+            f"ejecuta al menos un análisis, así que puede haber hasta {WORKERS} a la vez"
+        )
+    metrics_registry.enable_multiprocess(Config.METRICS_DIR)
+    preload()
+    # Lo medido durante la precarga queda en la foto del proceso principal; los workers empiezan de cero
+    metrics_registry.write_snapshot()
+    Supervisor(create_app(), bind_socket(), WORKERS).run()
@@ -0,0 +1,115 @@
+import threading
+import time
+
+import pytest
+
+from app.utils.admission import AdmissionController, Overloaded
+
+
+def _hold(controller: AdmissionController, release: threading.Event, admitted: threading.Event = None):
+    """
+    Ocupa un lugar en otro hilo hasta que se libere `release`.
+    """
+
+    def run():
+        with controller.slot():
+            if admitted is not None:
+                admitted.set()
+            release.wait()
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+
+def _wait_for(condition, timeout: float = 5):
+    limit = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < limit, "La condición no se cumplió a tiempo"
+        time.sleep(0.01)
+
+
+def test_queue_full_is_shed_immediately():
+    controller = AdmissionController("test", max_concurrent=1, max_queue=1, queue_timeout=5)
+    release = threading.Event()
+    running = threading.Event()
+    threads = [_hold(controller, release, running)]
+    running.wait(5)
+    threads.append(_hold(controller, release))
+    _wait_for(controller.under_pressure)
+
+    start = time.monotonic()
+    with pytest.raises(Overloaded) as error:
+        with controller.slot():
+            pass
+
+    assert error.value.reason == "queue_full"
+    assert error.value.retry_after == 5
+    assert time.monotonic() - start < 1
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+
+def test_queue_timeout_is_shed():
+    controller = AdmissionController("test", max_concurrent=1, max_queue=1, queue_timeout=0.2)
+    release = threading.Event()
+    running = threading.Event()
+    thread = _hold(controller, release, running)
+    running.wait(5)
+
+    with pytest.raises(Overloaded) as error:
+        with controller.slot():
+            pass
+
+    assert error.value.reason == "queue_timeout"
+    # Retry-After es el timeout de la cola redondeado hacia arriba, como mínimo 1
+    assert error.value.retry_after == 1
+    assert controller._waiting == 0
+    release.set()
+    thread.join(5)
+
+
+def test_waiting_request_is_admitted_when_slot_frees():
+    controller = AdmissionController("test", max_concurrent=1, max_queue=1, queue_timeout=5)
+    release = threading.Event()
+    running = threading.Event()
+    thread = _hold(controller, release, running)
+    running.wait(5)
+
+    threading.Timer(0.1, release.set).start()
+    with controller.slot():
+        assert controller._active == 1
+
+    thread.join(5)
+    assert controller._active == 0
+
+
+def test_counters_return_to_zero_after_exception():
+    controller = AdmissionController("test", max_concurrent=2, max_queue=2, queue_timeout=1)
+
+    with pytest.raises(RuntimeError):
+        with controller.slot():
+            raise RuntimeError("falla dentro del turno")
+
+    assert controller._active == 0
+    assert controller._waiting == 0
+    assert not controller.under_pressure()
+    # El lugar quedó libre
+    with controller.slot():
+        assert controller._active == 1
+
+
+def test_share_keeps_totals():
+    shares = []
+    for index in range(3):
+        controller = AdmissionController("test", max_concurrent=4, max_queue=16, queue_timeout=1)
+        controller.share(3, index)
+        shares.append((controller.max_concurrent, controller.max_queue))
+
+    assert sum(c for c, _ in shares) == 4
+    assert sum(q for _, q in shares) == 16
+
+    controller = AdmissionController("test", max_concurrent=4, max_queue=16, queue_timeout=1)
+    controller.share(32, 31)
+    assert (controller.max_concurrent, controller.max_queue) == (1, 1)
@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from app.analyzers import EmotionalAggregate
+from app.analyzers.emotional_aggregate import quadrant_for
+
+
+def _points(seed: int, size: int):
+    rng = np.random.default_rng(seed)
+    # Valores grandes y con poca dispersión, donde la fórmula ingenua de la varianza pierde precisión
+    valences = rng.normal(60, 0.5, size)
+    arousals = rng.uniform(0, 100, size)
+    return valences, arousals
+
+
+def _assert_matches_numpy(aggregate, valences, arousals):
+    assert aggregate.count == len(valences)
+    centroid, dispersion = aggregate.centroid(), aggregate.dispersion()
+    assert centroid["valence"] == pytest.approx(np.mean(valences), rel=1e-12)
+    assert centroid["arousal"] == pytest.approx(np.mean(arousals), rel=1e-12)
+    assert dispersion["valence_std"] == pytest.approx(np.std(valences), rel=1e-9)
+    assert dispersion["arousal_std"] == pytest.approx(np.std(arousals), rel=1e-9)
+
+    expected = {}
+    for v, a in zip(valences, arousals):
+        expected[quadrant_for(v, a)] = expected.get(quadrant_for(v, a), 0) + 1
+    assert {q: c for q, c in aggregate.quadrant_counts.items() if c} == expected
+
+
+def test_update_matches_numpy():
+    valences, arousals = _points(0, 5000)
+    aggregate = EmotionalAggregate().update_many(zip(valences, arousals))
+    _assert_matches_numpy(aggregate, valences, arousals)
+
+
+@pytest.mark.parametrize("splits", [[1], [0, 10, 2500], [17, 17, 4000, 4999]])
+def test_merge_of_partitions_matches_numpy(splits):
+    valences, arousals = _points(1, 5000)
+    bounds = [0, *splits, len(valences)]
+
+    merged = EmotionalAggregate()
+    for start, end in zip(bounds, bounds[1:]):
+        # Las particiones vacías también se combinan
+        merged.merge(EmotionalAggregate().update_many(zip(valences[start:end], arousals[start:end])))
+
+    _assert_matches_numpy(merged, valences, arousals)
+
+
+def test_serialization_round_trip():
+    valences, arousals = _points(2, 100)
+    aggregate = EmotionalAggregate().update_many(zip(valences, arousals))
+
+    restored = EmotionalAggregate.from_dict(aggregate.to_dict())
+
+    assert restored.to_dict() == aggregate.to_dict()
+    _assert_matches_numpy(restored, valences, arousals)
+
+
+def test_empty_aggregate():
+    aggregate = EmotionalAggregate()
+    assert aggregate.count == 0
+    assert np.isnan(aggregate.centroid()["valence"])
+    assert np.isnan(aggregate.dispersion()["valence_std"])
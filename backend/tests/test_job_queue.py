@@ -0,0 +1,173 @@
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+
+import pytest
+import requests
+import uvicorn
+
+from app.app import create_app
+from app.config import Config
+from app.core.blob_store import get_blob_store
+from app.core.image_cache import get_image_cache
+from app.core.job_queue import JOB_DONE, JOB_FAILED, JobQueue, get_image_job_queue
+from app.core.main_flow import _generar_y_cachear_paisaje
+from app.utils import circuit_breaker
+from loadtest.fake_upstreams import SERVICES, FaultInjector, create_fake_app
+
+DISTRIBUTION = {"anger": 0.1, "joy": 0.5, "optimism": 0.25, "sadness": 0.15}
+
+
+def _wait(queue: JobQueue, job_id: str, timeout: float = 20) -> dict:
+    limit = time.monotonic() + timeout
+    while time.monotonic() < limit:
+        job = queue.get(job_id)
+        if job["status"] in (JOB_DONE, JOB_FAILED):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"El trabajo {job_id} no terminó en {timeout}s")
+
+
+@contextmanager
+def _serve(app):
+    """
+    Atiende `app` en un puerto libre desde un hilo y devuelve su URL base.
+    """
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    server = uvicorn.Server(uvicorn.Config(app, log_level="warning"))
+    thread = threading.Thread(target=server.run, kwargs={"sockets": [sock]}, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    try:
+        yield f"http://127.0.0.1:{sock.getsockname()[1]}"
+    finally:
+        server.should_exit = True
+        thread.join(timeout=5)
+        sock.close()
+
+
+@pytest.fixture
+def upstreams():
+    """
+    Servicios externos de prueba (SDXL, imgbb y el modelo de descripción) sin latencia.
+    """
+    faults = FaultInjector()
+    faults.update({service: {"latency_ms": 0, "jitter_ms": 0} for service in SERVICES})
+    with _serve(create_fake_app([], faults)) as base:
+        yield base, faults
+
+
+@pytest.fixture
+def image_jobs(upstreams, tmp_path, monkeypatch):
+    """
+    Cola de imágenes, caché y almacén de blobs en un directorio temporal, con los servicios
+    externos apuntando a los de prueba.
+    """
+    base, faults = upstreams
+    monkeypatch.setattr(Config, "HF_SDXL_URL", f"{base}/hf/sdxl")
+    monkeypatch.setattr(Config, "IMGBB_UPLOAD_URL", f"{base}/imgbb/1/upload")
+    monkeypatch.setattr(Config, "HF_CHAT_BASE_URL", f"{base}/hf-chat/v1")
+    monkeypatch.setattr(Config, "IMAGE_VLM_SOURCE", "imgbb")
+    monkeypatch.setattr(Config, "IMAGE_JOB_DB_PATH", str(tmp_path / "jobs.sqlite3"))
+    monkeypatch.setattr(Config, "IMAGE_CACHE_DIR", str(tmp_path / "images"))
+    monkeypatch.setattr(Config, "BLOB_STORE_DIR", str(tmp_path / "blobs"))
+    monkeypatch.setattr(circuit_breaker, "_breakers", {})
+    for getter in (get_image_job_queue, get_image_cache, get_blob_store):
+        getter.cache_clear()
+
+    yield get_image_job_queue(), faults
+
+    get_image_job_queue().shutdown()
+    for getter in (get_image_job_queue, get_image_cache, get_blob_store):
+        getter.cache_clear()
+
+
+def test_same_key_shares_job_and_result_reaches_endpoint(image_jobs):
+    queue, faults = image_jobs
+
+    first = queue.submit("paisaje", _generar_y_cachear_paisaje, DISTRIBUTION, "paisaje")
+    second = queue.submit("paisaje", _generar_y_cachear_paisaje, DISTRIBUTION, "paisaje")
+    assert first == second
+    _wait(queue, first)
+
+    with _serve(create_app()) as base:
+        response = requests.get(f"{base}/api/sonemica/image/{first}", timeout=5)
+    assert response.status_code == 200
+    job = response.json()
+    assert job["status"] == JOB_DONE, job["error"]
+    assert job["result"]["descripcion"]
+    assert job["result"]["url_publica"].endswith(job["result"]["image_digest"])
+    assert get_blob_store().exists(job["result"]["image_digest"])
+    # Una sola generación para los dos pedidos
+    assert faults.stats["sdxl"]["requests"] == 1
+
+
+def test_upstream_error_marks_job_failed(image_jobs):
+    queue, faults = image_jobs
+    faults.update({"sdxl": {"error_rate": 1.0}})
+
+    job = _wait(queue, queue.submit("error", _generar_y_cachear_paisaje, DISTRIBUTION, "error"))
+
+    assert job["status"] == JOB_FAILED
+    assert job["error"]
+    assert job["result"] is None
+
+
+def test_upstream_timeout_marks_job_failed(image_jobs, monkeypatch):
+    queue, faults = image_jobs
+    faults.update({"sdxl": {"latency_ms": 2000}})
+    monkeypatch.setattr(Config, "STAGE_BUDGET_SDXL", 0.2)
+
+    job = _wait(queue, queue.submit("lento", _generar_y_cachear_paisaje, DISTRIBUTION, "lento"))
+
+    assert job["status"] == JOB_FAILED
+    assert "timed out" in job["error"].lower()
+
+
+def test_concurrency_is_bounded(tmp_path):
+    queue = JobQueue(max_workers=2, db_path=str(tmp_path / "jobs.sqlite3"))
+    lock = threading.Lock()
+    running = {"now": 0, "max": 0}
+
+    def work():
+        with lock:
+            running["now"] += 1
+            running["max"] = max(running["max"], running["now"])
+        time.sleep(0.1)
+        with lock:
+            running["now"] -= 1
+
+    job_ids = [queue.submit(f"clave-{i}", work) for i in range(6)]
+    assert all(_wait(queue, job_id)["status"] == JOB_DONE for job_id in job_ids)
+    assert running["max"] == 2
+    queue.shutdown()
+
+
+def test_job_of_dead_worker_is_reported_failed(tmp_path):
+    queue = JobQueue(max_workers=1, db_path=str(tmp_path / "jobs.sqlite3"))
+    read_end, write_end = os.pipe()
+
+    # El worker creado con fork encola con su propia conexión y termina sin completar el trabajo
+    pid = os.fork()
+    if pid == 0:
+        try:
+            job_id = queue.submit("huerfano", time.sleep, 60)
+            os.write(write_end, job_id.encode())
+        finally:
+            os._exit(0)
+    os.waitpid(pid, 0)
+    os.close(write_end)
+    job_id = os.read(read_end, 64).decode()
+    os.close(read_end)
+
+    assert queue.pending_count() == 0
+    job = queue.get(job_id)
+    assert job["status"] == JOB_FAILED
+    assert "terminó" in job["error"]
+    # La clave vuelve a estar libre
+    assert queue.submit("huerfano", lambda: None) != job_id
+    queue.shutdown()
@@ -0,0 +1,37 @@
+from app.core.lyrics_compaction import compact_lyrics
+
+LYRICS = """[Intro: Someone]
+Hold on
+
+[Verse 1]
+I walk alone tonight
+Hold on!
+The road is long
+
+[Chorus]
+hold   ON
+I walk alone tonight
+"""
+
+
+def test_section_markers_are_removed():
+    lines, _ = compact_lyrics(LYRICS)
+    assert not any(line.startswith("[") for line in lines)
+
+
+def test_repeated_lines_are_counted_in_order_of_first_appearance():
+    lines, counts = compact_lyrics(LYRICS)
+
+    # Las repeticiones se comparan sin mayúsculas, puntuación ni espacios de más
+    assert lines == ["Hold on", "I walk alone tonight", "The road is long"]
+    assert counts == [3, 2, 1]
+
+
+def test_lines_without_words_are_dropped():
+    lines, counts = compact_lyrics("[Chorus]\n...\n  \n!!\nla la\n")
+    assert lines == ["la la"]
+    assert counts == [1]
+
+
+def test_empty_lyrics():
+    assert compact_lyrics("") == ([], [])
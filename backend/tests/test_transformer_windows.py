@@ -0,0 +1,99 @@
+import random
+
+import pytest
+
+from app.config import Config
+from benchmarks.stub_model import stub_analyzer
+from benchmarks.synthetic import VOCABULARY
+
+EMOTIONS = ["anger", "joy", "optimism", "sadness"]
+
+
+def _words(seed: int, size: int, vocabulary=VOCABULARY) -> str:
+    rng = random.Random(seed)
+    return " ".join(rng.choice(vocabulary) for _ in range(size))
+
+
+def _song(title: str, lines, counts=None) -> dict:
+    return {
+        "Title": title,
+        "Artist": "Artist",
+        "Lyrics": " ".join(lines),
+        "Lyrics_lines": list(lines),
+        "Lyrics_line_counts": list(counts or []),
+    }
+
+
+def _distance(a: dict, b: dict) -> float:
+    return sum(abs(a["distribution"][e] - b["distribution"][e]) for e in EMOTIONS)
+
+
+def _assert_same_distribution(a: dict, b: dict):
+    for emotion in EMOTIONS:
+        assert a["distribution"][emotion] == pytest.approx(b["distribution"][emotion], abs=1e-5)
+
+
+@pytest.fixture
+def analyzer():
+    """
+    Modelo de prueba que además cuenta las ventanas (filas) que recibe.
+    """
+    analyzer = stub_analyzer()
+    forward = analyzer.model.forward
+    analyzer.rows = 0
+
+    def counting_forward(input_ids, attention_mask, **kwargs):
+        analyzer.rows += input_ids.shape[0]
+        return forward(input_ids, attention_mask, **kwargs)
+
+    analyzer.model.forward = counting_forward
+    return analyzer
+
+
+def test_short_lyric_matches_non_windowed(analyzer, monkeypatch):
+    song = _song("Corta", [_words(0, 12), _words(1, 15)])
+
+    monkeypatch.setattr(Config, "LYRICS_WINDOWED", False)
+    plain = analyzer.analyze_batch([song])[0]
+    monkeypatch.setattr(Config, "LYRICS_WINDOWED", True)
+    windowed = analyzer.analyze_batch([song])[0]
+
+    _assert_same_distribution(plain, windowed)
+
+
+def test_max_windows_cap(analyzer, monkeypatch):
+    monkeypatch.setattr(Config, "LYRICS_WINDOWED", True)
+    monkeypatch.setattr(Config, "LYRICS_MAX_WINDOWS", 3)
+    # Unas diez ventanas de 512 tokens
+    song = _song("Larga", [_words(2, 4500)])
+
+    analyzer.analyze_batch([song])
+
+    assert analyzer.rows == 3
+
+
+def test_results_keep_input_order_across_shared_batches(analyzer, monkeypatch):
+    monkeypatch.setattr(Config, "LYRICS_WINDOWED", True)
+    songs = [_song(f"Canción {i}", [_words(10 + i, size)]) for i, size in enumerate([900, 20, 1500, 5, 300, 700])]
+
+    together = analyzer.analyze_batch(songs, batch_size=4)
+
+    assert [result["title"] for result in together] == [song["Title"] for song in songs]
+    for song, result in zip(songs, together):
+        _assert_same_distribution(result, analyzer.analyze_batch([song])[0])
+
+
+def test_repeated_lines_carry_weight(analyzer, monkeypatch):
+    monkeypatch.setattr(Config, "LYRICS_WINDOWED", True)
+    # Dos líneas largas con palabras distintas, cada una de varias ventanas
+    half = len(VOCABULARY) // 2
+    chorus, verse = _words(20, 1200, VOCABULARY[:half]), _words(21, 1200, VOCABULARY[half:])
+
+    unweighted = analyzer.analyze_batch([_song("Sin conteos", [chorus, verse])])[0]
+    once = analyzer.analyze_batch([_song("Una vez", [chorus, verse], [1, 1])])[0]
+    repeated = analyzer.analyze_batch([_song("Estribillo", [chorus, verse], [8, 1])])[0]
+    chorus_only = analyzer.analyze_batch([_song("Solo estribillo", [chorus])])[0]
+
+    # Conteos de 1 equivalen a no tener conteos; el estribillo repetido acerca el resultado al suyo
+    _assert_same_distribution(unweighted, once)
+    assert _distance(repeated, chorus_only) < _distance(once, chorus_only)
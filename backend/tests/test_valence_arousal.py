@@ -0,0 +1,137 @@
+import math
+import random
+
+import numpy as np
+import pytest
+
+from app.analyzers import EmotionalAggregate, ValenceArousalAnalyzer
+from app.analyzers.valence_arousal_analyzer import _round2
+
+EMOTIONS = ["anger", "joy", "optimism", "sadness"]
+
+
+def _songs(seed: int, size: int = 300):
+    """
+    Audio features y análisis de letras con canciones solo de audio, solo de letra, con ambos,
+    claves repetidas (gana la última) y títulos que solo difieren en mayúsculas y signos.
+    """
+    rng = random.Random(seed)
+    audio, sentiments = [], []
+    for i in range(size):
+        title, artist = f"Song {i}", f"Artist {i % 17}"
+        kind = rng.random()
+        if kind < 0.8:
+            audio.append(
+                {
+                    "Title": title,
+                    "Artist": artist,
+                    "Valence": rng.randint(0, 100),
+                    "Energy": rng.randint(0, 100),
+                    "Loudness": rng.randint(-40, 0),
+                }
+            )
+        if kind > 0.3:
+            weights = [rng.random() for _ in EMOTIONS]
+            total = sum(weights)
+            distribution = {emotion: w / total for emotion, w in zip(EMOTIONS, weights)}
+            sentiments.append(
+                {
+                    "title": title.upper() if rng.random() < 0.2 else title,
+                    "artist": f"{artist}!" if rng.random() < 0.1 else artist,
+                    "emotion": max(distribution, key=distribution.get),
+                    "distribution": distribution,
+                }
+            )
+    # Repetidas: la última aparición reemplaza a la anterior en ambos caminos
+    audio.extend(dict(song, Valence=(song["Valence"] + 37) % 101) for song in audio[:10])
+    return audio, sentiments
+
+
+def _by_title(result):
+    return {(song["title"], song["artist"]): song for song in result["songs"]}
+
+
+def _assert_close(a, b):
+    if isinstance(a, dict):
+        assert a.keys() == b.keys()
+        for key in a:
+            _assert_close(a[key], b[key])
+    elif isinstance(a, float) or isinstance(b, float):
+        if a is None or b is None:
+            assert a is b
+        elif math.isnan(a):
+            assert math.isnan(b)
+        else:
+            assert a == pytest.approx(b, abs=1e-9)
+    else:
+        assert a == b
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_columnar_matches_row_path(seed):
+    analyzer = ValenceArousalAnalyzer()
+    audio, sentiments = _songs(seed)
+
+    row = analyzer.process_songs(audio, sentiments)
+    columnar = analyzer.process_songs_columnar(
+        analyzer.build_tracks_table(audio, sentiments),
+        input_counts={"songs_with_audio_features": len(audio), "songs_with_sentiments": len(sentiments)},
+    )
+
+    assert row["stats"] == columnar["stats"]
+    _assert_close(row["summary"], columnar["summary"])
+
+    row_songs, columnar_songs = _by_title(row), _by_title(columnar)
+    assert row_songs.keys() == columnar_songs.keys()
+    for key, song in row_songs.items():
+        _assert_close(
+            {k: v for k, v in song.items() if k != "sentiment_scores"},
+            {k: v for k, v in columnar_songs[key].items() if k != "sentiment_scores"},
+        )
+        assert song["sentiment_scores"] == columnar_songs[key]["sentiment_scores"]
+
+
+def test_empty_input_matches_row_path():
+    analyzer = ValenceArousalAnalyzer()
+
+    with pytest.warns(RuntimeWarning):
+        row = analyzer.process_songs([], [])
+    with pytest.warns(RuntimeWarning):
+        columnar = analyzer.process_songs_columnar(analyzer.build_tracks_table([], []))
+
+    assert row["stats"] == columnar["stats"]
+    _assert_close(row["summary"], columnar["summary"])
+    assert all(math.isnan(q["percentage"]) for q in columnar["summary"]["quadrant_distribution"].values())
+
+
+def test_summarize_aggregate_matches_process_songs():
+    analyzer = ValenceArousalAnalyzer()
+    audio, sentiments = _songs(3)
+    result = analyzer.process_songs(audio, sentiments)
+
+    summary = analyzer.summarize_aggregate(EmotionalAggregate.from_songs(result["songs"]))
+
+    # Las canciones del resultado traen valencia y arousal redondeados: puede diferir en la última cifra
+    assert summary["total_songs"] == result["summary"]["total_songs"]
+    assert summary["quadrant_distribution"] == result["summary"]["quadrant_distribution"]
+    for field in ("valence", "arousal"):
+        assert summary["centroid"][field] == pytest.approx(result["summary"]["centroid"][field], abs=0.011)
+
+
+def test_summarize_empty_aggregate():
+    summary = ValenceArousalAnalyzer().summarize_aggregate(EmotionalAggregate())
+
+    assert summary["total_songs"] == 0
+    assert math.isnan(summary["centroid"]["valence"])
+    assert all(math.isnan(q["percentage"]) for q in summary["quadrant_distribution"].values())
+
+
+def test_round2_matches_python_round():
+    rng = random.Random(4)
+    # Empates aparentes en float64 (1.115 * 100 == 111.5) y valores al azar con 3 decimales
+    values = [1.115, 2.675, 0.125, 0.375, -1.115, 50.005, 99.995]
+    values += [rng.randint(0, 100000) / 1000 for _ in range(20000)]
+    values += [rng.uniform(-100, 100) for _ in range(20000)]
+
+    assert _round2(np.array(values)).tolist() == [round(v, 2) for v in values]
+    assert math.isnan(_round2(np.array([math.nan]))[0])